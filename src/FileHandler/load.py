@@ -5,11 +5,29 @@ Created on 9 jan. 2015
 '''
 
 import re
+import csv as csv_module
+import hashlib
+import json
+import queue
+import shutil
+import threading
+from collections import namedtuple
 from statistics import median
 import os
 from urllib import request
+from urllib.error import HTTPError
 from zipfile import ZipFile
-from io import BytesIO
+from io import BytesIO, TextIOWrapper
+
+CHUNK_SIZE = 1 << 20
+
+# stream of a fetched url, the offset it starts at (0 when the source does not resume), 
+# the total size (None when unknown) and a validator that changes when the source changes
+Fetched = namedtuple('Fetched', ['stream', 'start', 'size', 'validator'])
+
+
+class DownloadError(Exception):
+    pass
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
 directories = [d for d in os.listdir(ROOT_DIR) if os.path.isdir(os.path.join(ROOT_DIR, d))]
@@ -53,6 +71,174 @@ def download(url, encoding=None, zippedfile=None):
     return unzip(url.read(), zippedfile, encoding) #read file contents and unzips if necessary
 
 
+def http_fetch(url, start=0, validator=None):
+    '''
+    Fetches url from offset start with an HTTP range request. The range is only
+    served when the file still matches validator (its ETag or Last-Modified), 
+    otherwise the whole file is sent again (start is 0).
+    '''
+    headers = {}
+    if start:
+        headers['Range'] = 'bytes=%d-' % start
+        if validator:
+            headers['If-Range'] = validator
+    try:
+        response = request.urlopen(request.Request(url, headers=headers))
+    except HTTPError as e:
+        if e.code != 416: 
+            raise
+        return Fetched(BytesIO(), start, start, validator) # nothing left after start
+    start = start if response.status == 206 else 0
+    length = response.headers.get('Content-Length')
+    return Fetched(response, start, start + int(length) if length is not None else None,
+                   response.headers.get('ETag') or response.headers.get('Last-Modified'))
+
+
+def file_fetch(filename, start=0, validator=None):
+    'fetches a local file like http_fetch, e.g. to test downloads or to use a copy of the data'
+    stat = os.stat(filename)
+    current = '%d-%d' % (stat.st_size, stat.st_mtime_ns)
+    start = start if validator == current else 0
+    f = open(filename, 'rb')
+    f.seek(start)
+    return Fetched(f, start, stat.st_size, current)
+
+
+def download_file(url, filename, fetch=http_fetch, checksum=None, chunk_size=CHUNK_SIZE):
+    '''
+    Streams url to filename in chunks of chunk_size bytes, through "filename.part".
+    An interrupted download is resumed from the part on disk (when the source did
+    not change since, see http_fetch). The sha256 checksum of the file is checked
+    against checksum when it is given (DownloadError when they differ) and returned.
+    fetch(url, start, validator) returns a Fetched, see http_fetch and file_fetch.
+    '''
+    part, state = filename + '.part', filename + '.part.json'
+    start, validator = 0, None
+    if os.path.exists(part) and os.path.exists(state):
+        with open(state) as f:
+            validator = json.load(f).get('validator')
+        start = os.path.getsize(part)
+    fetched = fetch(url, start, validator)
+    with open(state, 'w') as f:
+        json.dump({'url': url, 'validator': fetched.validator}, f)
+    digest = hashlib.sha256()
+    with fetched.stream as stream, open(part, 'r+b' if fetched.start else 'wb') as f:
+        while fetched.start: # hash the part that was downloaded before
+            chunk = f.read(min(chunk_size, fetched.start - f.tell()))
+            if not chunk:
+                break
+            digest.update(chunk)
+        f.truncate(fetched.start)
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            f.write(chunk)
+            digest.update(chunk)
+        size = f.tell()
+    if fetched.size is not None and size != fetched.size:
+        raise DownloadError('Download of %s stopped at %d of %d bytes, it is resumed on the next try' % (url, size, fetched.size))
+    if checksum is not None and digest.hexdigest() != checksum.lower():
+        os.remove(part)
+        os.remove(state)
+        raise DownloadError('Checksum of %s is %s, expected %s' % (url, digest.hexdigest(), checksum))
+    os.replace(part, filename)
+    os.remove(state)
+    return digest.hexdigest()
+
+
+def extract(zipfile, zippedfile, filename):
+    'decompresses the member zippedfile of zipfile to filename, streaming'
+    with ZipFile(zipfile, 'r') as z, z.open(zippedfile) as source, open(filename, 'wb') as f:
+        shutil.copyfileobj(source, f, CHUNK_SIZE)
+
+
+def iter_queued(iterable, maxsize=8, chunksize=1000):
+    '''
+    Generator that yields the items of iterable, which are produced in a separate
+    thread (e.g. reading, decompressing and normalizing rows) while the consumer 
+    handles the items before them (e.g. building an index). At most maxsize 
+    chunks of chunksize items wait in between. An exception in the producer is
+    raised in the consumer, the producer stops when the consumer stops.
+    '''
+    chunks = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def put(chunk):
+        while not stop.is_set():
+            try:
+                chunks.put(chunk, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def produce():
+        try:
+            chunk = []
+            for item in iterable:
+                chunk.append(item)
+                if len(chunk) == chunksize:
+                    put(chunk)
+                    chunk = []
+                if stop.is_set():
+                    return
+            put(chunk)
+            put(None)
+        except BaseException as e:
+            put(e)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                return
+            if isinstance(chunk, BaseException):
+                raise chunk
+            yield from chunk
+    finally:
+        stop.set()
+
+
+def open_stream(filename, encoding=None, zippedfile=None):
+    '''
+    Opens <filename> (or the member <zippedfile> of the zip archive <filename>)
+    as a text stream that is read and decompressed incrementally.
+    '''
+    if zippedfile:
+        return TextIOWrapper(ZipFile(filename, 'r').open(zippedfile), encoding=encoding, newline='')
+    return open(filename, "r", encoding=encoding, newline='')
+
+
+def iter_csv(filename, sep=";", header=False, encoding=("utf8", "latin1"), zippedfile=None, method=open_stream):
+    '''
+    Generator that yields the rows of a csv file one at a time, split on
+    <sep> (quoted fields may contain <sep>). Only one row is kept in memory.
+    Header skips the first row, empty rows are skipped. Encoding is one 
+    encoding or a sequence of encodings that are tried in order: when a row
+    can not be decoded, the file is read again with the next encoding from
+    that row on.
+    '''
+    encodings = [encoding] if isinstance(encoding, str) else list(encoding)
+    done = 0 # rows read (after the header) with an earlier encoding
+    for i, enc in enumerate(encodings):
+        try:
+            with method(filename, enc, zippedfile) as f:
+                rows = csv_module.reader(f, delimiter=sep)
+                if header:
+                    next(rows, None)
+                for _ in range(done):
+                    next(rows, None)
+                for row in rows:
+                    done += 1
+                    if row:
+                        yield row
+            return
+        except UnicodeDecodeError:
+            if i == len(encodings) - 1:
+                raise
+
+
 def open_read(filename, encoding=None, sep=None, zippedfile=None, method=open_from_disk):
     '''
     Reads filecontents from <filename> and splits on newline symbols and <sep>.
@@ -3,9 +3,37 @@ Created on Apr 19, 2015
 
 @author: roel
 '''
+import hashlib
+import os
+import tempfile
+import threading
 import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from zipfile import ZipFile
 from .. import load
 
+
+class RangeHandler(BaseHTTPRequestHandler):
+    'serves data with range requests, the first response breaks off after fail_after bytes'
+    data = bytes(range(256)) * 400
+    fail_after = 30000
+    ranges = []
+
+    def do_GET(self):
+        start = 0
+        if self.headers.get('Range') and self.headers.get('If-Range') == '"v1"':
+            start = int(self.headers['Range'][6:-1])
+        self.ranges.append(start)
+        self.send_response(206 if start else 200)
+        self.send_header('Content-Length', str(len(self.data) - start))
+        self.send_header('ETag', '"v1"')
+        self.end_headers()
+        end = len(self.data) if len(self.ranges) > 1 else self.fail_after
+        self.wfile.write(self.data[start:end])
+
+    def log_message(self, *args):
+        pass
+
 class TestLoad(unittest.TestCase):
 
     def testDirlist(self):
@@ -21,6 +49,62 @@ class TestLoad(unittest.TestCase):
     
     def testTryUnicode(self):
         pass
+
+    def testIterCsv(self):
+        content = '"id";"street"\n1;"Kruisplein"\n\n2;"Straat; met ; punt-komma"\n3;Éénhoorn\n'
+        rows = [['1', 'Kruisplein'], ['2', 'Straat; met ; punt-komma'], ['3', 'Éénhoorn']]
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'test.csv')
+            with open(filename, 'w', encoding='utf8') as f:
+                f.write(content)
+            with ZipFile(filename + '.zip', 'w') as f:
+                f.write(filename, 'test.csv')
+            self.assertEqual(list(load.iter_csv(filename, header=True)), rows)
+            self.assertEqual(list(load.iter_csv(filename + '.zip', header=True, zippedfile='test.csv')), rows)
+            rows = [[str(i), 'Kruisplein'] for i in range(10000)] + [['3', 'Éénhoorn']] # fails as utf8 after the first rows were read
+            with open(filename, 'w', encoding='latin1') as f:
+                f.write('"id";"street"\n' + ''.join('%s;%s\n' % tuple(x) for x in rows))
+            self.assertEqual(list(load.iter_csv(filename, header=True)), rows)
+            self.assertRaises(UnicodeDecodeError, list, load.iter_csv(filename, encoding='utf8'))
+
+    def testDownloadFile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source, target = os.path.join(directory, 'source.zip'), os.path.join(directory, 'target.zip')
+            with open(source, 'wb') as f:
+                f.write(os.urandom(100000))
+            checksum = hashlib.sha256(open(source, 'rb').read()).hexdigest()
+            self.assertEqual(load.download_file(source, target, load.file_fetch, checksum, chunk_size=4096), checksum)
+            self.assertEqual(open(target, 'rb').read(), open(source, 'rb').read())
+            self.assertRaises(load.DownloadError, load.download_file, source, target, load.file_fetch, '0' * 64)
+            self.assertFalse(os.path.exists(target + '.part'))
+
+    def testDownloadResume(self):
+        RangeHandler.ranges = []
+        server = HTTPServer(('127.0.0.1', 0), RangeHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = 'http://127.0.0.1:%d/postcode_NL.csv.zip' % server.server_port
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                target = os.path.join(directory, 'target.zip')
+                self.assertRaises(Exception, load.download_file, url, target, chunk_size=4096)
+                self.assertEqual(os.path.getsize(target + '.part'), RangeHandler.fail_after)
+                checksum = hashlib.sha256(RangeHandler.data).hexdigest()
+                self.assertEqual(load.download_file(url, target, checksum=checksum), checksum)
+                self.assertEqual(RangeHandler.ranges, [0, RangeHandler.fail_after])
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def testIterQueued(self):
+        self.assertEqual(list(load.iter_queued(iter(range(2500)), maxsize=2, chunksize=100)), list(range(2500)))
+
+        def failing():
+            yield 1
+            raise ValueError('broken row')
+        self.assertRaises(ValueError, list, load.iter_queued(failing()))
+        queued = load.iter_queued(iter(range(10 ** 6)), maxsize=1, chunksize=10)
+        self.assertEqual(next(queued), 0)
+        queued.close() # stops the producer
     
     
 
@@ -15,6 +15,7 @@ HouseNumber = contains x-, y-RDcoordinates for ranges of housenumbers
 Street = street contains the housenumbers that falls within the street
 City = contains the streets for a given (Dutch) city
 AddressBook = Address book with all addresses found in the source file
+MappedCities = read-only cities of an address book opened from a store (see store.py)
 AddressSearch = search class that tries to find an address based on a given string
 
 Dutch Addresses data-file can be found at: http://www.postcodedata.nl/download/
@@ -48,28 +49,70 @@ maxnumber = 6
 type = 7
 x = 17
 y = 18
+lat = 15
+lon = 16
 street = 8
 city = 9
 postal_code = 1
 '''
 
+import gc
 import os
-import unicodedata
 import re
+import sys
+import json
 import pickle
+import multiprocessing
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple, Counter, deque
+from contextlib import contextmanager
+from itertools import islice
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 
-from FileHandler import load, save
+from FileHandler import load
+from matcher import Matcher
+from fuzzy import FuzzyMatcher
+from cache import LRUCache
+from spatial import GridIndex
+import bulk
+import coordinates
+import instrument
+import interpolation
+import normalize
+import store
 
 DATA_URL = "http://download.postcodedata.nl/data/postcode_NL.csv.zip"
+ZIP_NAME = "postcode_NL.csv.zip"
 FILE_NAME = "postcode_NL.csv"
+STORE_NAME = "adressenbestand.bin"
+DELTA_NAME = "adressenbestand.delta"
+PARTITIONS_NAME = "adressenbestand"
+PARTITIONS_INDEX = "partitions.json"
+NUMBER_TYPES = ["MIXED", "EVEN", "ODD"]
+# rows per batch that load_parallel sends to a worker, the columns a worker returns (see parse_rows)
+# and the partitions of the cities per worker that are built in the workers (see build_cities)
+BATCH_SIZE = 5000
+PARTITIONS_PER_WORKER = 4
+ROW_COLUMNS = [('min', 'i'), ('max', 'i'), ('type', 'B'), ('x', 'd'), ('y', 'd'), ('packed', 'q'), ('lat', 'f'), ('lon', 'f')]
 
 dirlist = load.dirlist()
+log = instrument.log
+
+POSTAL_CODE = re.compile(r'(?<![0-9A-Z])([1-9][0-9]{3}) ?([A-Z]{2})(?![0-9A-Z])(?: +(\d+))?')
+# housenumber (and its addition, e.g. 26A) directly after a street
+HOUSENUMBER = re.compile(r'\s(\d+)([A-Z]*)')
 
 def strip_accents(s):
     '''
     removes all encoding from string 's' except for Nonspacing_Mark: http://www.unicode.org/reports/tr44/#GC_Values_Table
+    (through the translation table in normalize.py)
     '''
-    return ''.join(c for c in unicodedata.normalize('NFD', s) if unicodedata.category(c) != 'Mn')
+    return normalize.strip_accents(s)
 
 
 def even(val):
@@ -88,51 +131,124 @@ def infmax(l):
         return float('inf')
 
 
-def load_address_book():
+def load_address_book(cities=None, provinces=None, max_cities=None):
     """
-    Tries to load the pickled address file from the data directory. In case this fails it tries 
-    to load the .csv version. If this also fails it will download, pickle the address file and
-    save the pickle to 'adressenbestand.p' 
+    Tries to open the address book store or the pickled address file (with the updates 
+    in 'adressenbestand.delta') from the data directory. In case this fails it tries to 
+    load the .csv version. If this also fails it will download, pickle the address file 
+    and save the pickle to 'adressenbestand.p' and the store to 'adressenbestand.bin'. 
+    A store that can not be opened (corrupt or of another version) is rebuilt.
+
+    With cities and/or provinces (province codes, e.g. "ZH") only those cities are 
+    served, from a store partitioned per province in 'adressenbestand/' that is loaded 
+    one city at a time (see AddressBook.open_partitions), keeping at most max_cities.
     """
+    if cities is not None or provinces is not None:
+        directory = os.path.join(dirlist["data"], PARTITIONS_NAME)
+        if not os.path.exists(os.path.join(directory, PARTITIONS_INDEX)):
+            if 'adressenbestand.p' in os.listdir(dirlist["data"]):
+                book = DownloadAndPickle().unpickle()
+            else:
+                book = load_address_book()
+            known = getattr(book, 'provinces', None) or {}
+            book.save_partitions(directory, None if all(known.get(city) for city in book.cities) else read_provinces())
+        return AddressBook.open_partitions(directory, cities, provinces, max_cities)
     DandP = DownloadAndPickle()
     datafiles = os.listdir(dirlist["data"])
-    if 'adressenbestand.p' in datafiles: 
+    if DELTA_NAME in datafiles and 'adressenbestand.p' in datafiles: # the store predates the updates in the delta file
         return DandP.unpickle()
+    if STORE_NAME in datafiles:
+        try:
+            return AddressBook.open(os.path.join(dirlist["data"], STORE_NAME))
+        except store.StoreError as error:
+            log.warning('%s kan niet geopend worden (%s), laad het adresboek opnieuw.', STORE_NAME, error)
+    if 'adressenbestand.p' in datafiles:
+        DandP.unpickle()
+        if STORE_NAME not in datafiles:
+            return DandP.address_book
     elif FILE_NAME in datafiles:
-        bestandsinhoud = load.csv(os.path.join(dirlist["data"], FILE_NAME))
-        DandP.csv = [[strip_accents(x.strip('"')) for x in y] for y in bestandsinhoud]
+        DandP.csv = iter_address_file()
         DandP.pickle()
     else:
         print('"adressenbestand.p" en {} ontbreken in de data-directory en kunnen daarom niet geladen worden. Start nu met downloaden van {} .'.format(FILE_NAME, DATA_URL))
         DandP.download()
         DandP.pickle()
+    DandP.save_store()
     return DandP.address_book
 
-def load_address_file():
+def iter_address_file(zipfile=None):
     """
-    Tries to load the pickled address file from the data directory. In case this fails it tries 
-    to load the .csv version. If this also fails it will download, pickle the address file and
-    save the pickle to 'adressenbestand.p' 
+    Generator that streams the rows of the .csv address file in the data directory 
+    (or in the downloaded zipfile), stripped of accents, one row at a time. When the 
+    file is missing it is downloaded. Rows are read, decompressed and stripped in a 
+    separate thread, ahead of the consumer (see load.iter_queued).
     """
-    DandP = DownloadAndPickle()
     datafiles = os.listdir(dirlist["data"])
-    if FILE_NAME in datafiles:
-        bestandsinhoud = load.csv(os.path.join(dirlist["data"], FILE_NAME))
-        return [[strip_accents(x.strip('"')) for x in y] for y in bestandsinhoud]
+    if zipfile is not None:
+        rows = load.iter_csv(zipfile, zippedfile=FILE_NAME)
+    elif FILE_NAME in datafiles:
+        rows = load.iter_csv(os.path.join(dirlist["data"], FILE_NAME))
     else:
         print('"adressenbestand.p" en {} ontbreken in de data-directory en kunnen daarom niet geladen worden. Start nu met downloaden van {} .'.format(FILE_NAME, DATA_URL))
-        DandP.download()
-        return [[strip_accents(x.strip('"')) for x in y] for y in DandP.csv]
+        rows = load.iter_csv(DownloadAndPickle().download_zip(), zippedfile=FILE_NAME)
+    yield from load.iter_queued([strip_accents(x) for x in row] for row in rows if row[0] != 'id') # skips the header
+
+
+def load_address_file():
+    """
+    Streams the rows of the .csv address file from the data directory, see 
+    iter_address_file. If this fails it will download the address file. 
+    """
+    return iter_address_file()
+
+
+def partitions_index(directory):
+    'returns the index of the partitioned store in directory, the cities of every province'
+    with open(os.path.join(directory, PARTITIONS_INDEX)) as f:
+        return json.load(f)
+
+
+def read_provinces(addressfile=None):
+    'returns the province code of every city in addressfile, which defaults to streaming the address file'
+    if addressfile is None:
+        addressfile = iter_address_file()
+    return {normalize.normalize(line[9]): line[14] for line in addressfile}
+
+
+def save_delta(filename, delta):
+    'appends delta (see AddressBook.update) to the delta file filename'
+    with open(filename, 'ab') as f:
+        pickle.dump(delta, f)
+
+
+def iter_deltas(filename):
+    'yields the deltas in the delta file filename, oldest first'
+    with open(filename, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
 
 
 class AddressTypeError(Exception):
     pass
 
 
+class UpdateError(Exception):
+    pass
+
+
+class PartitionError(Exception):
+    pass
+
+
 class Address(object):
     '''
     Object with address information,  and x- y-RDcoordinates, 
     '''
+    __slots__ = ('city', 'street', 'housenumber', 'x', 'y', 'address_string')
+
     def __init__(self, city=None, street=None, houseno=0, x=0, y=0, address_string=None):
         self.city = city
         self.street = street
@@ -145,14 +261,272 @@ class Address(object):
         return " ".join([self.city, self.street, str(self.housenumber), 'x = %s, y = %s' %(str(self.x), str(self.y))])
 
 
+SearchResult = namedtuple('SearchResult', ['address_string', 'city', 'street', 'housenumber', 'x', 'y', 'errors', 'lat', 'lon'],
+                          defaults=((), ()))
+SearchResult.__doc__ = '''
+Immutable outcome of one AddressSearch: the (uppercased) address string,
+tuples with the cities, streets, housenumbers and x- y-RDcoordinates found
+and a tuple with the errors logged while searching. lat and lon hold the 
+WGS84 coordinates when they were asked for (see with_wgs84).
+'''
+
+
+def with_wgs84(results):
+    '''
+    Returns the SearchResults in results with their WGS84 lat and lon filled in,
+    converted from their x-, y-RDcoordinates in one (vectorized) conversion.
+    '''
+    results = list(results)
+    xs = [x for result in results for x in result.x]
+    ys = [y for result in results for y in result.y]
+    lats, lons = coordinates.rd_to_wgs84(xs, ys)
+    converted, start = [], 0
+    for result in results:
+        end = start + len(result.x)
+        converted.append(result._replace(lat=tuple(float(x) for x in lats[start:end]), lon=tuple(float(x) for x in lons[start:end])))
+        start = end
+    return converted
+
+
+class SearchError(namedtuple('SearchError', ['kind', 'address_string', 'values'])):
+    '''
+    Record of a problem found while searching address_string: kind is one of
+    MESSAGES and values are the cities, streets, housenumbers (or misspellings)
+    involved. str() gives the message.
+    '''
+    __slots__ = ()
+
+    MESSAGES = {
+        'combinations': lambda s, city_street: '%d stad - straat combinaties gevonden: %s in PRIO-code: "%s"' %(len(city_street), " en ".join([" - ".join(x) for x in city_street]), s),
+        'housenumbers': lambda s, city, street, houseno: 'Meerdere huisnrs gevonden: %s in %s - %s in PRIO-code: "%s"' %(", ".join(houseno), city, street, s),
+        'cities': lambda s, cities: 'Meerdere steden gevonden: %s. voor: %s' % (", ".join(cities), s),
+        'fuzzy city': lambda s, term, city, distance: 'Stad "%s" niet gevonden, wel "%s" (%d verschil) in PRIO-code: "%s"' %(term, city, distance, s),
+        'fuzzy street': lambda s, term, street, city, distance: 'Straat "%s" niet gevonden, wel "%s" in %s (%d verschil) in PRIO-code: "%s"' %(term, street, city, distance, s),
+    }
+
+    def __str__(self):
+        return self.MESSAGES[self.kind](self.address_string, *self.values)
+
+
+Delta = namedtuple('Delta', ['inserts', 'updates', 'deletes'])
+Delta.__doc__ = '''
+Changes between an address book and a newer address file: the rows with a 
+new id (inserts), the rows with a new changed_date (updates) and the ids of
+the rows that are gone (deletes).
+'''
+
+
+Nearest = namedtuple('Nearest', ['city', 'street', 'min', 'max', 'x', 'y', 'distance'])
+Nearest.__doc__ = 'housenumber range found by AddressBook.nearest and its distance (in meters) to the coordinate searched'
+
+
+class Records(object):
+    '''
+    The rows of the address file in an address book by id (see AddressBook.update): 
+    their changed_date, postal code, city, street and housenumber range, in parallel
+    lists and arrays with one row index per id. The city and street of a row are an
+    index in keys, the (city, street) pairs. A removed row leaves its index unused 
+    until compact.
+    '''
+    COLUMNS = [('mins', 'i'), ('maxs', 'i'), ('types', 'B'), ('xs', 'd'), ('ys', 'd'), ('streets', 'I')]
+
+    def __init__(self):
+        self.rows = {}
+        self.keys, self.key_ids = [], {}
+        self.dates, self.postal_codes = [], []
+        for name, typecode in self.COLUMNS:
+            setattr(self, name, array(typecode))
+
+    @classmethod
+    def from_columns(cls, rows, keys, dates, postal_codes, streets, mins, maxs, types, xs, ys):
+        'creates records from the row index of every id, the (city, street) keys and the columns of the rows'
+        records = cls()
+        records.rows, records.keys, records.key_ids = rows, keys, {key: i for i, key in enumerate(keys)}
+        records.dates, records.postal_codes = dates, postal_codes
+        records.streets, records.mins, records.maxs, records.types, records.xs, records.ys = streets, mins, maxs, types, xs, ys
+        return records
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __contains__(self, row_id):
+        return row_id in self.rows
+
+    def __eq__(self, other):
+        return isinstance(other, Records) and dict(self.items()) == dict(other.items())
+
+    def add(self, row_id, changed_date, postal_code, city, street, min_housen, max_housen, addresstype, x, y):
+        'adds (or replaces) the row with id row_id'
+        key = (city, street)
+        if key not in self.key_ids:
+            self.key_ids[key] = len(self.keys)
+            self.keys.append(key)
+        self.rows[row_id] = len(self.dates)
+        self.dates.append(changed_date)
+        self.postal_codes.append(postal_code)
+        self.mins.append(min_housen)
+        self.maxs.append(max_housen)
+        self.types.append(addresstype)
+        self.xs.append(x)
+        self.ys.append(y)
+        self.streets.append(self.key_ids[key])
+
+    def record(self, i):
+        'the row with index i: (changed_date, postal_code, city, street, min, max, type code, x, y)'
+        city, street = self.keys[self.streets[i]]
+        return (self.dates[i], self.postal_codes[i], city, street, self.mins[i], self.maxs[i], self.types[i], self.xs[i], self.ys[i])
+
+    def changed_date(self, row_id):
+        'the changed_date of the row with id row_id, None when there is no such row'
+        i = self.rows.get(row_id)
+        return None if i is None else self.dates[i]
+
+    def pop(self, row_id):
+        'removes the row with id row_id and returns it (see record), raises KeyError when there is no such row'
+        return self.record(self.rows.pop(row_id))
+
+    def items(self):
+        'the (id, record) pairs of all rows'
+        return ((row_id, self.record(i)) for row_id, i in self.rows.items())
+
+    def compact(self):
+        'drops the unused row indexes of removed rows and the keys no row uses any more'
+        order = sorted(self.rows.values())
+        used = sorted(set(self.streets[i] for i in order))
+        key_of = {old: new for new, old in enumerate(used)}
+        rows = dict(zip(sorted(self.rows, key=self.rows.__getitem__), range(len(order))))
+        streets = array('I', [key_of[self.streets[i]] for i in order])
+        columns = [array(getattr(self, name).typecode, [getattr(self, name)[i] for i in order]) for name in ['mins', 'maxs', 'types', 'xs', 'ys']]
+        compacted = Records.from_columns(rows, [self.keys[i] for i in used], [self.dates[i] for i in order],
+                                         [self.postal_codes[i] for i in order], streets, *columns)
+        self.__dict__.update(compacted.__dict__)
+
+
 class PostalCode(object):
-    'Object with all Dutch postal codes (under ".codes")'
+    '''
+    Object with all Dutch postal codes (under ".codes") and an index of their 
+    housenumber ranges and x-, y-RDcoordinates, stored in parallel arrays that 
+    are sorted on the packed postal code (see store.pack_postal_code) and min.
+    A postal code and housenumber are looked up with a binary search, without 
+    an AddressBook. 
+    '''
     
     def __init__(self, addressfile=None):
-        if not addressfile:
-            addressfile = load_address_file()
-        all_codes = set([(line[1], line[9], line[8]) for line in addressfile])
-        self.codes = {postal_code: (city, street) for postal_code, city, street in all_codes}
+        if addressfile is None:
+            addressfile = iter_address_file()
+        self.codes = {}
+        self.packed = array('I')
+        self.mins, self.maxs = array('i'), array('i')
+        self.types = array('B')
+        self.xs, self.ys = array('d'), array('d')
+        self.sorted = True
+        for line in addressfile:
+            self.add(line[1], line[9], line[8], HouseNumber(int(line[5]), int(line[6]), line[7].upper(), float(line[17]), float(line[18])))
+
+    @classmethod
+    def from_arrays(cls, codes, packed, mins, maxs, types, xs, ys):
+        'creates postal codes from a codes dict and arrays (or memoryviews) that are already sorted'
+        postal_code = cls([])
+        postal_code.codes = codes
+        postal_code.packed, postal_code.mins, postal_code.maxs, postal_code.types, postal_code.xs, postal_code.ys = packed, mins, maxs, types, xs, ys
+        return postal_code
+
+    def __setstate__(self, state):
+        self.__init__([]) # postal codes pickled before the index existed only have codes
+        self.__dict__.update(state)
+
+    def __getitem__(self, postal_code):
+        return self.codes[postal_code]
+
+    def add(self, postal_code, city, street, housenumber=None):
+        self.codes[postal_code] = (city, street)
+        packed = store.pack_postal_code(postal_code)
+        if housenumber is not None and packed is not None:
+            self.packed.append(packed)
+            self.mins.append(housenumber.min)
+            self.maxs.append(housenumber.max)
+            self.types.append(housenumber.code)
+            self.xs.append(housenumber.x)
+            self.ys.append(housenumber.y)
+            self.sorted = False
+
+    def remove(self, postal_code, housenumber):
+        '''
+        Removes the housenumber range of postal_code equal to housenumber from the 
+        index, and the postal code when none of its ranges are left.
+        '''
+        self.remove_many([(postal_code, housenumber)])
+
+    def remove_many(self, ranges):
+        '''
+        Removes the housenumber ranges in ranges, (postal code, HouseNumber) pairs, 
+        in one pass over the index, and the postal codes that have no ranges left.
+        '''
+        removed = Counter((store.pack_postal_code(postal_code), x.min, x.max, x.code, x.x, x.y) for postal_code, x in ranges)
+        if not removed:
+            return
+        keep = []
+        for i, key in enumerate(zip(self.packed, self.mins, self.maxs, self.types, self.xs, self.ys)):
+            if removed[key]:
+                removed[key] -= 1
+            else:
+                keep.append(i)
+        if len(keep) < len(self.packed):
+            for column in ['packed', 'mins', 'maxs', 'types', 'xs', 'ys']:
+                values = getattr(self, column)
+                setattr(self, column, array(values.typecode, [values[i] for i in keep]))
+        left = set(self.packed)
+        for postal_code, _ in ranges:
+            if store.pack_postal_code(postal_code) not in left:
+                self.codes.pop(postal_code, None)
+
+    def extend(self, other):
+        'adds the codes and housenumber ranges of PostalCode other'
+        self.codes.update(other.codes)
+        for column in ['packed', 'mins', 'maxs', 'types', 'xs', 'ys']:
+            getattr(self, column).extend(getattr(other, column))
+        self.sorted = False
+
+    def sort(self):
+        '''
+        sorts the index on packed postal code and min (and the other columns, so the
+        order does not depend on the order of adding), done once before the first lookup
+        '''
+        if self.sorted:
+            return
+        order = sorted(range(len(self.packed)), key=lambda i: (self.packed[i], self.mins[i], self.maxs[i], self.types[i], self.xs[i], self.ys[i]))
+        for column in ['packed', 'mins', 'maxs', 'types', 'xs', 'ys']:
+            values = getattr(self, column)
+            setattr(self, column, array(values.typecode, [values[i] for i in order]))
+        self.sorted = True
+
+    def find(self, postal_code, housen=0):
+        '''
+        Returns the x-, y-RDcoordinate of the housenumber range of postal_code 
+        that contains housen, or of the closest range on the same side of the 
+        street. Without a housenumber the range halfway the postal code is used.
+        Raises KeyError when the postal code is not in the index.
+        '''
+        self.sort()
+        packed = store.pack_postal_code(postal_code)
+        if packed is None:
+            raise KeyError(postal_code)
+        start = bisect_left(self.packed, packed)
+        end = bisect_right(self.packed, packed, start)
+        if start == end:
+            raise KeyError(postal_code)
+        if housen == 0:
+            i = int((start + end) / 2)
+            return self.xs[i], self.ys[i]
+        side = [i for i in range(start, end) if NUMBER_TYPES[self.types[i]] in ("MIXED", even(housen))] or list(range(start, end))
+        for i in side:
+            if self.mins[i] <= housen <= self.maxs[i]:
+                return self.xs[i], self.ys[i]
+        i = min(side, key=lambda i: min(abs(self.mins[i] - housen), abs(self.maxs[i] - housen)))
+        return self.xs[i], self.ys[i]
 
 
 class HouseNumber(object):
@@ -164,15 +538,35 @@ class HouseNumber(object):
     - mixed (both odd and even combined)
     
     The match(housn) method checks whether a housnumber falls within 
-    its own range. 
+    its own range. The type is kept as its position in NUMBER_TYPES (code),
+    numbertype can be given as either.
     """
+    __slots__ = ('min', 'max', 'code', 'x', 'y', 'lat', 'lon')
     
-    def __init__(self, min_housen, max_housen, numbertype, x, y):
+    def __init__(self, min_housen, max_housen, numbertype, x, y, lat=None, lon=None):
         self.min = min_housen
         self.max = max_housen
         self.type = numbertype
         self.x = x
         self.y = y
+        self.lat = lat
+        self.lon = lon
+
+    @property
+    def type(self):
+        return NUMBER_TYPES[self.code]
+
+    @type.setter
+    def type(self, numbertype):
+        self.code = numbertype if isinstance(numbertype, int) else NUMBER_TYPES.index(numbertype)
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        self.lat, self.lon = None, None # pickled before housenumbers had a lat and lon
+        for name, value in state.items():
+            setattr(self, name, value)
 
     def match(self, housen):
         '''
@@ -211,21 +605,79 @@ class Street(object):
     including an extra:
     - multi (housenumbers with more than one of the above types 
       are found.
+    The housenumber ranges are stored in parallel arrays (mins, maxs,
+    types, xs and ys) that are sorted on min once, before the first 
+    lookup. When the housenumbers have a WGS84 lat and lon these are 
+    kept in two more (single precision) arrays, lats and lons.
     '''
+    __slots__ = ('name', 'mins', 'maxs', 'types', 'xs', 'ys', 'lats', 'lons', 'sides', 'sorted', 'min', 'max', 'len', 'type', 'lines')
     
     def __init__(self, name):
         self.name = name
-        self.housenumbers = []
+        self.mins, self.maxs = array('i'), array('i')
+        self.types = array('B')
+        self.xs, self.ys = array('d'), array('d')
+        self.lats, self.lons = None, None
+        self.sides = None
+        self.lines = None
+        self.sorted = True
         self.min = float('inf')
         self.max = 0
         self.len = 0
         self.type = None
+
+    @classmethod
+    def from_arrays(cls, name, mins, maxs, types, xs, ys):
+        '''
+        Creates a street from arrays (or memoryviews) that are already sorted
+        on min. The arrays are used as is, they are not copied.
+        '''
+        street = cls(name)
+        street.mins, street.maxs, street.types, street.xs, street.ys = mins, maxs, types, xs, ys
+        street.len = len(mins)
+        if street.len:
+            street.min = mins[0]
+            street.max = max(maxs)
+            types = set(types)
+            street.type = NUMBER_TYPES[types.pop()] if len(types) == 1 else "multi"
+        street.index_sides()
+        return street
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__ if name != 'lines'}
+
+    def __setstate__(self, state):
+        housenumbers = state.pop('housenumbers', None)
+        self.lats, self.lons, self.sides, self.lines = None, None, None, None
+        for name, value in state.items():
+            setattr(self, name, value)
+        if housenumbers is not None: # street was pickled when it still contained HouseNumber objects
+            self.__init__(self.name)
+            for housenumber in housenumbers:
+                self.add(housenumber)
+            self.sort()
+
+    @property
+    def housenumbers(self):
+        'the housenumber ranges of the street as HouseNumber objects, sorted on min'
+        self.sort()
+        return [HouseNumber(*x) for x in zip(self.mins, self.maxs, self.types, self.xs, self.ys)]
    
     def add(self, housenumber):
         'adds housenumber to street and updates other attributes'
-        self.housenumbers.append(housenumber)
-        self.housenumbers.sort(key=lambda x: x.min)
-        self.min = self.housenumbers[0].min
+        lat, lon = getattr(housenumber, 'lat', None), getattr(housenumber, 'lon', None)
+        if self.len == 0 and lat is not None:
+            self.lats, self.lons = array('f'), array('f')
+        if self.lats is not None:
+            self.lats.append(float('nan') if lat is None else lat)
+            self.lons.append(float('nan') if lon is None else lon)
+        self.mins.append(housenumber.min)
+        self.maxs.append(housenumber.max)
+        self.types.append(housenumber.code)
+        self.xs.append(housenumber.x)
+        self.ys.append(housenumber.y)
+        self.sorted = False
+        self.min = min([self.min, housenumber.min])
         self.max = max([self.max, housenumber.max])  
         self.len += 1
         
@@ -233,6 +685,57 @@ class Street(object):
             self.type = housenumber.type
         elif self.type != housenumber.type:
             self.type = "multi" 
+
+    def remove(self, *housenumbers):
+        '''
+        removes the housenumber ranges equal to housenumbers in one pass, raises KeyError
+        (and removes none) when one of them is not in the street
+        '''
+        removed = Counter((x.min, x.max, x.code, x.x, x.y) for x in housenumbers)
+        keep = []
+        for i, key in enumerate(zip(self.mins, self.maxs, self.types, self.xs, self.ys)):
+            if removed[key]:
+                removed[key] -= 1
+            else:
+                keep.append(i)
+        missing = +removed
+        if missing:
+            raise KeyError(next(iter(missing)))
+        for column in ['mins', 'maxs', 'types', 'xs', 'ys'] + (['lats', 'lons'] if self.lats is not None else []):
+            values = getattr(self, column)
+            setattr(self, column, array(values.typecode, [values[i] for i in keep]))
+        self.len = len(keep)
+        self.min = min(self.mins, default=float('inf'))
+        self.max = max(self.maxs, default=0)
+        types = set(self.types)
+        self.type = None if not types else NUMBER_TYPES[types.pop()] if len(types) == 1 else "multi"
+        self.sorted = False
+
+    def sort(self):
+        'sorts the housenumber ranges on min (keeping the order of equal mins) and indexes the sides'
+        if self.sorted:
+            return
+        order = sorted(range(self.len), key=self.mins.__getitem__)
+        for column in ['mins', 'maxs', 'types', 'xs', 'ys'] + (['lats', 'lons'] if self.lats is not None else []):
+            values = getattr(self, column)
+            setattr(self, column, array(values.typecode, [values[i] for i in order]))
+        self.index_sides()
+        self.sorted = True
+
+    def index_sides(self):
+        '''
+        For "multi" streets, stores the positions of the housenumber ranges on
+        the EVEN and on the ODD side of the street (each including the MIXED 
+        ranges). Other streets are searched as a whole.
+        '''
+        self.lines = None
+        if self.type != "multi":
+            self.sides = None
+            return
+        self.sides = {}
+        for side in ["EVEN", "ODD"]:
+            codes = (NUMBER_TYPES.index("MIXED"), NUMBER_TYPES.index(side))
+            self.sides[side] = array('I', [i for i, code in enumerate(self.types) if code in codes])
     
     def find(self, housen=0):
         '''
@@ -240,63 +743,114 @@ class Street(object):
         is given, defaults to zero and returns the location of the housenumber
         halfway the street, rounding down. 
         '''
+        i = self.position(housen)
+        return self.xs[i], self.ys[i]
+
+    def find_wgs84(self, housen=0):
+        '''
+        Like find, but returns the WGS84 lat and lon: those of the address file
+        when they were loaded, else converted from the x-, y-RDcoordinate.
+        '''
+        i = self.position(housen)
+        if self.lats is not None and self.lats[i] == self.lats[i]: # nan when the row had no lat
+            return self.lats[i], self.lons[i]
+        return coordinates.rd_to_wgs84(self.xs[i], self.ys[i])
+
+    def find_interpolated(self, housen=0):
+        '''
+        Returns the x-, y-RDcoordinate of housen interpolated between (or extrapolated 
+        from) the ranges on its side of the street, and an accuracy radius in meters 
+        (see interpolation.Line). Without a housenumber, or without ranges on its 
+        side, the point halfway the street is returned.
+        '''
+        lines = self.index_lines()
+        if housen and lines[even(housen)] is not None:
+            return lines[even(housen)].point(housen, lines[None].spacing())
+        return lines[None].halfway()
+
+    def index_lines(self):
+        '''
+        Returns (and keeps) the interpolation.Line of the EVEN and of the ODD side of
+        the street (None for a side without ranges) and of all ranges (under None).
+        '''
+        self.sort()
+        if self.lines is None:
+            self.lines = {}
+            for side, codes in [("EVEN", ("MIXED", "EVEN")), ("ODD", ("MIXED", "ODD")), (None, NUMBER_TYPES)]:
+                ranges = sorted(((self.mins[i] + self.maxs[i]) / 2, self.xs[i], self.ys[i]) for i in range(self.len) if NUMBER_TYPES[self.types[i]] in codes)
+                self.lines[side] = interpolation.Line(*zip(*ranges)) if ranges else None
+        return self.lines
+
+    def position(self, housen=0):
+        'returns the position of the housenumber range that find uses for housen'
+        self.sort()
         if housen == 0:
-            return self.get_halfway()
+            return int(self.len/2)
         # when a housenumber is given and the street matches different types, find x, y
         # based on that side of the street (and on mixed types)
         elif self.type == "multi":   
-            housenumbers = [x for x in self.housenumbers if x.type == "MIXED" or x.type == even(housen)]
-            length = len(housenumbers)
-            return self.find_RD_coord(housen, housenumbers, length)
+            return self.find_RD_coord(housen, self.sides[even(housen)])
         else: # all housenumber types are of the same type
-            return self.find_RD_coord(housen, self.housenumbers, self.len)        
+            return self.find_RD_coord(housen)        
     
     def get_halfway(self):
         '''
         No housenumber was given thus return the x, y pair 
         for the housenumber halfway down the street
         '''
-        housenumber = self.housenumbers[int(self.len/2)] 
-        return housenumber.x, housenumber.y     
+        self.sort()
+        i = int(self.len/2)
+        return self.xs[i], self.ys[i]
 
-    def find_RD_coord(self, housen, housenumbers, length):
-        'returns x and y on a match, else searches up or down the set of housenumbers'
-        halfway = int(length/2)
-        match = housenumbers[halfway].match(housen)
-        if match == 9: # housenumber is incorrect thus return x, y halfway the the street
-            return self.gethalfway()
-        try:
+    def match(self, i, housen):
+        'HouseNumber.match for the housenumber range at position i'
+        numbertype = NUMBER_TYPES[self.types[i]]
+        if numbertype != "MIXED" and numbertype != even(housen):
+            return 9
+        if self.mins[i] <= housen <= self.maxs[i]:
+            return 0
+        elif housen < self.mins[i]:
+            return -1
+        else:
+            return 1
+
+    def find_RD_coord(self, housen, positions=None):
+        '''
+        Returns the position of the range matching housen, else searches up or 
+        down the housenumber ranges. positions are the positions of the ranges that are searched (None searches
+        the whole street). The search halves index bounds, so nothing is copied.
+        '''
+        start, length = 0, self.len if positions is None else len(positions)
+        while True:
+            halfway = int(length/2)
+            i = start + halfway
+            j = i if positions is None else positions[i]
+            match = self.match(j, housen)
+            if match == 9: # housenumber is incorrect thus return x, y halfway the the street
+                return int(self.len/2)
             if match == 0:
-                return housenumbers[halfway].x, housenumbers[halfway].y
-            elif len(housenumbers) == 1: # housenumber falls without the range in housenumbers
-                return self.find_closest_RD(housenumbers, housen) 
+                return j
+            elif length == 1: # housenumber falls without the range in housenumbers
+                return self.find_closest_RD(housen, i, positions)
             elif match == 1:
-                return self.find_RD_coord(housen, housenumbers[halfway:], length - halfway)
+                start, length = i, length - halfway
             else:
-                return self.find_RD_coord(housen, housenumbers[:halfway], halfway)
-        except RuntimeError:
-            raise Exception(housen, ["-".join([str(x.min), str(x.max)]) for x in  housenumbers], ["-".join([str(x.min), str(x.max)]) for x in self.housenumbers], length)
+                length = halfway
  
-    def find_closest_RD(self, housenumbers, housen):
-        'finds closest housenumberrange and return its x and y coordinate'
-        h = housenumbers[0]
-        housenos = [x for x in self.housenumbers if x.match_even_type(housen)]
-        i = housenos.index(h)
-        try:
-            fit = self.smallest_dist(housen, h, housenos[i-1], housenos[i+1])
-        except IndexError:
-            try: 
-                fit = self.smallest_dist(housen, h, housenos[i-1])
-            except IndexError:
-                fit = self.smallest_dist(housen, h)
-        print('Bij straat: "%s", is bij het gezochte huisnr %d de dichtsbijzijnde range: %d-%d uit het adresboek.' %(self.name, housen, fit.min, fit.max))
-        return fit.x, fit.y
+    def find_closest_RD(self, housen, i, positions=None):
+        'finds the housenumberrange closest to the one at index i and returns its position'
+        length = self.len if positions is None else len(positions)
+        neighbours = [i, (i - 1) % length] + ([i + 1] if i + 1 < length else []) # like list indexing, -1 is the last range
+        if positions is not None:
+            neighbours = [positions[k] for k in neighbours]
+        fit = self.smallest_dist(housen, *neighbours)
+        instrument.count('closest range')
+        log.debug('Bij straat: "%s", is bij het gezochte huisnr %d de dichtsbijzijnde range: %d-%d uit het adresboek.', self.name, housen, self.mins[fit], self.maxs[fit])
+        return fit
     
-    def smallest_dist(self, h, *housenumbers):
-        'looks for the housnumberrange closest to the housenumber that is sought'
-        minmax = {x:min(abs(x.min-h), abs(x.max-h)) for x in housenumbers}
-        return min(minmax, key=minmax.get)
-
+    def smallest_dist(self, h, *positions):
+        'looks for the position of the housnumberrange closest to the housenumber that is sought'
+        return min(positions, key=lambda i: min(abs(self.mins[i]-h), abs(self.maxs[i]-h)))
 
 
 class City(object):
@@ -304,9 +858,57 @@ class City(object):
     Contains streets, uses find with a street and a housenumber to find the 
     x-, y-coordinate. Add adds streets and housenumbers.  
     '''
+    __slots__ = ('name', 'streets', '_street_index', '_chop_index')
+
     def __init__(self, name):
         self.name = name
         self.streets = {}
+        self._street_index = None
+        self._chop_index = None
+
+    @property
+    def street_index(self):
+        'Matcher with all street names of the city'
+        if self._street_index is None:
+            self.index()
+        return self._street_index
+
+    @property
+    def chop_index(self):
+        'Matcher that finds streets by the parts of their names (see chops)'
+        if self._chop_index is None:
+            self.index()
+        return self._chop_index
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        self._street_index, self._chop_index = None, None # pickled before the indexes existed
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def index(self):
+        'builds the street and chop indexes, done once after loading or on first use'
+        self._street_index = Matcher(self.streets.keys())
+        self._chop_index = Matcher((chop, street) for street, chop in self.chops())
+
+    def chops(self):
+        '''
+        Returns (street, chop) pairs of parts of street names that identify a street
+        in the city: words longer than 4 characters (all words of streets that only 
+        have short words) that are unique within the city. Words shared by several
+        streets are combined with the rest of the street name before or after them.
+        '''
+        streetchops = []
+        for street in self.streets:
+            words = street.split(" ")
+            short = infmax([len(x) for x in words if x != self.name]) <= 4
+            streetchops.extend((street, strt) for strt in words if (len(strt) > 4 and strt != self.name) or short)
+        counts = Counter(chop for _, chop in streetchops)
+        single_chops = [chop for chop in streetchops if counts[chop[1]] == 1]
+        multi_chops = [chop for chop in streetchops if counts[chop[1]] > 1]
+        return list(set(single_chops + [part for street, chop in multi_chops for part in ((street, street.split(chop)[0] + chop), (street, chop + street.split(chop)[1])) if part[1] != chop]))
 
     def find(self, street, housen=0):
         'find the x-, y-coordinate of a given street and housenumber'
@@ -314,6 +916,8 @@ class City(object):
    
     def add(self, street, housenumber):
         'adds streets and housenumbers'
+        self._street_index = None
+        self._chop_index = None
         try:
             self.streets[street].add(housenumber)
         except KeyError:
@@ -321,32 +925,613 @@ class City(object):
             new_street.add(housenumber)
             self.streets[street] = new_street
 
+    def remove(self, street, *housenumbers):
+        'removes housenumber ranges of street, and the street when it has no ranges left'
+        self._street_index = None
+        self._chop_index = None
+        self.streets[street].remove(*housenumbers)
+        if not self.streets[street].len:
+            del self.streets[street]
+
+    def sort(self):
+        'sorts the housenumbers of all streets'
+        for street in self.streets.values():
+            street.sort()
+
+
+class MappedStreets(Mapping):
+    '''
+    Read-only dict of the streets of one city in an AddressStore. Streets are
+    built from the store when they are looked up.
+    '''
+    
+    def __init__(self, address_store, city_id):
+        self.store = address_store
+        self.city_id = city_id
+
+    def __getitem__(self, street):
+        rows = self.store.rows(self.store.street_id(self.city_id, street))
+        return Street.from_arrays(street, *[getattr(self.store, column)[rows.start:rows.stop] for column in ['min', 'max', 'type', 'x', 'y']])
+
+    def __iter__(self):
+        return (self.store.streets[i] for i in self.store.street_ids(self.city_id))
+
+    def __len__(self):
+        return len(self.store.street_ids(self.city_id))
+
+
+class MappedCities(Mapping):
+    'Read-only dict of the cities in an AddressStore'
+    
+    def __init__(self, address_store):
+        self.store = address_store
+        self.cache = {}
+
+    def __getitem__(self, city):
+        try:
+            return self.cache[city]
+        except KeyError:
+            new_city = City(city)
+            new_city.streets = MappedStreets(self.store, self.store.city_id(city))
+            self.cache[city] = new_city
+            return new_city
+
+    def __iter__(self):
+        return iter(self.store.cities)
+
+    def __len__(self):
+        return len(self.store.cities)
+
+
+class MappedPostalCodes(Mapping):
+    'Read-only dict of postal code: (city, street) in an AddressStore'
+    
+    def __init__(self, address_store):
+        self.store = address_store
+
+    def __getitem__(self, postal_code):
+        street_id = self.store.postal_street_id(postal_code)
+        return self.store.cities[self.store.street_city_id(street_id)], self.store.streets[street_id]
+
+    def __iter__(self):
+        return (store.unpack_postal_code(x) for x in self.store.postal_codes)
+
+    def __len__(self):
+        return len(self.store.postal_codes)
+
+
+class PartitionedCities(Mapping):
+    '''
+    Read-only dict of the cities in a partitioned store (see AddressBook.save_partitions).
+    The store of a province is mapped when one of its cities is first looked up,
+    the city is then copied into memory and kept in an LRUCache of max_cities
+    cities (unbounded when it is None).
+    '''
+    
+    def __init__(self, directory, partitions, provinces, max_cities=None):
+        self.directory = directory
+        self.partitions = partitions # province: store file
+        self.provinces = provinces # city: province
+        self.stores = {}
+        self.cache = LRUCache(max_cities or float('inf'))
+
+    def store(self, province):
+        'the AddressStore of province, mapped on first use'
+        if province not in self.stores:
+            self.stores[province] = store.AddressStore.open(os.path.join(self.directory, self.partitions[province]))
+        return self.stores[province]
+
+    def __getitem__(self, city):
+        province = self.provinces[city]
+        found = self.cache.get(city)
+        if found is None:
+            found = self.load(city, self.store(province))
+            self.cache.set(city, found)
+        return found
+
+    def load(self, city, address_store):
+        'copies city from address_store into memory'
+        new_city = City(city)
+        for street_id in address_store.street_ids(address_store.city_id(city)):
+            rows = address_store.rows(street_id)
+            columns = [array(typecode, getattr(address_store, column)[rows.start:rows.stop]) for column, typecode in
+                       [('min', 'i'), ('max', 'i'), ('type', 'B'), ('x', 'd'), ('y', 'd')]]
+            name = address_store.streets[street_id]
+            new_city.streets[name] = Street.from_arrays(name, *columns)
+        return new_city
+
+    def __iter__(self):
+        return iter(self.provinces)
+
+    def __len__(self):
+        return len(self.provinces)
+
+    def __contains__(self, city):
+        return city in self.provinces
+
+    def postal_code(self):
+        'PostalCode with the postal codes of the cities (copied from the stores of their provinces)'
+        postal_code = PostalCode([])
+        for province in self.partitions:
+            address_store = self.store(province)
+            packed = set()
+            for code, street_id in zip(address_store.postal_codes, address_store.postal_streets):
+                city = address_store.cities[address_store.street_city_id(street_id)]
+                if city in self.provinces:
+                    postal_code.codes[store.unpack_postal_code(code)] = (city, address_store.streets[street_id])
+                    packed.add(code)
+            for row in zip(address_store.postal_index, address_store.postal_min, address_store.postal_max, address_store.postal_type,
+                           address_store.postal_x, address_store.postal_y):
+                if row[0] in packed:
+                    for column, value in zip(['packed', 'mins', 'maxs', 'types', 'xs', 'ys'], row):
+                        getattr(postal_code, column).append(value)
+        postal_code.sorted = False
+        postal_code.sort()
+        return postal_code
+
+    def close(self):
+        self.cache.clear()
+        for address_store in self.stores.values():
+            address_store.close()
+        self.stores = {}
+
+
+class ReverseIndex(object):
+    '''
+    Spatial index over the x-, y-RDcoordinates of all housenumber ranges in an
+    address book, finds the ranges closest to a coordinate (see spatial.GridIndex).
+    '''
+    
+    def __init__(self, address_book, cell_size=250.0):
+        self.streets = []
+        self.street_ids = array('I')
+        self.mins, self.maxs = array('i'), array('i')
+        self.xs, self.ys = array('d'), array('d')
+        for city_name, city in address_book.cities.items():
+            for street_name, street in city.streets.items():
+                street.sort()
+                self.street_ids.extend([len(self.streets)] * street.len)
+                self.streets.append((city_name, street_name))
+                self.mins.extend(street.mins)
+                self.maxs.extend(street.maxs)
+                self.xs.extend(street.xs)
+                self.ys.extend(street.ys)
+        self.grid = GridIndex(self.xs, self.ys, cell_size)
+
+    def nearest(self, x, y, k=1, max_dist=None):
+        return [self.result(i, distance) for distance, i in self.grid.nearest(x, y, k, max_dist)]
+
+    def nearest_many(self, xs, ys, k=1, max_dist=None):
+        return [[self.result(i, distance) for distance, i in found] for found in self.grid.nearest_many(xs, ys, k, max_dist)]
+
+    def result(self, i, distance):
+        city, street = self.streets[self.street_ids[i]]
+        return Nearest(city, street, self.mins[i], self.maxs[i], self.xs[i], self.ys[i], distance)
+
 
 class AddressBook(object):
     
-    def __init__(self, load_postal_code=True):
+    def __init__(self, load_postal_code=True, cache_size=0, cache_ttl=None):
         raw_inhoud = load.csv(os.path.join(dirlist["data"], "plaatsnamen_schrijfwijze.csv"))
         bestandsinhoud = [[strip_accents(x.strip('"')) for x in y] for y in raw_inhoud]
         self.alternate_cities = {y:x[0] for x in bestandsinhoud for y in x[1:]}
 #        self.alternate_cities = {z[0].upper():tuple([a.upper() for a in z[1:]]) for x in bestandsinhoud for z in permutations(x)}
         self.cities = {}
+        self._city_index = None
+        self._reverse_index = None
+        self._bulk_index = None
+        self.set_cache(cache_size, cache_ttl)
+        self.set_fuzzy(None)
+        self.generation = 0
         if load_postal_code:
             self.load_postal_code()
 
-    def load(self, addressfile=None):
-        if not addressfile:
-            addressfile = load_address_file()
-        self.addressfile = addressfile
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if isinstance(self.__dict__.get('records'), dict): # pickled when the records were tuples
+            records = Records()
+            for row_id, record in state['records'].items():
+                records.add(row_id, *record)
+            self.records = records
+
+    @property
+    def reverse_index(self):
+        'ReverseIndex of all housenumber ranges, built on first use'
+        if getattr(self, '_reverse_index', None) is None:
+            self._reverse_index = ReverseIndex(self)
+        return self._reverse_index
+
+    def nearest(self, x, y, k=1, max_dist=None):
+        '''
+        Reverse geocoding: returns the k housenumber ranges (as Nearest tuples) 
+        closest to the x-, y-RDcoordinate, sorted on distance. Only ranges 
+        within max_dist meters are returned when it is given.
+        '''
+        return self.reverse_index.nearest(x, y, k, max_dist)
+
+    def nearest_many(self, xs, ys, k=1, max_dist=None):
+        'nearest for every coordinate in the parallel sequences (or NumPy arrays) xs and ys'
+        return self.reverse_index.nearest_many(xs, ys, k, max_dist)
+
+    def set_cache(self, maxsize=1024, ttl=None):
+        '''
+        Caches the x-, y-coordinates of at most maxsize (city, street, housenumber) 
+        lookups for ttl seconds (None keeps them until they are evicted). A maxsize
+        of 0 disables the cache.
+        '''
+        self.cache = LRUCache(maxsize, ttl) if maxsize else None
+
+    def set_fuzzy(self, max_distance=2):
+        '''
+        Enables fuzzy matching of misspelled city and street names (see 
+        fuzzy.FuzzyMatcher) with at most max_distance edits, for searches 
+        that find nothing otherwise. None disables fuzzy matching. Cached 
+        results are cleared, they were found with the previous setting.
+        '''
+        self.fuzzy = max_distance
+        self._fuzzy_city_index = None
+        self._fuzzy_street_index = None
+        self.invalidate()
+
+    @property
+    def fuzzy_city_index(self):
+        'FuzzyMatcher with all city names (and their alternate spellings), built on first use'
+        if getattr(self, '_fuzzy_city_index', None) is None:
+            names = [(city, city) for city in self.cities] + list(self.alternate_cities.items())
+            self._fuzzy_city_index = FuzzyMatcher(names, self.fuzzy)
+        return self._fuzzy_city_index
+
+    @property
+    def fuzzy_street_index(self):
+        'FuzzyMatcher with the street names of all cities, built on first use'
+        if getattr(self, '_fuzzy_street_index', None) is None:
+            self._fuzzy_street_index = FuzzyMatcher(set(street for city in self.cities.values() for street in city.streets), self.fuzzy)
+        return self._fuzzy_street_index
+
+    def invalidate(self):
+        'marks cached results (also those of AddressSearch) as stale after the address book changed'
+        self.generation = getattr(self, 'generation', 0) + 1
+        if getattr(self, 'cache', None):
+            self.cache.clear()
+
+    @property
+    def city_index(self):
+        '''
+        Matcher with all city names, built on first use. Found cities
+        that have an alternate spelling return that spelling instead.
+        '''
+        if getattr(self, '_city_index', None) is None:
+            self._city_index = Matcher((city, self.alternate_cities.get(city, city)) for city in self.cities)
+        return self._city_index
+
+    @classmethod
+    def open(cls, filename):
+        '''
+        Opens an address book store (see save_store) read-only through mmap. 
+        Streets and housenumbers are only read from the store when they are 
+        looked up.
+        '''
+        return cls.from_store(store.AddressStore.open(filename))
+
+    @classmethod
+    def from_store(cls, address_store):
+        'read-only address book on an AddressStore, e.g. one in shared memory (see shared.py)'
+        address_book = cls(load_postal_code=False)
+        address_book.records = None # read-only, can not be updated
+        address_book.store = address_store
+        address_book.cities = MappedCities(address_store)
+        address_book.postal_code = PostalCode.from_arrays(MappedPostalCodes(address_store), address_store.postal_index, address_store.postal_min,
+                                                          address_store.postal_max, address_store.postal_type, address_store.postal_x, address_store.postal_y)
+        return address_book
+
+    def save_store(self, filename, cities=None):
+        '''
+        writes the address book (only the cities in cities when it is given) to a compact 
+        store that can be opened with AddressBook.open
+        '''
+        store.write(filename, self.city_rows(cities), *self.postal_rows(cities))
+
+    def city_rows(self, cities=None):
+        'the cities (only those in cities when it is given) with their streets and housenumber ranges, as store.build_columns takes them'
+        self.sort()
+        if cities is None:
+            selected = self.cities
+        else:
+            wanted = set(cities)
+            selected = [x for x in self.cities if x in wanted]
+        return ((name, ((street_name, zip(street.mins, street.maxs, street.types, street.xs, street.ys))
+                        for street_name, street in self.cities[name].streets.items())) for name in selected)
+
+    def postal_rows(self, cities=None):
+        'the postal codes and postal code ranges (only those of cities when it is given), as store.build_columns takes them'
+        postal_code = getattr(self, 'postal_code', None)
+        if postal_code is None:
+            return (), ()
+        postal_code.sort()
+        postal_codes = [(code, normalize.normalize(city), normalize.normalize(street)) for code, (city, street) in postal_code.codes.items()]
+        if cities is not None:
+            wanted = set(cities)
+            postal_codes = [x for x in postal_codes if x[1] in wanted]
+        packed = set(store.pack_postal_code(code) for code, _, _ in postal_codes)
+        postal_ranges = (x for x in zip(postal_code.packed, postal_code.mins, postal_code.maxs, postal_code.types, postal_code.xs, postal_code.ys)
+                         if cities is None or x[0] in packed)
+        return postal_codes, postal_ranges
+
+    def columns(self, postal_codes=False):
+        '''
+        Returns the cities, streets and housenumber ranges (and the postal codes when
+        postal_codes is True) as the sections of a store (a dict of arrays, see 
+        store.build_columns), those of the store itself when the address book was 
+        opened from one.
+        '''
+        if getattr(self, 'store', None) is not None:
+            return {name: getattr(self.store, name) for name, _ in store.SECTIONS}
+        return store.build_columns(self.city_rows(), *(self.postal_rows() if postal_codes else ()))
+
+    @property
+    def bulk_index(self):
+        'bulk.BulkIndex of all housenumber ranges, built on first use'
+        if getattr(self, '_bulk_index', None) is None:
+            self._bulk_index = bulk.BulkIndex(self.columns(), self.alternate_cities)
+        return self._bulk_index
+
+    def find_bulk(self, cities, streets, housenumbers):
+        '''
+        Looks up the parallel sequences (or NumPy arrays) of cities, streets and 
+        housenumbers at once. Returns NumPy arrays with the x- and y-RDcoordinates
+        (NaN when the address is not found) and a status code per address (see 
+        bulk.STATUS).
+        '''
+        return self.bulk_index.lookup(cities, streets, housenumbers)
+
+    def save_partitions(self, directory, provinces=None):
+        '''
+        Writes the address book to a store per province (see save_store) in directory,
+        with an index of the cities per province. A partitioned store is opened with
+        AddressBook.open_partitions. provinces (city: province code) defaults to the
+        provinces of the rows loaded (see read_provinces for other address books),
+        raises PartitionError when the province of a city is unknown.
+        '''
+        provinces = provinces or getattr(self, 'provinces', None) or {}
+        missing = [city for city in self.cities if not provinces.get(city)]
+        if missing:
+            raise PartitionError('The province of %d cities is unknown (e.g. %s), see read_provinces.' % (len(missing), missing[0]))
+        os.makedirs(directory, exist_ok=True)
+        partitions = {}
+        for city in self.cities:
+            partitions.setdefault(provinces[city], []).append(city)
+        index = {}
+        for province, cities in sorted(partitions.items()):
+            filename = '%s.bin' % province
+            self.save_store(os.path.join(directory, filename), cities)
+            index[province] = {'file': filename, 'cities': sorted(cities)}
+        with open(os.path.join(directory, PARTITIONS_INDEX), 'w') as f:
+            json.dump(index, f)
+
+    @classmethod
+    def open_partitions(cls, directory, cities=None, provinces=None, max_cities=None):
+        '''
+        Opens a partitioned store (see save_partitions) with only the cities in cities 
+        and the cities of the province codes in provinces (all cities when both are None). 
+        Only the city names stay in memory, a city (its streets and housenumbers) is read
+        from the store of its province when it is first looked up. At most max_cities 
+        cities are kept, the least recently used are evicted first. 
+        '''
+        index = partitions_index(directory)
+        cities = None if cities is None else set(normalize.normalize(x) for x in cities)
+        selected = {}
+        for province, partition in index.items():
+            for city in partition['cities']:
+                if (cities is None and provinces is None) or (cities is not None and city in cities) or (provinces is not None and province in provinces):
+                    selected[city] = province
+        address_book = cls(load_postal_code=False)
+        address_book.records = None # read-only, can not be updated
+        address_book.cities = PartitionedCities(directory, {x: index[x]['file'] for x in set(selected.values())}, selected, max_cities)
+        address_book.postal_code = address_book.cities.postal_code()
+        return address_book
+
+    def load(self, addressfile=None, wgs84=False, workers=1):
+        '''
+        Fills the address book and its postal codes in one pass over addressfile,
+        an iterable of rows that defaults to streaming the address file. With 
+        wgs84 the lat and lon of every row are kept as well (see find_wgs84).
+        More than one worker (None for one per CPU) builds the cities in 
+        worker processes, see load_parallel.
+        '''
+        if addressfile is None:
+            addressfile = iter_address_file()
+        if workers != 1:
+            return self.load_parallel(addressfile, wgs84, workers)
+        self.postal_code = PostalCode([])
+        self.records = Records()
+        self.provinces = {}
+        self.wgs84 = wgs84
         print('filling Address Book...')
-        for line in self.addressfile:
-            min_housen, max_housen, addresstype, street, city, x, y = [int(x) for x in line[5:7]] + [x.upper() for x in line[7:10]] + [float(x) for x in line[17:19]]
-            new_address = HouseNumber(min_housen, max_housen, addresstype, x, y)
-            self.add(city, street, new_address)
+        for line in addressfile:
+            self.add_row(line)
+        self.sort()
+        self.index()
+
+    def load_parallel(self, addressfile, wgs84=False, workers=None):
+        '''
+        Like load, but in a pool of worker processes. Rows of addressfile are 
+        streamed to the workers in batches of BATCH_SIZE, a few batches per worker
+        at a time, and come back as compact columns (see parse_rows). The cities
+        are then split over PARTITIONS_PER_WORKER partitions per worker (on a hash
+        of their name), the workers build the City objects of a partition each 
+        (see build_cities) and the cities of all partitions are merged. Cities and
+        streets keep the order in which they first appear in addressfile, so the 
+        address book equals the one that load builds in a single process. The 
+        garbage collector is paused meanwhile (see paused_gc).
+        '''
+        workers = workers or os.cpu_count()
+        parts = workers * PARTITIONS_PER_WORKER
+        self.postal_code = PostalCode([])
+        self.provinces = {}
+        self.wgs84 = wgs84
+        print('filling Address Book...')
+        street_ids, street_local = {}, array('I')
+        part_keys, part_rows, part_streets = [[] for _ in range(parts)], [array('I') for _ in range(parts)], [array('I') for _ in range(parts)]
+        columns = {name: array(typecode) for name, typecode in ROW_COLUMNS}
+        rows, dates, postal_codes, row_streets = {}, [], [], array('I')
+        with paused_gc(), multiprocessing.Pool(workers) as pool:
+            batches = ((lines, wgs84, parts) for lines in iter_batches(addressfile, BATCH_SIZE))
+            for keys, key_of, batch, texts, by_part in imap_bounded(pool, parse_rows, batches, workers * 2):
+                keys = [(sys.intern(city), sys.intern(street)) for city, street in keys]
+                ids, local_ids = [], []
+                for key in keys:
+                    street_id = street_ids.setdefault(key, len(street_ids))
+                    if street_id == len(street_local): # a new street, in the partition of its city
+                        part = partition_of(key[0], parts)
+                        street_local.append(len(part_keys[part]))
+                        part_keys[part].append(key)
+                    ids.append(street_id)
+                    local_ids.append(street_local[street_id])
+                start = len(columns['min'])
+                for name, _ in ROW_COLUMNS:
+                    columns[name].extend(batch[name])
+                for part, positions in by_part.items():
+                    part_rows[part].extend(map(start.__add__, positions))
+                    part_streets[part].extend(map(local_ids.__getitem__, map(key_of.__getitem__, positions)))
+                row_ids, changed_dates, codes, city_names, street_names, provinces = texts
+                rows.update(zip(row_ids, range(start, start + len(row_ids))))
+                row_streets.extend(map(ids.__getitem__, key_of))
+                dates.extend(map(sys.intern, changed_dates))
+                codes = list(map(sys.intern, codes))
+                postal_codes.extend(codes)
+                self.postal_code.codes.update(zip(codes, zip(map(sys.intern, city_names), map(sys.intern, street_names))))
+                self.provinces.update(zip(map([city for city, _ in keys].__getitem__, key_of), provinces))
+            names = ['min', 'max', 'type', 'x', 'y'] + (['lat', 'lon'] if wgs84 else [])
+            partitions = ((part_keys[part], part_streets[part], {name: array(columns[name].typecode, map(columns[name].__getitem__, part_rows[part])) for name in names}, wgs84)
+                          for part in range(parts) if part_keys[part])
+            cities = {}
+            for built in pool.imap_unordered(build_cities, partitions):
+                cities.update(built)
+        self.add_cities({city: cities[city] for city in dict.fromkeys(city for city, _ in street_ids)})
+        self.records = Records.from_columns(rows, list(street_ids), dates, postal_codes, row_streets, *[columns[name] for name in ['min', 'max', 'type', 'x', 'y']])
+        postal = [i for i, packed in enumerate(columns['packed']) if packed >= 0]
+        for name, column in [('packed', 'packed'), ('mins', 'min'), ('maxs', 'max'), ('types', 'type'), ('xs', 'x'), ('ys', 'y')]:
+            setattr(self.postal_code, name, array(getattr(self.postal_code, name).typecode, [columns[column][i] for i in postal]))
+        self.postal_code.sorted = False
+        self.sort()
+        self.index(streets=False)
+
+    def add_cities(self, cities):
+        'adds the City objects in dict cities, that are not in the address book yet'
+        self._city_index = None
+        self._reverse_index = None
+        self._bulk_index = None
+        self._fuzzy_city_index = None
+        self._fuzzy_street_index = None
+        self.cities.update(cities)
+        self.invalidate()
+
+    def add_row(self, line):
+        '''
+        Adds one row of the address file to the address book and its postal codes,
+        and remembers its id and changed_date (see update). Names, postal codes and
+        dates are interned, so the rows of a street share one string of each.
+        '''
+        min_housen, max_housen, addresstype, street, city, x, y = [int(x) for x in line[5:7]] + [normalize.normalize(x) for x in line[7:10]] + [float(x) for x in line[17:19]]
+        street, city = sys.intern(street), sys.intern(city)
+        new_address = HouseNumber(min_housen, max_housen, addresstype, x, y)
+        if getattr(self, 'wgs84', False):
+            new_address.lat, new_address.lon = float(line[15]), float(line[16])
+        self.add(city, street, new_address)
+        postal_code = sys.intern(line[1])
+        self.postal_code.add(postal_code, sys.intern(line[9]), sys.intern(line[8]), new_address)
+        self.records.add(line[0], sys.intern(line[20]), postal_code, city, street, min_housen, max_housen, new_address.code, x, y)
+        self.provinces[city] = line[14]
+
+    def remove_row(self, row_id):
+        'removes the row with id row_id (added with add_row) from the address book and its postal codes'
+        self.remove_rows([row_id])
+
+    def remove_rows(self, row_ids):
+        '''
+        Removes the rows with ids row_ids from the address book and its postal codes.
+        Every street involved and the postal code index are rebuilt once.
+        '''
+        streets, postal_ranges = {}, []
+        for row_id in row_ids:
+            _, postal_code, city, street, min_housen, max_housen, addresstype, x, y = self.records.pop(row_id)
+            housenumber = HouseNumber(min_housen, max_housen, addresstype, x, y)
+            streets.setdefault((city, street), []).append(housenumber)
+            postal_ranges.append((postal_code, housenumber))
+        for (city, street), housenumbers in streets.items():
+            self.remove(city, street, *housenumbers)
+        self.postal_code.remove_many(postal_ranges)
+
+    def diff(self, addressfile):
+        'compares the rows of addressfile with the rows in the address book on id and changed_date, returns a Delta'
+        inserts, updates, ids = [], [], set()
+        for line in addressfile:
+            if line[0] == 'id': # header
+                continue
+            ids.add(line[0])
+            changed_date = self.records.changed_date(line[0])
+            if changed_date is None:
+                inserts.append(line)
+            elif changed_date != line[20]:
+                updates.append(line)
+        return Delta(inserts, updates, [row_id for row_id in self.records if row_id not in ids])
+
+    def apply(self, delta):
+        'applies the inserts, updates and deletes of delta to the streets, postal codes and indexes they affect'
+        self.remove_rows(delta.deletes + [line[0] for line in delta.updates])
+        for line in delta.updates + delta.inserts:
+            self.add_row(line)
+        self.sort()
+
+    def update(self, addressfile=None, deltafile=None):
+        '''
+        Updates the address book to a newer addressfile (defaults to streaming the
+        address file) by applying only the rows that were inserted, changed or 
+        deleted. The changes are appended to deltafile when it is given. Returns
+        the Delta.
+        '''
+        if getattr(self, 'records', None) is None:
+            raise UpdateError('The address book has no row ids, it has to be loaded again (see load) before it can be updated.')
+        if addressfile is None:
+            addressfile = iter_address_file()
+        delta = self.diff(addressfile)
+        self.apply(delta)
+        if deltafile:
+            save_delta(deltafile, delta)
+        return delta
+
+    def sort(self):
+        'sorts the housenumbers of all streets and the postal code index, done once after loading'
+        for city in self.cities.values():
+            city.sort()
+        if getattr(self, 'postal_code', None) is not None:
+            self.postal_code.sort()
+
+    def index(self, streets=True):
+        '''
+        builds the city index and the street and chop indexes of all cities (and the 
+        fuzzy indexes when fuzzy matching is enabled), done once after loading.
+        streets=False keeps the street and chop indexes the cities already have.
+        '''
+        self._city_index = None
+        self.city_index
+        if getattr(self, 'fuzzy', None):
+            self._fuzzy_city_index = self._fuzzy_street_index = None
+            self.fuzzy_city_index, self.fuzzy_street_index
+        if streets:
+            for city in self.cities.values():
+                city.index()
 
     def load_postal_code(self):
         self.postal_code = PostalCode()
 
     def add(self, city, street, housenumber):
+        self._city_index = None
+        self._reverse_index = None
+        self._bulk_index = None
+        self._fuzzy_city_index = None
+        self._fuzzy_street_index = None
+        self.invalidate()
         try:
             self.cities[city].add(street, housenumber)
         except KeyError:
@@ -354,36 +1539,95 @@ class AddressBook(object):
             new_city.add(street, housenumber)
             self.cities[city] = new_city
 
+    def remove(self, city, street, *housenumbers):
+        'removes housenumber ranges of a street, and the street and city when they become empty'
+        self._city_index = None
+        self._reverse_index = None
+        self._bulk_index = None
+        self._fuzzy_city_index = None
+        self._fuzzy_street_index = None
+        self.invalidate()
+        self.cities[city].remove(street, *housenumbers)
+        if not self.cities[city].streets:
+            del self.cities[city]
+
     def find(self, city, street, housen=0):
-        print("Zoek RD-coördinaten voor: %s, %s, %s" %(city, street, str(housen)))
+        'finds the x-, y-coordinate of an address, using the cache when it is enabled (see set_cache)'
+        if getattr(self, 'cache', None) is None:
+            return self.lookup(city, street, housen)
+        key = (normalize.normalize(city), normalize.normalize(street), int(housen))
+        coordinates = self.cache.get(key)
+        if coordinates is None:
+            coordinates = self.lookup(city, street, housen)
+            if coordinates is not None:
+                self.cache.set(key, coordinates)
+        return coordinates
+
+    def lookup(self, city, street, housen=0):
+        log.debug("Zoek RD-coördinaten voor: %s, %s, %s", city, street, housen)
         try:
-            return self.cities[city.upper()].find(street.upper(), int(housen))
+            return self.cities[normalize.normalize(city)].find(normalize.normalize(street), int(housen))
         except KeyError:
-            for alternate_city in self.alternate_cities[city.upper()]:
-                print("%s niet gevonden in adresboek, probeer nu alternatief: %s" %(city, alternate_city))
+            for alternate_city in self.alternate_cities[normalize.normalize(city)]:
+                instrument.count('alternate city')
+                log.debug("%s niet gevonden in adresboek, probeer nu alternatief: %s", city, alternate_city)
                 try:
-                    return self.cities[alternate_city].find(street.upper(), int(housen))
+                    return self.cities[alternate_city].find(normalize.normalize(street), int(housen))
                 except KeyError:
-                    print('"%s" heeft geen resultaat opgeleverd.' % alternate_city)
+                    log.debug('"%s" heeft geen resultaat opgeleverd.', alternate_city)
                     
-    def find_PC(self, PC):
-        city, street = self.postal_code[PC]
-        return self.find(city, street)
+    def find_wgs84(self, city, street, housen=0):
+        '''
+        Finds the WGS84 lat and lon of an address, those of the address file when 
+        they were loaded (see load), else converted from its x-, y-RDcoordinate.
+        Raises KeyError when the address is not in the address book.
+        '''
+        return self.cities[normalize.normalize(city)].streets[normalize.normalize(street)].find_wgs84(int(housen))
+
+    def find_interpolated(self, city, street, housen=0):
+        '''
+        Finds the x-, y-coordinate of an address interpolated along its street, and 
+        its accuracy radius in meters (see Street.find_interpolated). Raises KeyError
+        when the street is not in the address book.
+        '''
+        return self.cities[normalize.normalize(city)].streets[normalize.normalize(street)].find_interpolated(int(housen))
+
+    def find_PC(self, PC, housen=0):
+        'finds the x-, y-coordinate of a postal code and housenumber'
+        try:
+            return self.postal_code.find(PC, int(housen))
+        except KeyError: # postal code without housenumber ranges, return halfway its street
+            city, street = self.postal_code[PC]
+            return self.find(city, street)
 
 
 class AddressSearch(object):
     
-    def __init__(self, address_string='', address_book=None):
-        self.error_log = []
-        if address_book:
-            self.address_book = address_book
+    def __init__(self, address_string='', address_book=None, cache_size=0, cache_ttl=None, error_log_size=1000, engine=None):
+        self.error_log = deque(maxlen=error_log_size) # the SearchErrors of the latest searches
+        self.errors = [] # the SearchErrors of the last search
+        self.address_string = normalize.normalize(address_string)
+        if engine is not None: # shares the address book and city lists of a SearchEngine
+            self.address_book, self.cities, self.alternate_cities = engine.address_book, engine.cities, engine.alternate_cities
         else:
-            self.address_book = load_address_book()
-        self.address_string = address_string.upper()
-        self.cities = list(self.address_book.cities.keys())
-        self.alternate_cities =  list(self.address_book.alternate_cities.keys())
+            if address_book:
+                self.address_book = address_book
+            else:
+                self.address_book = load_address_book()
+            self.cities = list(self.address_book.cities.keys())
+            self.alternate_cities =  list(self.address_book.alternate_cities.keys())
+        self.set_cache(cache_size, cache_ttl)
         self.reset()
 
+    def set_cache(self, maxsize=1024, ttl=None):
+        '''
+        Caches the results of at most maxsize address strings for ttl seconds 
+        (None keeps them until they are evicted). A maxsize of 0 disables the 
+        cache. The cache is cleared when the address book changes.
+        '''
+        self.cache = LRUCache(maxsize, ttl) if maxsize else None
+        self.cache_generation = getattr(self.address_book, 'generation', 0)
+
     def find_RD_coord(self, NA="NA"):
         try:
             for i in range(len(self.housenumber)):
@@ -398,27 +1642,171 @@ class AddressSearch(object):
     def reset(self):
         self.x, self.y, self.addresses = [], [], []
         self.city, self.street, self.housenumber = [], [], []
+        self.spellings = {}
+        self.spans = {}
+
+    def log_error(self, kind, *values):
+        'records a SearchError of the current search'
+        error = SearchError(kind, self.address_string, values)
+        self.errors.append(error)
+        self.error_log.append(error)
+        instrument.count('error: ' + kind)
+        log.debug('%s', error)
 
     def find(self, address_string = None):
         if address_string:
             self.reset()
-            self.address_string = address_string.upper()     
-        possible_cities = [city for city in self.cities if self.re_test(city)]
-        possible_cities = [city if not city in self.alternate_cities else self.address_book.alternate_cities[city] for city in possible_cities]
+            self.address_string = normalize.normalize(address_string)
+        self.errors = []
+        if self.cache is None:
+            return self.scan()
+        generation = getattr(self.address_book, 'generation', 0)
+        if self.cache_generation != generation:
+            self.cache.clear()
+            self.cache_generation = generation
+        cached = self.cache.get(self.address_string)
+        if cached is None:
+            found = self.scan()
+            self.cache.set(self.address_string, (found is not None, tuple(self.city), tuple(self.street), tuple(self.housenumber),
+                                                 tuple(self.x), tuple(self.y), tuple(self.addresses), tuple(self.errors)))
+            return found
+        instrument.count('cache hit')
+        found, city, street, housenumber, x, y, addresses, errors = cached
+        self.city, self.street, self.housenumber, self.x, self.y = list(city), list(street), list(housenumber), list(x), list(y)
+        self.addresses = [Address(a.city, a.street, a.housenumber, a.x, a.y, self.address_string) for a in addresses]
+        self.errors = list(errors)
+        self.error_log.extend(errors)
+        if found:
+            return self.city, self.street, self.housenumber
+
+    def scan(self):
+        'scans the address string for a postal code or else for cities, streets and housenumbers'
+        if self.find_postal_code():
+            return self.city, self.street, self.housenumber
+        possible_cities = self.scan_cities()
+        if len(possible_cities) == 0 and getattr(self.address_book, 'fuzzy', None):
+            possible_cities = self.find_fuzzy_cities()
         if len(possible_cities) == 0:
             self.find_RD_coord()
-        if len(possible_cities) == 1:
-            city = possible_cities[0]
-            streets = self.address_book.cities[city].streets.keys()
-            city_street = list(set([(city, street) for street in streets if self.re_test(street)]))
-        else:
-            city_street = list(set([(city, street) for city in possible_cities for street in self.address_book.cities[city].streets.keys() if self.re_test(street)]))
+        city_street = self.scan_streets(possible_cities)
         if len(city_street) != 1:
-            city_street = list(set([(city, street[0]) for city in possible_cities for street in self.streets(city) if self.re_test(street[1])])) 
+            city_street = self.scan_chops(possible_cities)
+        if len(city_street) == 0 and possible_cities and getattr(self.address_book, 'fuzzy', None):
+            city_street = self.find_fuzzy_streets(possible_cities)
         return self.find_city_street(city_street)
 
-    def re_test(self, item):
-        return re.compile("(?<=[\s\\/,;\(\)])" + item + "(?=[\s\\/,;\(\)])").search('\n' + self.address_string + '\n')
+    def scan_cities(self):
+        'returns the cities in the address string'
+        return self.address_book.city_index.search(self.address_string)
+
+    def scan_streets(self, cities):
+        'returns the (city, street) pairs of the streets of cities in the address string'
+        return list(dict.fromkeys((city, street) for city in cities for street in self.address_book.cities[city].street_index.search(self.address_string)))
+
+    def scan_chops(self, cities):
+        'returns the (city, street) pairs of the streets of cities of which a part is in the address string (see City.chops)'
+        return list(dict.fromkeys((city, street) for city in cities for street in self.address_book.cities[city].chop_index.search(self.address_string)))
+
+    def find_fuzzy_cities(self):
+        'returns the cities closest to a misspelled city name in the address string (see AddressBook.set_fuzzy)'
+        found = self.address_book.fuzzy_city_index.search(self.address_string, accept=self.address_book.cities.__contains__)
+        for city, term, distance in found:
+            self.log_error('fuzzy city', term, city, distance)
+        return [city for city, _, _ in found]
+
+    def find_fuzzy_streets(self, cities):
+        '''
+        Returns (city, street) pairs of the streets of cities closest to a misspelled 
+        street name in the address string. The misspelling is remembered for find_houseno.
+        '''
+        accept = lambda street: any(street in self.address_book.cities[city].streets for city in cities)
+        city_street = []
+        for street, term, distance in self.address_book.fuzzy_street_index.search(self.address_string, accept=accept):
+            for city in cities:
+                if street in self.address_book.cities[city].streets:
+                    self.log_error('fuzzy street', term, street, city, distance)
+                    self.spellings[street] = term
+                    city_street.append((city, street))
+        return city_street
+
+    def find_postal_code(self):
+        '''
+        Looks for a postal code (optionally followed by a housenumber) in the
+        address string that is in the postal code index of the address book, 
+        returns True when one was found. When no housenumber follows the postal
+        code, the one that follows its street is looked up in the street instead 
+        (e.g. KRUISPLEIN 26 3011AB).
+        '''
+        postal_code = getattr(self.address_book, 'postal_code', None)
+        if postal_code is None:
+            return False
+        for match in POSTAL_CODE.finditer(self.address_string):
+            code = match.group(1) + match.group(2)
+            try:
+                city, street = postal_code[code]
+                housen = int(match.group(3) or self.street_houseno(normalize.normalize(street)))
+                if housen and not match.group(3):
+                    coordinates = self.address_book.find(city, street, housen)
+                else:
+                    coordinates = postal_code.find(code, housen)
+            except KeyError:
+                continue
+            if coordinates is None: # not in an alternate city either
+                continue
+            x, y = coordinates
+            self.city, self.street, self.housenumber = [city.upper()], [street.upper()], [housen]
+            self.x, self.y = [x], [y]
+            self.addresses = [Address(self.city[0], self.street[0], housen, x, y, self.address_string)]
+            return True
+        return False
+
+    def street_houseno(self, street):
+        'returns the first housenumber that follows street in the address string, 0 when there is none'
+        numbers = [number for _, _, number, _ in self.tokenize([street])[street] if number is not None]
+        return int(numbers[0]) if numbers else 0
+
+    def result(self, address_string):
+        'searches address_string and returns the outcome as a SearchResult'
+        self.reset()
+        self.address_string = normalize.normalize(address_string)
+        self.find()
+        return SearchResult(self.address_string, tuple(self.city), tuple(self.street), tuple(self.housenumber),
+                            tuple(self.x), tuple(self.y), tuple(self.errors))
+
+    def find_many(self, address_strings, workers=None, chunksize=64, wgs84=False):
+        '''
+        Searches every string in the iterable address_strings and yields a
+        SearchResult for each, in input order. With workers=1 the search runs
+        in this process, otherwise a pool of workers (defaults to the number
+        of cpu's) is used. Every worker receives the address book once when
+        it starts (for free when processes are forked), address strings are 
+        sent to the workers in chunks of chunksize, at most two chunks per 
+        worker ahead of the results yielded, so address_strings is read at 
+        the pace of the consumer. With wgs84 the results also
+        have their WGS84 lat and lon, converted per chunk (see with_wgs84).
+        '''
+        results = self.search_many(address_strings, workers, chunksize)
+        if not wgs84:
+            yield from results
+            return
+        chunk = []
+        for result in results:
+            chunk.append(result)
+            if len(chunk) == chunksize:
+                yield from with_wgs84(chunk)
+                chunk = []
+        yield from with_wgs84(chunk)
+
+    def search_many(self, address_strings, workers=None, chunksize=64):
+        if workers == 1:
+            for address_string in address_strings:
+                yield self.result(address_string)
+            return
+        workers = workers or os.cpu_count()
+        cache = (self.cache.maxsize, self.cache.ttl) if self.cache is not None else (0, None)
+        with multiprocessing.Pool(workers, init_worker, (self.address_book,) + cache) as pool:
+            for results in imap_bounded(pool, worker_results, iter_batches(address_strings, chunksize), workers * 2):
+                yield from results
 
     def find_city_street(self, city_street):
         if len(city_street) == 1 :
@@ -430,34 +1818,47 @@ class AddressSearch(object):
         elif len(city_street) > 1:
             return self.multiple_hits(city_street)
         else:
-            self.error_log.append(('%d stad - straat combinaties gevonden: %s in PRIO-code: "%s"' %(len(city_street), " en ".join([" - ".join(x) for x in city_street]), self.address_string)))
+            self.log_error('combinations', tuple(city_street))
             self.find_RD_coord()
 
-    def streets(self, city):
-        streets = self.address_book.cities[city].streets.keys()
-        streetchops = [(street, strt) for street in streets for strt in street.split(" ") if (len(strt) > 4 and strt != city) or infmax([len(x) for x in street.split(" ") if x != city]) <= 4]
-        chops = [x[1] for x in streetchops]
-        single_chops = [chop for chop in streetchops if chops.count(chop[1]) == 1]
-        multi_chops = [chop for chop in streetchops if chops.count(chop[1]) > 1]
-        return list(set(single_chops + [part for street, chop in multi_chops for part in ((street, street.split(chop)[0] + chop), (street, chop + street.split(chop)[1])) if part[1] != chop]))     
-        
+    def tokenize(self, streets):
+        '''
+        Finds all occurrences of streets (or of their misspellings, see 
+        find_fuzzy_streets) in one pass over the address string, and the
+        housenumber that directly follows each of them. Stores and returns 
+        the spans of every street: {street: [(start, end, number, addition)]}, 
+        number and addition (e.g. "A" of 26A) are None when no number follows.
+        '''
+        streets = list(dict.fromkeys(streets))
+        self.spans = {street: [] for street in streets}
+        for start, end, street in Matcher((self.spellings.get(street, street), street) for street in streets).finditer(self.address_string):
+            number = HOUSENUMBER.match(self.address_string, end)
+            self.spans[street].append((start, end) + (number.groups() if number else (None, None)))
+        return self.spans
+
     def find_houseno(self, i=0):
-        reg_ex = re.compile(r'(?<=' + self.street[i] + '\s)\d+') #r'(?<=%s\s)\d+[A-Z]+'
-        houseno = reg_ex.findall(self.address_string)
+        'returns the (first) housenumber that follows the i-th street found, 0 when there is none'
+        if self.street[i] not in self.spans:
+            self.tokenize(self.street)
+        houseno = [(number, addition) for _, _, number, addition in self.spans[self.street[i]] if number is not None]
         if len(houseno) > 1:
-            self.error_log.append('Meerdere huisnrs gevonden: %s in %s - %s in PRIO-code: "%s"' %(", ".join(list(houseno)), self.city[i], self.street[i], self.address_string))#raise CityError('Meerdere huisnrs gevonden: %s in %s - %s in PRIO-code: "%s"' %(", ".join(list(houseno)), self.city, self.street, self.address_string))
+            self.log_error('housenumbers', self.city[i], self.street[i], tuple(number + addition for number, addition in houseno))
         if len(houseno) == 0:
             return 0
-        return int(houseno[0])
+        return int(houseno[0][0])
 
     def multiple_hits(self, city_street):
-        cities = set([city for city, _ in city_street])
+        '''
+        Resolves more than one (city, street) found: streets that are only found 
+        as part of another street found (e.g. BINNENWEG in NIEUWE BINNENWEG) and
+        streets that are not in the address string as a whole are dropped.
+        '''
+        cities = list(dict.fromkeys(city for city, _ in city_street))
         if len(cities) > 1:
-            self.error_log.append('Meerdere steden gevonden: %s. voor: %s' % (", ".join(list(cities)), self.address_string))
-        streets = [street for _, street in city_street]
-        compare = [x for x in streets for y in streets if (y in x and not x in y) or (not y in x and not x in y)]
-        streets = set([x for x in compare if compare.count(x) == max([compare.count(x) for x in compare])])
-        streets = [x for x in streets if re.compile(r'\s' + x + r'[\s$]').search(self.address_string)]
+            self.log_error('cities', tuple(cities))
+        spans = [(start, end, street) for street, found in self.tokenize(street for _, street in city_street).items() for start, end, _, _ in found]
+        streets = set(street for start, end, street in spans
+                      if not any(other_start <= start and end <= other_end and (other_start, other_end) != (start, end) for other_start, other_end, _ in spans))
         city_street = [(city, street) for city, street in city_street if street in streets]
         if len(city_street) > 1:
             self.city = [city for city, _ in city_street]
@@ -471,7 +1872,171 @@ class AddressSearch(object):
         return '\n'.join([str(x) for x in self.addresses])
 
 
+class SearchEngine(object):
+    '''
+    Search over one address book that can be shared by threads. The address 
+    book and its indexes are only read: they are sorted and built when the
+    engine is created. Every search keeps its state in an AddressSearch of
+    its own and returns an immutable SearchResult.
+    '''
+    
+    def __init__(self, address_book=None):
+        if not address_book:
+            address_book = load_address_book()
+        if isinstance(address_book.cities, dict): # in memory: sort and index now instead of on first use by some thread
+            address_book.sort()
+            address_book.index()
+        else:
+            address_book.city_index
+        self.address_book = address_book
+        self.cities = tuple(address_book.cities.keys())
+        self.alternate_cities = tuple(address_book.alternate_cities.keys())
+
+    def search(self, address_string):
+        'searches address_string and returns a SearchResult'
+        return AddressSearch(engine=self, error_log_size=0).result(address_string)
+
+    def find(self, city, street, housen=0):
+        'finds the x-, y-coordinate of an address, see AddressBook.find'
+        return self.address_book.find(city, street, housen)
+
+    def find_PC(self, PC, housen=0):
+        'finds the x-, y-coordinate of a postal code and housenumber, see AddressBook.find_PC'
+        return self.address_book.find_PC(PC, housen)
+
+
+for stage, cls, method in [('search', AddressSearch, 'scan'), ('postal code', AddressSearch, 'find_postal_code'),
+                           ('city scan', AddressSearch, 'scan_cities'), ('street scan', AddressSearch, 'scan_streets'),
+                           ('chop fallback', AddressSearch, 'scan_chops'), ('fuzzy cities', AddressSearch, 'find_fuzzy_cities'),
+                           ('fuzzy streets', AddressSearch, 'find_fuzzy_streets'), ('house number', AddressSearch, 'find_houseno'),
+                           ('multiple hits', AddressSearch, 'multiple_hits'), ('coordinates', AddressBook, 'lookup')]:
+    instrument.register(stage, cls, method)
+
+
+worker_search = None
+
+
+def iter_batches(iterable, size):
+    'yields the items of iterable in lists of size items'
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def imap_bounded(pool, function, iterable, window):
+    '''
+    Like pool.imap, but at most window items of iterable are read and submitted 
+    ahead of the results yielded, so iterable is consumed at the pace of the consumer.
+    '''
+    pending = deque()
+    for item in iterable:
+        pending.append(pool.apply_async(function, (item,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def parse_rows(args):
+    '''
+    Parses a batch of rows of the address file in a load_parallel worker process.
+    Returns, in the order of the rows: the distinct (city, street) keys, the key
+    of every row, the columns of their housenumber ranges (see ROW_COLUMNS, packed
+    is -1 for a row without a valid postal code) and the lists with the id, 
+    changed_date, postal code, city, street and province of every row. Last the 
+    positions of the rows in each of the parts partitions (see partition_of).
+    '''
+    rows, wgs84, parts = args
+    keys, key_of = {}, array('I')
+    columns = {name: array(typecode) for name, typecode in ROW_COLUMNS}
+    texts = ([], [], [], [], [], [])
+    for line in rows:
+        city, street = sys.intern(normalize.normalize(line[9])), sys.intern(normalize.normalize(line[8]))
+        key_of.append(keys.setdefault((city, street), len(keys)))
+        packed = store.pack_postal_code(line[1])
+        values = [int(line[5]), int(line[6]), NUMBER_TYPES.index(normalize.normalize(line[7])), float(line[17]), float(line[18]),
+                  -1 if packed is None else packed]
+        values += [float(line[15]), float(line[16])] if wgs84 else [0.0, 0.0]
+        for (name, _), value in zip(ROW_COLUMNS, values):
+            columns[name].append(value)
+        for text, value in zip(texts, (line[0], line[20], line[1], line[9], line[8], line[14])):
+            text.append(sys.intern(value)) # repeated strings are pickled once
+    key_part = [partition_of(city, parts) for city, _ in keys]
+    by_part = {}
+    for i, key in enumerate(key_of):
+        by_part.setdefault(key_part[key], array('I')).append(i)
+    return list(keys), key_of, columns, texts, by_part
+
+
+@contextmanager
+def paused_gc():
+    '''
+    Pauses the cyclic garbage collector, while many objects are created that are all 
+    kept (e.g. the streets of load_parallel), and scanning them again and again is wasted
+    '''
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def partition_of(city, parts):
+    'the partition (of parts) of the cities of load_parallel that city is built in, the same in every process'
+    return zlib.crc32(city.encode('utf8')) % parts
+
+
+def build_cities(args):
+    '''
+    Builds the City objects of a partition of load_parallel in a worker process
+    from the (city, street) keys, the key of every row and the columns of the 
+    rows: every street gets its ranges sorted on min (keeping the order of the 
+    rows for equal mins). Returns a dict with the City objects.
+    '''
+    keys, row_street, columns, wgs84 = args
+    order = sorted(range(len(row_street)), key=lambda i: (row_street[i], columns['min'][i]))
+    ends = array('I', [0] * len(keys))
+    for street_id in row_street:
+        ends[street_id] += 1
+    cities, start = {}, 0
+    names = ['min', 'max', 'type', 'x', 'y'] + (['lat', 'lon'] if wgs84 else [])
+    ordered = {name: array(columns[name].typecode, [columns[name][i] for i in order]) for name in names}
+    for (city, name), count in zip(keys, ends):
+        end = start + count
+        street = Street.from_arrays(name, *[ordered[column][start:end] for column in ['min', 'max', 'type', 'x', 'y']])
+        if wgs84:
+            street.lats, street.lons = ordered['lat'][start:end], ordered['lon'][start:end]
+        if city not in cities:
+            cities[city] = City(city)
+        cities[city].streets[name] = street
+        start = end
+    return cities
+
+
+def init_worker(address_book, cache_size=0, cache_ttl=None):
+    'creates the AddressSearch used by a find_many worker process'
+    global worker_search
+    worker_search = AddressSearch(address_book=address_book, cache_size=cache_size, cache_ttl=cache_ttl)
+
+
+def worker_results(address_strings):
+    'searches the address_strings with the AddressSearch of a find_many worker process'
+    return [worker_search.result(x) for x in address_strings]
+
+
 class DownloadAndPickle(object):
+    '''
+    Downloads, pickles, stores and updates the address book. fetch is used to 
+    download DATA_URL (see load.http_fetch), the sha256 of the download is 
+    checked against checksum when it is set.
+    '''
+    fetch = staticmethod(load.http_fetch)
+    checksum = None
     
     def __init__(self, *args):
         self.csv = None
@@ -480,30 +2045,93 @@ class DownloadAndPickle(object):
             self.download(any(x.lower in ['save_csv', 'save', 'csv', 'save csv', 's', 'c'] for x in args))
         if any(x.lower() in ['pickle', 'p'] for x in args):
             self.pickle()
+        if any(x.lower() in ['store', 'st'] for x in args):
+            self.save_store()
+        if any(x.lower() in ['update', 'u'] for x in args):
+            self.update()
+        if any(x.lower() in ['compact'] for x in args):
+            self.compact()
         
     def download(self, save_csv=False):
-        print('Downloading {}...'.format(FILE_NAME))
-        downloaded = load.download_csv(DATA_URL, zippedfile=FILE_NAME)
-        print('Stripping encoding (this may take a while...)')
-        self.csv = [[strip_accents(x.strip('"')) for x in y] for y in downloaded]
-        print('Encoding stripped. Download ready.')
+        '''
+        Downloads the zipped address file and streams its rows (see iter_address_file) 
+        into self.csv. save_csv also extracts the address file to the data directory.
+        '''
+        zipfile = self.download_zip()
         if save_csv:
-            save.csv(FILE_NAME, self.csv)
+            load.extract(zipfile, FILE_NAME, os.path.join(dirlist["data"], FILE_NAME))
             self.csv_on_disk = True
+            self.csv = iter_address_file()
+        else:
+            self.csv = iter_address_file(zipfile)
+
+    def download_zip(self):
+        '''
+        Streams DATA_URL to the data directory, resuming an interrupted download, and 
+        returns the path of the zip file.
+        '''
+        print('Downloading {}...'.format(DATA_URL))
+        zipfile = os.path.join(dirlist["data"], ZIP_NAME)
+        digest = load.download_file(DATA_URL, zipfile, self.fetch, self.checksum)
+        print('Download ready (sha256 {}).'.format(digest))
+        return zipfile
     
     def pickle(self):
         print('Pickling adressenbestand.p...')
         self.address_book = AddressBook(load_postal_code=False)
         self.address_book.load(self.csv)
-        self.address_book.postal_code = PostalCode(self.csv)
-        pickle.dump(self.address_book, open(os.path.join(dirlist["data"], "adressenbestand.p"), 'wb'))
+        self.save_pickle()
         print('Pickle saved.')
+
+    def save_pickle(self):
+        'replaces adressenbestand.p by the address book and removes the delta file, which it contains all updates of'
+        filename = os.path.join(dirlist["data"], "adressenbestand.p")
+        with open(filename + '.tmp', 'wb') as f:
+            pickle.dump(self.address_book, f)
+        os.replace(filename + '.tmp', filename)
+        if os.path.exists(os.path.join(dirlist["data"], DELTA_NAME)):
+            os.remove(os.path.join(dirlist["data"], DELTA_NAME))
+
+    def save_store(self):
+        print('Saving {}...'.format(STORE_NAME))
+        self.address_book.save_store(os.path.join(dirlist["data"], STORE_NAME))
+        print('Store saved.')
         
+    def update(self):
+        '''
+        Updates the pickled address book to the downloaded (or on disk) address
+        file and appends the changes to the delta file instead of pickling again.
+        '''
+        self.address_book = self.unpickle()
+        if self.csv is None:
+            self.csv = iter_address_file()
+        print('Updating address book...')
+        delta = self.address_book.update(self.csv, os.path.join(dirlist["data"], DELTA_NAME))
+        print('Address book updated: {} inserts, {} updates and {} deletes.'.format(*[len(x) for x in delta]))
+
     def unpickle(self):
+        'loads the pickled address book and applies the updates in the delta file'
         print('Retrieving addres book from pickle...')
-        addressbook = pickle.load(open(os.path.join(dirlist["data"], "adressenbestand.p"), 'rb'))
+        with open(os.path.join(dirlist["data"], "adressenbestand.p"), 'rb') as f:
+            self.address_book = pickle.load(f)
+        deltafile = os.path.join(dirlist["data"], DELTA_NAME)
+        if os.path.exists(deltafile):
+            for delta in iter_deltas(deltafile):
+                self.address_book.apply(delta)
         print('Address book retrieved.')
-        return addressbook
+        return self.address_book
+
+    def compact(self):
+        '''
+        Maintenance after updates: folds the updates in the delta file into a new 
+        pickle (and store, when there is one) without the records of removed rows, 
+        so they are no longer replayed on every unpickle.
+        '''
+        self.unpickle()
+        self.address_book.records.compact()
+        if STORE_NAME in os.listdir(dirlist["data"]):
+            self.save_store()
+        self.save_pickle()
 
 
 if __name__ == '__main__':
@@ -515,4 +2143,4 @@ if __name__ == '__main__':
         antwoord = input('Weet je zeker dat je {} wilt downloaden? (beantwoord met ja of nee): '.format(DATA_URL))
  
     if antwoord in ja:
-        dl = DownloadAndPickle('dl', 's', 'p')
+        dl = DownloadAndPickle('dl', 's', 'p', 'st')
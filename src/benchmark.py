@@ -0,0 +1,309 @@
+'''
+Benchmark for loading, index building and searching, runs offline on a
+synthetic postcode_NL.csv and a corpus of synthetic incident messages.
+
+Every stage reports its number of calls, throughput, p50 and p99 latency
+and the peak resident memory of the process after the stage. The memory
+report lists the size of the loaded address book (all objects it keeps alive,
+per type) and of its pickle. Results can be saved as JSON and compared with
+an earlier run:
+
+python benchmark.py --rows 100000 --output new.json --compare old.json
+'''
+
+import argparse
+import contextlib
+import json
+import os
+import pickle
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+import types
+from collections import Counter
+
+import address
+from FileHandler import load
+
+HEADER = ['id', 'postcode', 'postcode_id', 'pnum', 'pchar', 'minnumber', 'maxnumber', 'numbertype', 'street', 'city',
+          'city_id', 'municipality', 'municipality_id', 'province', 'province_code', 'lat', 'lon', 'rd_x', 'rd_y',
+          'location_detail', 'changed_date']
+SYLLABLES = ['aa', 'berg', 'bos', 'broek', 'dam', 'dijk', 'dorp', 'eind', 'gen', 'ham', 'heem', 'hof', 'holt', 'hove',
+             'hui', 'kamp', 'ker', 'laar', 'loo', 'meer', 'mon', 'ne', 'oord', 'ren', 'rijk', 'sel', 'ster', 'veen',
+             'vel', 'wijk', 'zand', 'zee']
+PREFIXES = ['Burgemeester', 'Dokter', 'Koningin', 'Nieuwe', 'Oude', 'Prins', 'Sint', 'Van']
+SUFFIXES = ['straat', 'weg', 'laan', 'plein', 'singel', 'kade', 'dreef', 'hof', 'pad']
+PROVINCES = [('Drenthe', 'DR'), ('Gelderland', 'GE'), ('Noord-Holland', 'NH'), ('Overijssel', 'OV'), ('Utrecht', 'UT'),
+             ('Zuid-Holland', 'ZH')]
+
+
+def name(rand, syllables):
+    return ''.join(rand.choice(SYLLABLES) for _ in range(syllables)).capitalize()
+
+
+def synthetic_rows(rows=10000, seed=0, streets_per_city=50, ranges_per_street=4):
+    '''
+    Generates rows in the format of postcode_NL.csv: cities with streets (some
+    with more than one word) that have even, odd or mixed housenumber ranges.
+    '''
+    rand = random.Random(seed)
+    cities = max(1, -(-rows // (streets_per_city * ranges_per_street)))
+    city_names = set()
+    while len(city_names) < cities:
+        city_names.add(name(rand, rand.randint(2, 3)))
+    row_id = 0
+    postcode = 1000 * 676
+    for city_id, city in enumerate(sorted(city_names)):
+        province, province_code = rand.choice(PROVINCES)
+        x0, y0 = rand.uniform(13000, 278000), rand.uniform(306000, 620000)
+        street_names = set()
+        while len(street_names) < streets_per_city:
+            street = name(rand, rand.randint(1, 2)) + rand.choice(SUFFIXES)
+            if rand.random() < 0.3:
+                street = rand.choice(PREFIXES) + ' ' + street
+            street_names.add(street)
+        for street in sorted(street_names):
+            x, y = x0 + rand.uniform(-3000, 3000), y0 + rand.uniform(-3000, 3000)
+            sides = rand.choice([['even'], ['odd'], ['mixed'], ['even', 'odd']])
+            for side in sides:
+                housen = 1 if side == 'odd' else 2
+                for _ in range(max(1, ranges_per_street // len(sides))):
+                    if row_id >= rows:
+                        return
+                    step = 1 if side == 'mixed' else 2
+                    low, high = housen, housen + step * rand.randint(0, 20)
+                    housen = high + step * rand.randint(1, 3)
+                    pnum, pchar = divmod(postcode, 676)
+                    pchar = chr(65 + pchar // 26) + chr(65 + pchar % 26)
+                    postcode += 1
+                    x, y = x + rand.uniform(5, 50), y + rand.uniform(5, 50)
+                    yield [str(row_id), '%d%s' % (pnum, pchar), '%d%04d' % (pnum, row_id % 10000), str(pnum), pchar, str(low),
+                           str(high), side, street, city, str(city_id), city, str(city_id), province, province_code,
+                           '%.13f' % (52 + (y - 460000) / 111000), '%.13f' % (5.4 + (x - 155000) / 68000), repr(x), repr(y),
+                           'postcode', '2014-04-10 13:20:28']
+                    row_id += 1
+
+
+def write_csv(filename, rows):
+    'writes rows (with a header) quoted like the source file'
+    with open(filename, 'w', encoding='utf8') as f:
+        for row in [HEADER] + list(rows):
+            f.write(';'.join('"%s"' % x for x in row) + '\n')
+
+
+def synthetic_messages(rows, messages=1000, seed=0):
+    '''
+    Returns (kind, message) pairs of incident messages, kind is one of:
+    hit =       street, housenumber and city
+    miss =      no known city
+    multi =     two streets of the same city
+    chop =      only the last word of a street with more than one word
+    '''
+    rand = random.Random(seed)
+    rows = [x for x in rows if x[0] != 'id']
+    chop_rows = [x for x in rows if ' ' in x[8]]
+    corpus = []
+    for i in range(messages):
+        kind = ['hit', 'miss', 'multi', 'chop'][i % 4]
+        row = rand.choice(rows)
+        step = 1 if row[7] == 'mixed' else 2
+        street, city, housen = row[8].upper(), row[9].upper(), int(row[5]) + step * rand.randint(0, (int(row[6]) - int(row[5])) // step)
+        if kind == 'hit':
+            message = 'PRIO 1 BRAND WONING %s %d %s VAK: %d' % (street, housen, city, rand.randint(1000000, 9999999))
+        elif kind == 'miss':
+            message = 'PRIO 2 LIFTOPSLUITING ONBEKEND %d' % rand.randint(1000000, 9999999)
+        elif kind == 'multi':
+            other = rand.choice([x for x in rows if x[9] == row[9]])
+            message = 'PRIO 1 VERKEERSONGEVAL %s / %s %s' % (street, other[8].upper(), city)
+        else:
+            row = rand.choice(chop_rows or rows)
+            message = 'PRIO 2 STORMSCHADE %s %s' % (row[8].upper().split(' ')[-1], row[9].upper())
+        corpus.append((kind, message))
+    return corpus
+
+
+def dump(address_book, filename):
+    with open(filename, 'wb') as f:
+        pickle.dump(address_book, f)
+
+
+def undump(filename):
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
+
+
+def peak_rss():
+    'peak resident memory of this process in kB'
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def deep_size(obj):
+    '''
+    Returns the total size in bytes of obj and all objects it refers to (each
+    counted once) and a Counter with the bytes per type. Classes, functions 
+    and modules are not counted, memoryviews without the memory they map.
+    '''
+    sizes, seen, stack = Counter(), set(), [obj]
+    while stack:
+        x = stack.pop()
+        if id(x) in seen or isinstance(x, (type, types.ModuleType, types.FunctionType, types.MethodType)):
+            continue
+        seen.add(id(x))
+        sizes[type(x).__name__] += sys.getsizeof(x)
+        if isinstance(x, dict):
+            stack.extend(x.keys())
+            stack.extend(x.values())
+        elif isinstance(x, (list, tuple, set, frozenset)):
+            stack.extend(x)
+        if hasattr(x, '__dict__') and not isinstance(x, dict):
+            stack.append(vars(x))
+        for cls in type(x).__mro__:
+            slots = cls.__dict__.get('__slots__', ())
+            for slot in [slots] if isinstance(slots, str) else slots:
+                if slot != '__dict__' and hasattr(x, slot):
+                    stack.append(getattr(x, slot))
+    return sum(sizes.values()), sizes
+
+
+def memory(address_book, pickle_file):
+    'memory report of an address book: its deep size (also per type, largest first) and the size of its pickle in kB'
+    total, sizes = deep_size(address_book)
+    return {'address_book_kb': total / 1024, 'pickle_kb': os.path.getsize(pickle_file) / 1024,
+            'types_kb': {name: size / 1024 for name, size in sizes.most_common(10)}}
+
+
+class Benchmark(object):
+    'runs stages and collects their timings'
+
+    def __init__(self):
+        self.results = {}
+        self.memory = {}
+
+    def measure(self, stage, function, inputs=(None,), items=None):
+        '''
+        Calls function once for every input (without an argument when the input
+        is None) and records the latencies. items is the number of items that
+        one call handles (e.g. rows), used for the throughput.
+        '''
+        latencies = []
+        result = None
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            for x in inputs:
+                start = time.perf_counter()
+                result = function() if x is None else function(x)
+                latencies.append(time.perf_counter() - start)
+        total = sum(latencies)
+        self.results[stage] = {'calls': len(latencies), 'total_s': total,
+                               'throughput_per_s': (items or len(latencies)) / total if total else None,
+                               'p50_ms': percentile(latencies, 50) * 1000, 'p99_ms': percentile(latencies, 99) * 1000,
+                               'peak_rss_kb': peak_rss()}
+        return result
+
+    def report(self):
+        lines = ['%-28s %8s %12s %10s %10s %12s' % ('stage', 'calls', 'per second', 'p50 ms', 'p99 ms', 'peak RSS kB')]
+        for stage, x in self.results.items():
+            lines.append('%-28s %8d %12.1f %10.3f %10.3f %12d' % (stage, x['calls'], x['throughput_per_s'] or 0, x['p50_ms'], x['p99_ms'], x['peak_rss_kb']))
+        if self.memory:
+            lines.append('')
+            lines.append('%-28s %12.1f kB' % ('address book', self.memory['address_book_kb']))
+            lines.append('%-28s %12.1f kB' % ('pickle', self.memory['pickle_kb']))
+            for name, size in self.memory['types_kb'].items():
+                lines.append('  %-26s %12.1f kB' % (name, size))
+        return '\n'.join(lines)
+
+
+def run(rows=10000, messages=1000, seed=0, directory=None):
+    'runs all stages on synthetic data and returns the Benchmark'
+    bench = Benchmark()
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        csv_file = os.path.join(tmp, address.FILE_NAME)
+        write_csv(csv_file, synthetic_rows(rows, seed))
+        lines = bench.measure('load.csv', lambda: load.csv(csv_file, verbose=False), items=rows)
+        table = bench.measure('load.iter_csv', lambda: list(load.iter_csv(csv_file, header=True)), items=rows)
+        table = [[address.strip_accents(x) for x in row] for row in table]
+        del lines
+
+        book = address.AddressBook(load_postal_code=False)
+        bench.measure('AddressBook.load', lambda: book.load(table), items=rows)
+        bench.measure('AddressBook.index', book.index)
+        bench.measure('AddressBook.load parallel', lambda: address.AddressBook(load_postal_code=False).load(table, workers=4), items=rows)
+        bench.measure('PostalCode', lambda: address.PostalCode(table), items=rows)
+
+        pickle_file = os.path.join(tmp, 'adressenbestand.p')
+        bench.measure('pickle', lambda: dump(book, pickle_file))
+        bench.measure('unpickle', lambda: undump(pickle_file))
+        bench.memory = memory(book, pickle_file)
+        store_file = os.path.join(tmp, address.STORE_NAME)
+        bench.measure('store.write', lambda: book.save_store(store_file))
+        mapped = bench.measure('store.open', lambda: address.AddressBook.open(store_file))
+
+        search = address.AddressSearch(address_book=book)
+        corpus = synthetic_messages(table, messages, seed)
+        for kind in ['hit', 'miss', 'multi', 'chop']:
+            bench.measure('AddressSearch.find %s' % kind, search.find, [x for k, x in corpus if k == kind])
+
+        rand = random.Random(seed)
+        streets = [street for city in book.cities.values() for street in city.streets.values()]
+        lookups = [(street, rand.choice(street.mins)) for street in rand.sample(streets, min(len(streets), messages))]
+        bench.measure('Street.find', lambda x: x[0].find(x[1]), lookups)
+        keys = [(row[9], row[8], 0) for row in rand.sample(table, min(len(table), messages))]
+        bench.measure('AddressBook.find', lambda x: book.find(*x), keys)
+        bench.measure('AddressBook.find (store)', lambda x: mapped.find(*x), keys)
+        mapped.store.close()
+    return bench
+
+
+def compare(results, previous, tolerance=1.2):
+    'returns report lines and the stages whose p50 latency got more than tolerance times slower'
+    lines, regressions = [], []
+    for stage, x in results.items():
+        if stage not in previous:
+            continue
+        ratio = x['p50_ms'] / previous[stage]['p50_ms'] if previous[stage]['p50_ms'] else float('inf')
+        lines.append('%-28s %10.3f -> %10.3f ms  (x%.2f)' % (stage, previous[stage]['p50_ms'], x['p50_ms'], ratio))
+        if ratio > tolerance:
+            regressions.append(stage)
+    return lines, regressions
+
+
+def compare_memory(memory, previous):
+    'returns report lines with the address book and pickle sizes of an earlier run and this run'
+    return ['%-28s %10.1f -> %10.1f kB  (x%.2f)' % (key, previous[key], memory[key], memory[key] / previous[key] if previous[key] else float('inf'))
+            for key in ['address_book_kb', 'pickle_kb'] if key in previous]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks loading and searching on synthetic addresses.')
+    parser.add_argument('--rows', type=int, default=10000, help='rows in the synthetic postcode_NL.csv')
+    parser.add_argument('--messages', type=int, default=1000, help='synthetic incident messages')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='saves the results as JSON')
+    parser.add_argument('--compare', help='JSON results of an earlier run')
+    parser.add_argument('--tolerance', type=float, default=1.2, help='slowdown of p50 that counts as a regression')
+    args = parser.parse_args()
+
+    bench = run(args.rows, args.messages, args.seed)
+    print(bench.report())
+    output = {'meta': {'rows': args.rows, 'messages': args.messages, 'seed': args.seed, 'python': platform.python_version(),
+                       'platform': platform.platform(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+              'results': bench.results, 'memory': bench.memory}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        lines, regressions = compare(bench.results, previous['results'], args.tolerance)
+        lines += compare_memory(bench.memory, previous.get('memory', {}))
+        print('\n'.join(lines))
+        if regressions:
+            print('Regressions: %s' % ', '.join(regressions))
+            sys.exit(1)
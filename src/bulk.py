@@ -0,0 +1,150 @@
+'''
+Bulk lookup of many (city, street, housenumber) addresses at once, e.g. the
+parsed columns of another system, with NumPy.
+
+BulkIndex takes the sections of an address book store (see
+store.build_columns and AddressBook.columns). City and street names are
+encoded to integer ids by a binary search (searchsorted) in the sorted
+string tables, every distinct (city, street) pair once. Housenumbers are
+then looked up in one sorted array of keys, one key per housenumber range
+and side of the street:
+
+    ((street id * 2 + side) << 32) + min
+
+where side is 0 for the EVEN and 1 for the ODD side (MIXED ranges are on
+both sides). A single searchsorted over all addresses finds the range of
+every housenumber.
+
+Every address gets a status code:
+FOUND =     the housenumber is in a range of the street
+CLOSEST =   the housenumber is outside the ranges of its side of the street,
+            the closest range is used (like Street.find)
+HALFWAY =   no housenumber (0), or none on its side of the street: the range
+            halfway the street is used
+NO_STREET = the city has no such street, x and y are NaN
+NO_CITY =   the city is not in the address book, x and y are NaN
+'''
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import normalize
+
+FOUND, CLOSEST, HALFWAY, NO_STREET, NO_CITY = range(5)
+STATUS = ['found', 'closest', 'halfway', 'no street', 'no city']
+
+# numbertype codes, positions in address.NUMBER_TYPES
+MIXED, EVEN, ODD = 0, 1, 2
+
+
+def strings(offsets, names):
+    'returns the encoded strings of a names section as a list of bytes'
+    names = bytes(names)
+    return [names[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+
+class BulkIndex(object):
+    '''
+    Columnar index of all housenumber ranges of an address book. columns is a
+    dict with the sections of a store (arrays or memoryviews, which are not
+    copied). Alternate spellings of cities (alternate: official) are looked up
+    when a city is not found.
+    '''
+
+    def __init__(self, columns, alternate_cities=None):
+        if numpy is None:
+            raise ImportError('Bulk lookups need NumPy')
+        self.alternate_cities = alternate_cities or {}
+        cities = strings(columns['city_offsets'], columns['city_names'])
+        streets = strings(columns['street_offsets'], columns['street_names'])
+        self.city_names = numpy.array([x.decode('utf8') for x in cities], dtype=str)
+        self.street_names = numpy.array([x.decode('utf8') for x in streets], dtype=str)
+        self.city_keys = numpy.array(cities, dtype=bytes)
+        self.street_rows = numpy.asarray(columns['street_rows'], dtype=numpy.int64)
+        self.street_city = numpy.repeat(numpy.arange(len(cities)), numpy.diff(numpy.asarray(columns['city_streets'], dtype=numpy.int64)))
+        self.street_keys = numpy.array([cities[c] + b'\0' + street for c, street in zip(self.street_city, streets)], dtype=bytes)
+        self.row_street = numpy.repeat(numpy.arange(len(streets)), numpy.diff(self.street_rows))
+        self.mins = numpy.asarray(columns['min'], dtype=numpy.int64)
+        self.maxs = numpy.asarray(columns['max'], dtype=numpy.int64)
+        self.types = numpy.asarray(columns['type'], dtype=numpy.uint8)
+        self.xs = numpy.asarray(columns['x'], dtype=numpy.float64)
+        self.ys = numpy.asarray(columns['y'], dtype=numpy.float64)
+        keys, rows = [], []
+        for side, code in enumerate([EVEN, ODD]):
+            on_side = numpy.flatnonzero((self.types == MIXED) | (self.types == code))
+            keys.append(((self.row_street[on_side] * 2 + side) << 32) + self.mins[on_side])
+            rows.append(on_side)
+        keys, rows = numpy.concatenate(keys), numpy.concatenate(rows)
+        order = numpy.argsort(keys, kind='stable')
+        self.keys, self.rows = keys[order], rows[order]
+
+    def __len__(self):
+        return len(self.mins)
+
+    def export(self):
+        'returns the housenumber ranges as a dict of NumPy arrays: city, street, min, max, type, x and y'
+        return {'city': self.city_names[self.street_city[self.row_street]], 'street': self.street_names[self.row_street],
+                'min': self.mins, 'max': self.maxs, 'type': self.types, 'x': self.xs, 'y': self.ys}
+
+    def street_ids(self, pairs):
+        '''
+        Returns the street ids of a list of (city, street) pairs as a NumPy array,
+        -1 (NO_STREET) or -2 (NO_CITY) when they are not found.
+        '''
+        if not pairs:
+            return numpy.empty(0, dtype=numpy.int64)
+        cities = []
+        for city, _ in pairs:
+            city = normalize.normalize(city)
+            cities.append(self.alternate_cities.get(city, city).encode('utf8'))
+        cities = numpy.array(cities, dtype=bytes)
+        keys = numpy.array([city + b'\0' + normalize.normalize(street).encode('utf8') for city, (_, street) in zip(cities, pairs)], dtype=bytes)
+        ids = self.find(self.street_keys, keys, -1)
+        missing = ids < 0
+        ids[missing] = numpy.where(self.find(self.city_keys, cities[missing], -1) < 0, -2, -1)
+        return ids
+
+    def find(self, table, keys, missing):
+        'returns the positions of keys in the sorted table, missing where they are not in it'
+        if not len(table):
+            return numpy.full(len(keys), missing, dtype=numpy.int64)
+        positions = numpy.minimum(numpy.searchsorted(table, keys), len(table) - 1)
+        return numpy.where(table[positions] == keys, positions, missing)
+
+    def lookup(self, cities, streets, housenumbers):
+        '''
+        Looks up the parallel sequences (or arrays) cities, streets and housenumbers
+        and returns three NumPy arrays: the x- and y-RDcoordinates (NaN when the
+        address is not found) and the status codes (see STATUS).
+        '''
+        pairs = {}
+        inverse = numpy.fromiter((pairs.setdefault(pair, len(pairs)) for pair in zip(cities, streets)), dtype=numpy.int64)
+        street = self.street_ids(list(pairs))[inverse]
+        housen = numpy.maximum(numpy.asarray(housenumbers, dtype=numpy.int64).reshape(-1), 0)
+        xs, ys = numpy.full(len(street), numpy.nan), numpy.full(len(street), numpy.nan)
+        status = numpy.where(street == -2, NO_CITY, NO_STREET).astype(numpy.uint8)
+        known = numpy.flatnonzero(street >= 0)
+        if len(known):
+            row, status[known] = self.rows_of(street[known], housen[known])
+            xs[known], ys[known] = self.xs[row], self.ys[row]
+        return xs, ys, status
+
+    def rows_of(self, street, housen):
+        'returns the housenumber ranges (rows) used for the streets and housenumbers, and their status codes'
+        base = (street * 2 + housen % 2) << 32
+        start = numpy.searchsorted(self.keys, base)
+        end = numpy.searchsorted(self.keys, base + (1 << 32))
+        position = numpy.searchsorted(self.keys, base + housen, side='right') - 1
+        halfway = self.street_rows[street] + (self.street_rows[street + 1] - self.street_rows[street]) // 2
+        on_side = (start < end) & (housen > 0)
+        below = position >= start # a range on the side with min <= housen
+        before = self.rows[numpy.clip(position, 0, len(self.rows) - 1)]
+        after = self.rows[numpy.clip(position + 1, 0, len(self.rows) - 1)]
+        found = on_side & below & (housen <= self.maxs[before])
+        distance = lambda row: numpy.minimum(numpy.abs(self.mins[row] - housen), numpy.abs(self.maxs[row] - housen))
+        closest = numpy.where(~below | ((position + 1 < end) & (distance(after) < distance(before))), after, before)
+        row = numpy.where(found, before, numpy.where(on_side, closest, halfway))
+        status = numpy.where(found, FOUND, numpy.where(on_side, CLOSEST, HALFWAY))
+        return row, status
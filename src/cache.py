@@ -0,0 +1,80 @@
+'''
+Bounded least recently used (LRU) cache with an optional time to live, used
+by AddressSearch and AddressBook to remember the results of earlier lookups.
+A cache can be shared by threads.
+'''
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    '''
+    Keeps at most maxsize items, the least recently used item is evicted
+    first. Items older than ttl seconds (when given) are evicted when they
+    are looked up. Hits, misses and evictions are counted.
+    '''
+
+    def __init__(self, maxsize=1024, ttl=None, timer=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, key, default=None):
+        'returns the value of key and marks it as recently used, or default on a miss'
+        with self.lock:
+            try:
+                value, expires = self.items[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and expires <= self.timer():
+                del self.items[key]
+                self.evictions += 1
+                self.misses += 1
+                return default
+            self.items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        'stores value under key, evicts the least recently used items when the cache is full'
+        expires = None if self.ttl is None else self.timer() + self.ttl
+        with self.lock:
+            self.items[key] = (value, expires)
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        'removes all items, the statistics are kept'
+        with self.lock:
+            self.items.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'size': len(self.items), 'maxsize': self.maxsize}
+
+    def __getstate__(self):
+        # a pickled cache keeps its settings but not its items, they may be stale when unpickled
+        state = self.__dict__.copy()
+        state['items'] = OrderedDict()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
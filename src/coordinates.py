@@ -0,0 +1,68 @@
+'''
+Conversion between Dutch RD New coordinates (EPSG:28992) and WGS84
+latitude / longitude, using the polynomial approximation of Schreutelkamp
+and Strang van Hees (accurate to about a meter within the Netherlands).
+
+The functions accept single numbers, sequences or NumPy arrays. With NumPy
+installed sequences are converted in one vectorized operation and NumPy
+arrays are returned, otherwise lists are returned.
+'''
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+X0, Y0 = 155000.0, 463000.0
+PHI0, LAM0 = 52.15517440, 5.38720621
+
+# (p, q, K): latitude += K * dx^p * dy^q / 3600
+LAT = [(0, 1, 3235.65389), (2, 0, -32.58297), (0, 2, -0.24750), (2, 1, -0.84978), (0, 3, -0.06550), (2, 2, -0.01709),
+       (1, 0, -0.00738), (4, 0, 0.00530), (2, 3, -0.00039), (4, 1, 0.00033), (1, 1, -0.00012)]
+# (p, q, L): longitude += L * dx^p * dy^q / 3600
+LON = [(1, 0, 5260.52916), (1, 1, 105.94684), (1, 2, 2.45656), (3, 0, -0.81885), (1, 3, 0.05594), (3, 1, -0.05607),
+       (0, 1, 0.01199), (3, 2, -0.00256), (1, 4, 0.00128), (0, 2, 0.00022), (2, 0, -0.00022), (5, 0, 0.00026)]
+# (p, q, R): x += R * dphi^p * dlam^q
+X = [(0, 1, 190094.945), (1, 1, -11832.228), (2, 1, -114.221), (0, 3, -32.391), (1, 0, -0.705), (3, 1, -2.340),
+     (1, 3, -0.608), (0, 2, -0.008), (2, 3, 0.148)]
+# (p, q, S): y += S * dphi^p * dlam^q
+Y = [(1, 0, 309056.544), (0, 2, 3638.893), (2, 0, 73.077), (1, 2, -157.984), (3, 0, 59.788), (0, 1, 0.433),
+     (2, 2, -6.439), (1, 1, -0.032), (0, 4, 0.092), (1, 4, -0.054)]
+
+
+def polynomial(terms, a, b):
+    return sum(k * a ** p * b ** q for p, q, k in terms)
+
+
+def is_scalar(value):
+    return isinstance(value, (int, float)) or (numpy is not None and numpy.isscalar(value))
+
+
+def convert(function, a, b):
+    'applies function to scalars, or element wise to sequences (vectorized with NumPy)'
+    if is_scalar(a):
+        return function(float(a), float(b))
+    if numpy is not None:
+        return function(numpy.asarray(a, dtype=numpy.float64), numpy.asarray(b, dtype=numpy.float64))
+    converted = [function(float(x), float(y)) for x, y in zip(a, b)]
+    return [x for x, _ in converted], [y for _, y in converted]
+
+
+def rd_to_wgs84_values(x, y):
+    dx, dy = (x - X0) * 1e-5, (y - Y0) * 1e-5
+    return PHI0 + polynomial(LAT, dx, dy) / 3600, LAM0 + polynomial(LON, dx, dy) / 3600
+
+
+def wgs84_to_rd_values(lat, lon):
+    dphi, dlam = 0.36 * (lat - PHI0), 0.36 * (lon - LAM0)
+    return X0 + polynomial(X, dphi, dlam), Y0 + polynomial(Y, dphi, dlam)
+
+
+def rd_to_wgs84(x, y):
+    'returns the WGS84 (lat, lon) of RD coordinates x, y'
+    return convert(rd_to_wgs84_values, x, y)
+
+
+def wgs84_to_rd(lat, lon):
+    'returns the RD (x, y) of WGS84 coordinates lat, lon'
+    return convert(wgs84_to_rd_values, lat, lon)
@@ -0,0 +1,128 @@
+'''
+FuzzyMatcher finds names (cities, streets) that are misspelled in a string,
+e.g. "KRUISPEIN" or "ROTERDAM".
+
+Names are indexed on the strings that remain after deleting up to
+max_distance characters from their first prefix_length characters (a
+SymSpell deletion index). A part of a string is looked up by generating its
+own deletions and comparing the candidates that share one of them with the
+edit distance (counting the transposition of two adjacent characters as a
+single edit). Nothing is compared with names that share no deletion, so a
+lookup does not depend on the number of names.
+'''
+
+from itertools import combinations
+
+from matcher import TOKEN
+
+
+def edit_distance(a, b, limit=None):
+    '''
+    Optimal string alignment distance of a and b: the number of insertions,
+    deletions, substitutions and transpositions of adjacent characters. Stops
+    and returns limit + 1 as soon as the distance is known to exceed limit.
+    '''
+    if abs(len(a) - len(b)) > (limit if limit is not None else len(a) + len(b)):
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def deletions(word, max_distance):
+    'returns the set of strings that remain after deleting up to max_distance characters of word'
+    found = set([word])
+    for n in range(1, min(max_distance, len(word)) + 1):
+        found.update(''.join(word[i] for i in range(len(word)) if i not in deleted) for deleted in combinations(range(len(word)), n))
+    return found
+
+
+class FuzzyMatcher(object):
+    '''
+    Deletion index of names. Every name can carry a value which is returned
+    instead of the name itself when the name is found (like matcher.Matcher).
+    The edit distance allowed for a part of a string grows with its length:
+    none up to 4 characters, 1 up to 8 characters and so on, up to
+    max_distance.
+    '''
+
+    def __init__(self, names=None, max_distance=2, prefix_length=7, max_words=4):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.max_words = max_words
+        self.words = 1
+        self.index = {}
+        self.len = 0
+        if names:
+            for name in names:
+                if isinstance(name, tuple):
+                    self.add(*name)
+                else:
+                    self.add(name)
+
+    def __len__(self):
+        return self.len
+
+    def add(self, name, value=None):
+        'adds name to the index, found names return "value" (defaults to name)'
+        if value is None:
+            value = name
+        for deletion in deletions(name[:self.prefix_length], self.max_distance):
+            self.index.setdefault(deletion, []).append((name, value))
+        self.words = min(self.max_words, max(self.words, len(TOKEN.findall(name))))
+        self.len += 1
+
+    def allowed_distance(self, term):
+        return min(self.max_distance, (len(term) - 1) // 4)
+
+    def lookup(self, term, max_distance=None):
+        '''
+        Returns (distance, name, value) for every name within the allowed edit
+        distance of term (at most max_distance when it is given), closest first.
+        '''
+        distance = self.allowed_distance(term)
+        if max_distance is not None:
+            distance = min(distance, max_distance)
+        found, seen = [], set()
+        for deletion in deletions(term[:self.prefix_length], distance):
+            for name, value in self.index.get(deletion, ()):
+                if name in seen:
+                    continue
+                seen.add(name)
+                d = edit_distance(term, name, distance)
+                if d <= distance:
+                    found.append((d, name, value))
+        return sorted(found)
+
+    def search(self, string, max_distance=None, accept=None):
+        '''
+        Looks up every run of up to max_words words of string and returns
+        (value, term, distance) for the values of the closest names found,
+        in order of appearance. term is the (misspelled) part of string.
+        Only values for which accept(value) is true count when accept is given.
+        '''
+        tokens = [x for x in TOKEN.finditer(string)]
+        found = []
+        for i in range(len(tokens)):
+            for j in range(i + 1, min(len(tokens), i + self.words) + 1):
+                term = string[tokens[i].start():tokens[j - 1].end()]
+                if term.isdigit():
+                    continue
+                found.extend((d, i, value, term) for d, _, value in self.lookup(term, max_distance) if accept is None or accept(value))
+        if not found:
+            return []
+        best = min(d for d, _, _, _ in found)
+        values = []
+        for d, _, value, term in sorted(x for x in found if x[0] == best):
+            if value not in [x for x, _, _ in values]:
+                values.append((value, term, d))
+        return values
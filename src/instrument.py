@@ -0,0 +1,106 @@
+'''
+Instrumentation of the search stages: per stage counters and timing
+histograms, and counters for the errors found while searching.
+
+Stages are methods that are registered once (see register). enable()
+replaces them by wrappers that time every call, disable() puts the original
+methods back, so nothing is measured (or costs anything) while disabled.
+Events (e.g. errors) are counted with count(), which only adds a check of
+a module attribute while disabled. Diagnostics are logged to the
+"address" logger instead of printed.
+
+import instrument
+instrument.enable()
+... searches ...
+print(instrument.report())
+'''
+
+import logging
+import time
+from collections import Counter
+from functools import wraps
+
+log = logging.getLogger('address')
+
+# upper bounds (in seconds) of the buckets of the timing histograms, the last bucket has no bound
+BUCKETS = [1e-5, 3e-5, 1e-4, 3e-4, 1e-3, 3e-3, 1e-2, 3e-2, 1e-1]
+
+enabled = False
+stages = [] # (stage, class, method name)
+originals = {} # (class, method name): method
+counters = Counter()
+timings = {} # stage: Timing
+
+
+class Timing(object):
+    'number of calls, total time and histogram (counts per bucket of BUCKETS) of one stage'
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.histogram = [0] * (len(BUCKETS) + 1)
+
+    def add(self, seconds):
+        self.calls += 1
+        self.total += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.histogram[i] += 1
+                return
+        self.histogram[-1] += 1
+
+    def as_dict(self):
+        return {'calls': self.calls, 'total_s': self.total, 'histogram': dict(zip([str(x) for x in BUCKETS] + ['inf'], self.histogram))}
+
+
+def register(stage, cls, method):
+    'registers method of cls as stage, it is timed while instrumentation is enabled'
+    stages.append((stage, cls, method))
+
+
+def timed(stage, function):
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timings.setdefault(stage, Timing()).add(time.perf_counter() - start)
+    return wrapper
+
+
+def enable():
+    'starts counting and timing the registered stages'
+    global enabled
+    if enabled:
+        return
+    for stage, cls, method in stages:
+        originals[(cls, method)] = cls.__dict__[method]
+        setattr(cls, method, timed(stage, originals[(cls, method)]))
+    enabled = True
+
+
+def disable():
+    'stops counting and timing, the collected statistics are kept until reset'
+    global enabled
+    if not enabled:
+        return
+    for stage, cls, method in stages:
+        setattr(cls, method, originals.pop((cls, method)))
+    enabled = False
+
+
+def count(event, n=1):
+    if enabled:
+        counters[event] += n
+
+
+def reset():
+    'clears the collected statistics'
+    counters.clear()
+    timings.clear()
+
+
+def report():
+    'returns the counters and the timings of all stages that were called'
+    return {'counters': dict(counters), 'timings': {stage: timing.as_dict() for stage, timing in timings.items()}}
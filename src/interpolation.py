@@ -0,0 +1,78 @@
+'''
+Interpolation of housenumbers along a street.
+
+The address file gives one x-, y-RDcoordinate (the centroid) per range of
+housenumbers. A Line orders the centroids of one side of a street on the
+middle housenumber of their range (their anchor) and stores the cumulative
+distance along them. A housenumber between two anchors is placed on the
+segment between their centroids in proportion to its number, one before the
+first or after the last anchor is extrapolated along the first or last
+segment. Every point comes with an accuracy radius: its distance to the
+nearest centroid of the address file.
+'''
+
+import math
+from array import array
+from bisect import bisect_left
+
+# meters per housenumber, for streets with too few ranges to measure it
+SPACING = 5.0
+
+
+class Line(object):
+    '''
+    Housenumber line of one side of a street: anchors (middle housenumbers of
+    the ranges) in increasing order with the x-, y-RDcoordinates of their
+    ranges and the distance along the line up to every anchor.
+    '''
+    __slots__ = ('anchors', 'xs', 'ys', 'distances')
+
+    def __init__(self, anchors, xs, ys):
+        self.anchors = array('d', anchors)
+        self.xs, self.ys = array('d', xs), array('d', ys)
+        self.distances = array('d', [0.0])
+        for i in range(1, len(self.anchors)):
+            self.distances.append(self.distances[-1] + math.hypot(self.xs[i] - self.xs[i - 1], self.ys[i] - self.ys[i - 1]))
+
+    def __len__(self):
+        return len(self.anchors)
+
+    @property
+    def length(self):
+        return self.distances[-1]
+
+    def spacing(self):
+        'meters per housenumber along the line, SPACING when it can not be measured'
+        span = self.anchors[-1] - self.anchors[0]
+        return self.length / span if span > 0 and self.length > 0 else SPACING
+
+    def segment(self, i, t):
+        'returns the point at fraction t of the segment from anchor i to anchor i + 1'
+        return self.xs[i] + t * (self.xs[i + 1] - self.xs[i]), self.ys[i] + t * (self.ys[i + 1] - self.ys[i])
+
+    def point(self, housen, spacing=SPACING):
+        '''
+        returns the interpolated x-, y-RDcoordinate and the accuracy radius of housen,
+        spacing (meters per housenumber) is used on lines with a single anchor
+        '''
+        n = len(self.anchors)
+        i = bisect_left(self.anchors, housen)
+        if i < n and self.anchors[i] == housen:
+            return self.xs[i], self.ys[i], 0.0
+        if n == 1:
+            return self.xs[0], self.ys[0], abs(housen - self.anchors[0]) * spacing
+        i = min(max(i - 1, 0), n - 2) # the segment housen is on, or the first or last to extrapolate
+        a, b = self.anchors[i], self.anchors[i + 1]
+        t = (housen - a) / (b - a) if b != a else 0.0
+        x, y = self.segment(i, t)
+        return x, y, min(abs(t), abs(1 - t)) * (self.distances[i + 1] - self.distances[i])
+
+    def halfway(self):
+        'returns the x-, y-RDcoordinate halfway the line and half its length as accuracy radius'
+        distance = self.length / 2
+        i = min(max(bisect_left(self.distances, distance) - 1, 0), len(self.anchors) - 1)
+        if i == len(self.anchors) - 1:
+            return self.xs[i], self.ys[i], distance
+        part = self.distances[i + 1] - self.distances[i]
+        x, y = self.segment(i, (distance - self.distances[i]) / part if part else 0.0)
+        return x, y, distance
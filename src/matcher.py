@@ -0,0 +1,81 @@
+'''
+Matcher finds names (cities, streets) in a string in a single pass.
+
+A name is only found when it is surrounded by word boundaries, i.e. it is
+preceded and followed by whitespace, one of "/,;()" or the start or end of
+the string. These are the same rules as the regular expression per name that
+AddressSearch used to compile and run, but instead the names are
+indexed once on their first token. Searching a string then takes one pass
+over its tokens with a dictionary lookup per token.
+'''
+
+import re
+
+DELIMITERS = "/,;()"
+
+TOKEN = re.compile(r'[^\s/,;()]+')
+
+
+def is_delimiter(c):
+    'checks whether character "c" is a word boundary'
+    return c.isspace() or c in DELIMITERS
+
+
+def first_token(name):
+    'returns the part of "name" up to its first word boundary'
+    token = TOKEN.match(name)
+    if token:
+        return token.group()
+    return ''
+
+
+class Matcher(object):
+    '''
+    Index of names on their first token. Every name can carry a value which
+    is returned instead of the name itself when the name is found, e.g. the
+    official spelling of an alternate city name.
+    '''
+
+    def __init__(self, names=None):
+        self.index = {}
+        self.len = 0
+        if names:
+            for name in names:
+                if isinstance(name, tuple):
+                    self.add(*name)
+                else:
+                    self.add(name)
+
+    def __len__(self):
+        return self.len
+
+    def add(self, name, value=None):
+        'adds name to the index, found names return "value" (defaults to name)'
+        if value is None:
+            value = name
+        self.index.setdefault(first_token(name), []).append((name, value))
+        self.len += 1
+
+    def finditer(self, string):
+        '''
+        Yields a (start, end, value) tuple for every occurrence of a name in
+        string, in order of appearance.
+        '''
+        length = len(string)
+        for token in TOKEN.finditer(string):
+            candidates = self.index.get(token.group())
+            if not candidates:
+                continue
+            start = token.start()
+            for name, value in candidates:
+                end = start + len(name)
+                if string.startswith(name, start) and (end == length or is_delimiter(string[end])):
+                    yield start, end, value
+
+    def search(self, string):
+        'returns the unique values of all names found in string, in order of appearance'
+        found = []
+        for _, _, value in self.finditer(string):
+            if value not in found:
+                found.append(value)
+        return found
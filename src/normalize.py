@@ -0,0 +1,72 @@
+'''
+Text normalization of the address file and of the strings that are searched.
+
+strip_accents removes accents, normalize also uppercases and replaces
+whitespace and punctuation variants (no-break spaces, typographic quotes and
+dashes, the Dutch IJ ligature) by their plain ASCII form. Both look the
+characters up in translation tables that are computed once, ASCII strings
+(nearly all of them) are returned without translating.
+'''
+
+import unicodedata
+
+# characters up to here (Latin, Greek, Cyrillic, ..., General Punctuation) are in the tables
+TABLE_END = 0x2100
+
+VARIANTS = {
+    "'": '‘’‚‛′',
+    '"': '“”„‟″',
+    '-': '‐‑‒–—―−',
+    '...': '…',
+    'IJ': 'Ĳ',
+    'ij': 'ĳ',
+}
+
+
+def strip_marks(s):
+    'removes all Nonspacing_Marks from the decomposed string s: http://www.unicode.org/reports/tr44/#GC_Values_Table'
+    return ''.join(c for c in unicodedata.normalize('NFD', s) if unicodedata.category(c) != 'Mn')
+
+
+def accent_table():
+    'translation table of all non-ASCII characters below TABLE_END that strip_marks changes'
+    table = {}
+    for i in range(0x80, TABLE_END):
+        stripped = strip_marks(chr(i))
+        if stripped != chr(i):
+            table[i] = stripped
+    return table
+
+
+def normalize_table():
+    'accent_table plus whitespace, punctuation and other VARIANTS'
+    table = accent_table()
+    for i in range(0x80, TABLE_END):
+        if chr(i).isspace():
+            table[i] = ' '
+    table.update({ord(c): replacement for replacement, variants in VARIANTS.items() for c in variants})
+    return table
+
+
+ACCENTS = accent_table()
+NORMALIZE = normalize_table()
+
+
+def strip_accents(s):
+    'removes the accents of the characters in s'
+    if s.isascii():
+        return s
+    stripped = s.translate(ACCENTS)
+    if stripped.isascii():
+        return stripped
+    return strip_marks(stripped) # characters outside the table
+
+
+def normalize(s):
+    'strip_accents, uppercases s and replaces whitespace and punctuation variants'
+    if s.isascii():
+        return s.upper()
+    normalized = s.translate(NORMALIZE)
+    if not normalized.isascii():
+        normalized = strip_marks(normalized)
+    return normalized.upper()
@@ -0,0 +1,224 @@
+'''
+Geocoding server: loads the address book once and answers requests from many
+clients concurrently over TCP.
+
+The protocol is line based, every request and every response is one line of
+JSON. Responses carry the id of their request and may arrive out of order.
+
+{"id": 1, "method": "find", "address_string": "KRUISPLEIN 26 ROTTERDAM"}
+{"id": 2, "method": "find_many", "address_strings": ["...", "..."]}
+{"id": 3, "method": "find_PC", "postal_code": "3011AB"}
+
+{"id": 1, "result": {"city": ["ROTTERDAM"], "street": ["KRUISPLEIN"], ...}}
+{"id": 3, "error": "..."}
+
+A find_many request is matched in chunks of CHUNK_SIZE strings, with at most
+one chunk per worker in the pool at a time. Request lines can be up to
+LINE_LIMIT bytes, a longer line is skipped and answered with an error.
+
+Matching is CPU bound, it runs in a pool of processes (or threads) that each
+get the address book once when they start. With --shared the process pool
+attaches to one copy of the address book in shared memory (see shared.py)
+instead. Every request has a timeout and
+at most max_pending requests are handled at the same time, when that limit
+is reached the server stops reading from its clients until requests finish.
+
+Start with: python server.py --port 8765
+'''
+
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import address
+from shared import SharedAddressBook
+
+CHUNK_SIZE = 100
+LINE_LIMIT = 2 ** 24
+
+engine = None
+
+
+def init_search(address_book):
+    'creates the SearchEngine of a pool worker process, the threads of a pool share one'
+    global engine
+    if engine is None or engine.address_book is not address_book:
+        engine = address.SearchEngine(address_book)
+
+
+def init_shared(handle):
+    'creates the SearchEngine of a pool worker process on the address book in shared memory'
+    init_search(handle.attach())
+
+
+def find(address_string):
+    return engine.search(address_string)._asdict()
+
+
+def find_chunk(address_strings):
+    return [find(x) for x in address_strings]
+
+
+def find_PC(postal_code):
+    return engine.find_PC(postal_code)
+
+
+class GeocodingServer(object):
+    '''
+    Serves find, find_many and find_PC requests for one address book.
+    executor =      'process' or 'thread', the kind of pool that does the matching
+    workers =       size of the pool (defaults to the number of cpu's)
+    timeout =       seconds after which a request is answered with an error
+    max_pending =   maximum number of requests that are handled at the same time
+    shared =        publish the address book in shared memory for the process pool
+    limit =         maximum length of a request line in bytes
+    '''
+
+    def __init__(self, address_book=None, executor='process', workers=None, timeout=10, max_pending=1000, shared=False,
+                 limit=LINE_LIMIT):
+        if not address_book:
+            address_book = address.load_address_book()
+        self.address_book = address_book
+        self.shared = None
+        if shared and executor == 'process':
+            self.shared = SharedAddressBook.publish(address_book)
+            self.executor = ProcessPoolExecutor(workers, initializer=init_shared, initargs=(self.shared,))
+        else:
+            pool = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+            self.executor = pool(workers, initializer=init_search, initargs=(address_book,))
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.limit = limit
+        self.pending = None
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=8765):
+        self.pending = asyncio.Semaphore(self.max_pending)
+        self.server = await asyncio.start_server(self.handle, host, port, limit=self.limit)
+        return self.server
+
+    async def serve(self, host='127.0.0.1', port=8765):
+        await self.start(host, port)
+        print('Serving addresses on {}...'.format(', '.join(str(x.getsockname()) for x in self.server.sockets)))
+        async with self.server:
+            await self.server.serve_forever()
+
+    def close(self):
+        if self.server:
+            self.server.close()
+        self.executor.shutdown(wait=False)
+        if self.shared:
+            self.shared.close()  # unlinked when the last worker exits
+
+    async def handle(self, reader, writer):
+        'reads the requests of one client and starts handling each of them'
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                try:
+                    line = await self.read_line(reader)
+                except ValueError as e:
+                    async with lock:
+                        writer.write(json.dumps({'id': None, 'error': str(e)}).encode('utf8') + b'\n')
+                        await writer.drain()
+                    continue
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                await self.pending.acquire()
+                task = asyncio.ensure_future(self.respond(line, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        finally:
+            writer.close()
+
+    async def read_line(self, reader):
+        '''
+        Returns the next line of reader, b'' at the end of the stream. A line longer
+        than limit is skipped and raises ValueError.
+        '''
+        try:
+            return await reader.readuntil(b'\n')
+        except asyncio.IncompleteReadError as e:
+            return e.partial
+        except asyncio.LimitOverrunError as e:
+            consumed = e.consumed
+        while True:
+            await reader.readexactly(consumed)
+            try:
+                await reader.readuntil(b'\n')
+                break
+            except asyncio.IncompleteReadError:
+                break
+            except asyncio.LimitOverrunError as e:
+                consumed = e.consumed
+        raise ValueError('request line longer than %d bytes' % self.limit)
+
+    async def respond(self, line, writer, lock):
+        try:
+            response = await self.dispatch(line)
+        finally:
+            self.pending.release()
+        async with lock:
+            writer.write(json.dumps(response).encode('utf8') + b'\n')
+            await writer.drain()
+
+    async def dispatch(self, line):
+        'answers one request line with a response dict'
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            method = request['method']
+            if method == 'find':
+                work = self.run(find, request['address_string'])
+            elif method == 'find_many':
+                work = self.find_many(request['address_strings'])
+            elif method == 'find_PC':
+                work = self.run(find_PC, request['postal_code'])
+            else:
+                return {'id': request_id, 'error': 'unknown method: %s' % method}
+            return {'id': request_id, 'result': await asyncio.wait_for(work, self.timeout)}
+        except asyncio.TimeoutError:
+            return {'id': request_id, 'error': 'timeout after %s seconds' % self.timeout}
+        except Exception as e:
+            return {'id': request_id, 'error': '%s: %s' % (type(e).__name__, e)}
+
+    async def find_many(self, address_strings):
+        'finds address_strings in chunks of CHUNK_SIZE, with at most one chunk per worker in the pool at a time'
+        window = asyncio.Semaphore(self.workers)
+        async def run(chunk):
+            async with window:
+                return await self.run(find_chunk, chunk)
+        chunks = await asyncio.gather(*[run(address_strings[i:i + CHUNK_SIZE]) for i in range(0, len(address_strings), CHUNK_SIZE)])
+        return [result for chunk in chunks for result in chunk]
+
+    def run(self, function, *args):
+        return asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serves Dutch address lookups as JSON lines over TCP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--executor', choices=['process', 'thread'], default='process')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--timeout', type=float, default=10)
+    parser.add_argument('--max-pending', type=int, default=1000)
+    parser.add_argument('--shared', action='store_true', help='share one copy of the address book between the worker processes')
+    args = parser.parse_args()
+    server = GeocodingServer(executor=args.executor, workers=args.workers, timeout=args.timeout, max_pending=args.max_pending,
+                             shared=args.shared)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
@@ -0,0 +1,176 @@
+'''
+Shared memory address book for servers with many worker processes.
+
+The loading process publishes the store of an address book (see store.py)
+once into a multiprocessing.shared_memory segment. Worker processes attach to
+it and get a read-only AddressBook view on the segment (like AddressBook.open
+on a file), so N workers share one copy of the string tables and housenumber
+ranges instead of unpickling N.
+
+A second, small segment counts the attached processes, guarded by a lock the
+workers inherit when they start. The segments are unlinked when the publisher
+has closed and the last worker has detached, whichever happens last:
+
+handle = SharedAddressBook.publish(address_book)    # loading process, before the workers start
+book = handle.attach()                               # worker
+handle.detach()                                      # worker, also done when it exits
+handle.close()                                       # loading process
+'''
+
+import multiprocessing
+import multiprocessing.util
+import os
+import struct
+from multiprocessing import resource_tracker, shared_memory
+
+import address
+import store
+
+# attached processes, closed by the publisher
+COUNTS = struct.Struct('<qq')
+
+
+def open_segment(name):
+    '''
+    Opens an existing segment without registering it with the resource tracker,
+    which would unlink it when this process exits.
+    '''
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:  # before Python 3.13 opening a segment always registers it
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name)
+        finally:
+            resource_tracker.register = register
+
+
+class SharedAddressBook(object):
+    '''
+    Handle on an address book in shared memory. The handle can be passed to
+    worker processes when they start (e.g. in the initargs of a pool), each of
+    them attaches once and gets the same read-only AddressBook on every attach.
+    '''
+
+    def __init__(self, name, counts_name, lock):
+        self.name = name
+        self.counts_name = counts_name
+        self.lock = lock
+        self.publisher = None
+        self.reset()
+
+    def reset(self):
+        'forgets the segments and address book of the process the handle was copied from (by fork)'
+        self.pid = os.getpid()
+        self.segments = []
+        self.address_book = None
+
+    @property
+    def is_publisher(self):
+        return self.publisher == os.getpid()
+
+    @classmethod
+    def publish(cls, address_book, context=None):
+        '''
+        copies address_book into shared memory and returns the handle of the publisher,
+        context is the multiprocessing context of the workers (the default one when it is None)
+        '''
+        columns = address_book.columns(postal_codes=True)
+        _, size = store.layout(columns)
+        segment = shared_memory.SharedMemory(create=True, size=size)
+        counts = shared_memory.SharedMemory(create=True, size=COUNTS.size)
+        store.pack_into(segment.buf, columns)
+        COUNTS.pack_into(counts.buf, 0, 0, 0)
+        handle = cls(segment.name, counts.name, (context or multiprocessing).Lock())
+        handle.segments = [segment, counts]
+        handle.publisher = os.getpid()
+        return handle
+
+    def __getstate__(self):
+        return {'name': self.name, 'counts_name': self.counts_name, 'lock': self.lock, 'publisher': self.publisher}
+
+    def __setstate__(self, state):
+        self.__init__(state['name'], state['counts_name'], state['lock'])
+        self.publisher = state['publisher']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.detach()
+        self.close()
+
+    @property
+    def size(self):
+        return self.open_segments()[0].size
+
+    def open_segments(self):
+        if self.pid != os.getpid():
+            self.reset()
+        if not self.segments:
+            self.segments = [open_segment(self.name), open_segment(self.counts_name)]
+        return self.segments
+
+    def counts(self):
+        'returns the number of attached processes and whether the publisher closed'
+        count, closed = COUNTS.unpack_from(self.open_segments()[1].buf)
+        return count, bool(closed)
+
+    def update(self, attached=0, closed=False):
+        'changes the counts and returns them, and True when nobody uses the segments any more'
+        counts = self.open_segments()[1]
+        with self.lock:
+            count, was_closed = COUNTS.unpack_from(counts.buf)
+            if was_closed and attached > 0:
+                raise store.StoreError('The shared address book %s was closed' % self.name)
+            count, closed = count + attached, int(was_closed or closed)
+            COUNTS.pack_into(counts.buf, 0, count, closed)
+            return count, bool(closed), bool(closed) and count == 0
+
+    def attach(self):
+        'returns the read-only AddressBook on the shared segment, attaching this process once'
+        if self.pid != os.getpid():
+            self.reset()
+        if self.address_book is None:
+            self.update(attached=1)
+            segment = self.open_segments()[0]
+            self.address_book = address.AddressBook.from_store(store.AddressStore(segment.buf.toreadonly()))
+            multiprocessing.util.Finalize(self, self.detach, exitpriority=10)
+        return self.address_book
+
+    def detach(self):
+        '''
+        Stops using the address book of attach (it can not be used afterwards) and
+        unlinks the segments when this was the last process after the publisher closed.
+        '''
+        if self.address_book is None or self.pid != os.getpid():
+            return
+        address_book, self.address_book = self.address_book, None
+        address_book._bulk_index = None
+        address_book.cities.cache.clear()
+        address_store = address_book.store
+        address_store.close()
+        address_store.source.release()
+        _, _, unused = self.update(attached=-1)
+        self.release(unused)
+
+    def close(self):
+        'closes the publisher, the segments are unlinked once the last worker detached'
+        if self.is_publisher:
+            self.publisher = None
+            _, _, unused = self.update(closed=True)
+            self.release(unused)
+
+    def release(self, unlink):
+        'unmaps the segments of this process, and unlinks them when unlink is True'
+        if self.address_book is not None or self.is_publisher:
+            return
+        segments, self.segments = self.segments, []
+        for segment in segments:
+            try:
+                segment.close()
+            except BufferError:  # streets of the address book are still in use, unmapped once they are gone
+                pass
+            if unlink:
+                segment.unlink()
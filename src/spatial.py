@@ -0,0 +1,228 @@
+'''
+Spatial index for reverse geocoding: finds the points closest to an x-,
+y-RDcoordinate.
+
+GridIndex puts the points in a uniform grid of square cells. A query looks at
+the cell of the coordinate and then at rings of cells around it, until no
+ring can contain a point closer than the k-th closest point found so far.
+
+When NumPy is installed nearest_many handles the queries in batches of
+BATCH_SIZE: the distances from every query to the points in the cells
+around it (within RADII cells) are computed in one vectorized operation.
+A query is answered from those cells when its k-th closest point is closer
+than any point further out can be, the others are tried with the next
+radius and are finally searched one by one.
+'''
+
+import heapq
+import math
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# queries of which nearest_many looks up the cells at once
+BATCH_SIZE = 4096
+# (query, point) pairs of which nearest_many computes the distances at once
+PAIR_BUDGET = 2 ** 20
+# cells around a query that nearest_many searches at once, before it searches the query by itself
+RADII = (1, 3)
+
+
+class GridIndex(object):
+    '''
+    Uniform grid over points given as parallel sequences of x- and y-
+    coordinates. Points are referred to by their position in those sequences.
+    '''
+
+    def __init__(self, xs, ys, cell_size=250.0):
+        self.cell_size = float(cell_size)
+        cells = [self.cell(x, y) for x, y in zip(xs, ys)]
+        order = sorted(range(len(cells)), key=cells.__getitem__)
+        self.positions = array('I', order)
+        self.xs = array('d', [xs[i] for i in order])
+        self.ys = array('d', [ys[i] for i in order])
+        self.cells = {}
+        for i, position in enumerate(order):
+            start, _ = self.cells.get(cells[position], (i, i))
+            self.cells[cells[position]] = (start, i + 1)
+        if cells:
+            self.bounds = (min(x for x, _ in cells), min(y for _, y in cells), max(x for x, _ in cells), max(y for _, y in cells))
+        else:
+            self.bounds = (0, 0, -1, -1)
+        self.arrays = None
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['arrays'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.arrays = None
+
+    def numpy_arrays(self):
+        '''
+        NumPy views on the points and the cells, built on first use: the x- and 
+        y-coordinates, the positions, the sorted keys of the occupied cells (see 
+        cell_keys) and the start and end of their points
+        '''
+        if self.arrays is None:
+            cells = sorted(self.cells.items())
+            keys = self.cell_keys(numpy.array([c[0] for c, _ in cells], dtype=numpy.int64), numpy.array([c[1] for c, _ in cells], dtype=numpy.int64))
+            self.arrays = (numpy.array(self.xs, dtype=numpy.float64), numpy.array(self.ys, dtype=numpy.float64),
+                           numpy.array(self.positions, dtype=numpy.int64), keys,
+                           numpy.array([start for _, (start, _) in cells], dtype=numpy.int64),
+                           numpy.array([end for _, (_, end) in cells], dtype=numpy.int64))
+        return self.arrays
+
+    def cell_keys(self, cx, cy):
+        'returns an integer key per cell (in the same order as the cells), -1 for cells outside the bounds'
+        min_x, min_y, max_x, max_y = self.bounds
+        inside = (cx >= min_x) & (cx <= max_x) & (cy >= min_y) & (cy <= max_y)
+        return numpy.where(inside, (cx - min_x) * (max_y - min_y + 1) + (cy - min_y), -1)
+
+    def cell(self, x, y):
+        return int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size))
+
+    def ring(self, cx, cy, r):
+        'yields the (start, end) ranges of the occupied cells at Chebyshev distance r of cell cx, cy'
+        if r == 0:
+            cells = [(cx, cy)]
+        else:
+            cells = [(cx + dx, cy + dy) for dx in range(-r, r + 1) for dy in (-r, r)]
+            cells += [(cx + dx, cy + dy) for dx in (-r, r) for dy in range(-r + 1, r)]
+        for c in cells:
+            if c in self.cells:
+                yield self.cells[c]
+
+    def distances(self, x, y, start, end):
+        'returns the squared distances of x, y to the points from start to end'
+        return [(self.xs[i] - x) ** 2 + (self.ys[i] - y) ** 2 for i in range(start, end)]
+
+    def nearest(self, x, y, k=1, max_dist=None):
+        '''
+        Returns up to k (distance, position) pairs of the points closest to x, y
+        sorted on distance, only points within max_dist when it is given.
+        '''
+        if not len(self.positions) or k < 1:
+            return []
+        cx, cy = self.cell(x, y)
+        min_x, min_y, max_x, max_y = self.bounds
+        last_ring = max(cx - min_x, max_x - cx, cy - min_y, max_y - cy)
+        limit = float('inf') if max_dist is None else max_dist ** 2
+        best = [] # heap of (-squared distance, -i), keeps the k closest points
+        r = max(0, max(min_x - cx, cx - max_x, min_y - cy, cy - max_y)) # first ring that can contain points
+        while r <= last_ring:
+            # points in ring r (and beyond) are at least (r - 1) * cell_size away from x, y
+            reach = ((r - 1) * self.cell_size) ** 2 if r > 1 else 0.0
+            if reach > limit or (len(best) == k and reach > -best[0][0]):
+                break
+            for start, end in self.ring(cx, cy, r):
+                for i, d2 in enumerate(self.distances(x, y, start, end), start):
+                    if d2 > limit:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-d2, -i))
+                    elif d2 < -best[0][0]:
+                        heapq.heapreplace(best, (-d2, -i))
+            r += 1
+        return [(math.sqrt(-d2), self.positions[-i]) for d2, i in sorted(best, reverse=True)]
+
+    def nearest_many(self, xs, ys, k=1, max_dist=None):
+        'nearest for every coordinate in the parallel sequences (or arrays) xs and ys'
+        if numpy is None or not len(self.positions) or k < 1:
+            return [self.nearest(float(x), float(y), k, max_dist) for x, y in zip(xs, ys)]
+        xs, ys = numpy.asarray(xs, dtype=numpy.float64), numpy.asarray(ys, dtype=numpy.float64)
+        found = []
+        for start in range(0, len(xs), BATCH_SIZE):
+            found += self.nearest_batch(xs[start:start + BATCH_SIZE], ys[start:start + BATCH_SIZE], k, max_dist)
+        return found
+
+    def nearest_batch(self, xs, ys, k, max_dist):
+        '''
+        nearest_many for the NumPy arrays xs and ys: queries are answered from the
+        cells within RADII cells around them, the remaining ones one by one
+        '''
+        found = [None] * len(xs)
+        remaining = numpy.arange(len(xs))
+        for radius in RADII:
+            answered, results = self.nearest_cells(xs[remaining], ys[remaining], k, max_dist, radius)
+            for q, result in zip(remaining[answered].tolist(), results):
+                found[q] = result
+            remaining = remaining[~answered]
+            if not len(remaining):
+                return found
+        for q in remaining.tolist():
+            found[q] = self.nearest(float(xs[q]), float(ys[q]), k, max_dist)
+        return found
+
+    def nearest_cells(self, xs, ys, k, max_dist, radius):
+        '''
+        Computes the distances from every query to the points in the cells within 
+        radius cells around it, vectorized over groups of queries with at most 
+        PAIR_BUDGET (query, point) pairs. Returns a mask of the queries that are 
+        answered (no point further out can be closer) and their results, a query 
+        with more pairs by itself is not answered.
+        '''
+        _, _, _, keys, starts, ends = self.numpy_arrays()
+        cx, cy = numpy.floor(xs / self.cell_size).astype(numpy.int64), numpy.floor(ys / self.cell_size).astype(numpy.int64)
+        offsets = numpy.array([(dx, dy) for dx in range(-radius, radius + 1) for dy in range(-radius, radius + 1)], dtype=numpy.int64)
+        neighbours = self.cell_keys(cx[:, None] + offsets[:, 0], cy[:, None] + offsets[:, 1])
+        at = numpy.minimum(numpy.searchsorted(keys, neighbours), len(keys) - 1)
+        occupied = (neighbours >= 0) & (keys[at] == neighbours)
+        first = numpy.where(occupied, starts[at], 0)
+        counts = numpy.where(occupied, ends[at] - starts[at], 0)
+        totals = numpy.cumsum(counts.sum(axis=1))
+        answered, results = numpy.zeros(len(xs), dtype=bool), []
+        start = 0
+        while start < len(xs):
+            done = totals[start - 1] if start else 0
+            end = int(numpy.searchsorted(totals, done + PAIR_BUDGET, side='right'))
+            if end == start: # left to nearest
+                start += 1
+                continue
+            answered[start:end], found = self.nearest_pairs(xs[start:end], ys[start:end], first[start:end], counts[start:end], k, max_dist, radius)
+            results += found
+            start = end
+        return answered, results
+
+    def nearest_pairs(self, xs, ys, first, counts, k, max_dist, radius):
+        '''
+        nearest_cells for the queries xs, ys, with the first point and the number 
+        of points of each of their cells in the rows of first and counts
+        '''
+        px, py, positions, _, _, _ = self.numpy_arrays()
+        limit = numpy.inf if max_dist is None else max_dist ** 2
+        first, counts = first.ravel(), counts.ravel()
+        # every (query, point) pair in those cells
+        query = numpy.repeat(numpy.repeat(numpy.arange(len(xs)), (2 * radius + 1) ** 2), counts)
+        point = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts) + numpy.repeat(first, counts)
+        d2 = (px[point] - xs[query]) ** 2 + (py[point] - ys[query]) ** 2
+        within = d2 <= limit
+        query, point, d2 = query[within], point[within], d2[within]
+        order = numpy.lexsort((point, d2, query))
+        query, point, d2 = query[order], point[order], d2[order]
+        rank = numpy.arange(len(query)) - numpy.searchsorted(query, query)
+        keep = rank < k
+        query, point, d2, rank = query[keep], point[keep], d2[keep], rank[keep]
+        # points outside the cells are at least radius cells away
+        reach = (radius * self.cell_size) ** 2
+        kth = numpy.full(len(xs), numpy.inf)
+        last = numpy.flatnonzero(rank == k - 1)
+        kth[query[last]] = d2[last]
+        answered = (kth <= reach) | (limit <= reach)
+        count = numpy.bincount(query, minlength=len(xs))
+        ends = numpy.cumsum(count).tolist()
+        points, positions = point.tolist(), positions[point].tolist()
+        results = []
+        for q in numpy.flatnonzero(answered).tolist():
+            x, y, start = float(xs[q]), float(ys[q]), ends[q] - count[q]
+            results.append([(math.sqrt((self.xs[j] - x) ** 2 + (self.ys[j] - y) ** 2), position) # as nearest computes them
+                            for j, position in zip(points[start:ends[q]], positions[start:ends[q]])])
+        return answered, results
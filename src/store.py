@@ -0,0 +1,266 @@
+'''
+Store writes an address book to a compact, versioned binary file and reads
+it back through mmap, without building any Python objects up front.
+
+The file consists of a header followed by a number of sections, each of
+which is a flat array that can be cast directly from the mapped memory:
+
+city_offsets    I   per city: start of its name in city_names (n+1)
+city_names      B   utf-8 encoded city names, sorted
+city_streets    I   per city: index of its first street (n+1)
+street_offsets  I   per street: start of its name in street_names (n+1)
+street_names    B   utf-8 encoded street names, sorted per city
+street_rows     I   per street: index of its first housenumber range (n+1)
+min             i   per housenumber range: lowest housenumber
+max             i   per housenumber range: highest housenumber
+type            B   per housenumber range: numbertype code
+x               d   per housenumber range: x-RDcoordinate
+y               d   per housenumber range: y-RDcoordinate
+postal_codes    I   packed postal codes (see pack_postal_code), sorted
+postal_streets  I   per postal code: index of its street
+postal_index    I   per housenumber range of a postal code: packed postal code,
+                    sorted (on postal code and min)
+postal_min      i   per postal code range: lowest housenumber
+postal_max      i   per postal code range: highest housenumber
+postal_type     B   per postal code range: numbertype code
+postal_x        d   per postal code range: x-RDcoordinate
+postal_y        d   per postal code range: y-RDcoordinate
+
+Because the file is mapped read-only, processes that open the same file
+share its pages.
+'''
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+MAGIC = b'DUTCHADR'
+VERSION = 2
+
+SECTIONS = [('city_offsets', 'I'), ('city_names', 'B'), ('city_streets', 'I'),
+            ('street_offsets', 'I'), ('street_names', 'B'), ('street_rows', 'I'),
+            ('min', 'i'), ('max', 'i'), ('type', 'B'), ('x', 'd'), ('y', 'd'),
+            ('postal_codes', 'I'), ('postal_streets', 'I'), ('postal_index', 'I'), ('postal_min', 'i'),
+            ('postal_max', 'i'), ('postal_type', 'B'), ('postal_x', 'd'), ('postal_y', 'd')]
+
+HEADER = struct.Struct('<8sIII')
+SECTION = struct.Struct('<QQ')
+BYTEORDER = {'little': 0, 'big': 1}
+
+
+class StoreError(Exception):
+    pass
+
+
+def pack_postal_code(postal_code):
+    '''
+    Packs a postal code, e.g. "3011AB", in an integer: pnum * 676 + pchar,
+    where the two letters of pchar count from 0 (AA) to 675 (ZZ). Returns
+    None for strings that are no postal code.
+    '''
+    postal_code = postal_code.replace(' ', '').upper()
+    if len(postal_code) != 6 or not postal_code[:4].isdigit() or not ('A' <= postal_code[4] <= 'Z' and 'A' <= postal_code[5] <= 'Z'):
+        return None
+    return int(postal_code[:4]) * 676 + (ord(postal_code[4]) - 65) * 26 + ord(postal_code[5]) - 65
+
+
+def unpack_postal_code(packed):
+    'returns the postal code string of a packed postal code'
+    pnum, pchar = divmod(packed, 676)
+    return '%04d%s%s' % (pnum, chr(65 + pchar // 26), chr(65 + pchar % 26))
+
+
+def add_string(offsets, names, name):
+    names.frombytes(name.encode('utf8'))
+    offsets.append(len(names))
+
+
+def build_columns(cities, postal_codes=(), postal_ranges=()):
+    '''
+    Returns the sections of an address book as a dict of arrays.
+    cities =        iterable of (city, streets) pairs, streets is an iterable
+                    of (street, rows) pairs and rows is an iterable of
+                    (min, max, type code, x, y) tuples sorted on min
+    postal_codes =  iterable of (postal code, city, street) tuples
+    postal_ranges = iterable of (packed postal code, min, max, type code, x, y)
+                    tuples sorted on packed postal code and min
+    '''
+    columns = {name: array(typecode) for name, typecode in SECTIONS}
+    for name in ['city_offsets', 'city_streets', 'street_offsets', 'street_rows']:
+        columns[name].append(0)
+    street_ids = {}
+    for city, streets in sorted(cities, key=lambda x: x[0]):
+        add_string(columns['city_offsets'], columns['city_names'], city)
+        for street, rows in sorted(streets, key=lambda x: x[0]):
+            street_ids[(city, street)] = len(columns['street_rows']) - 1
+            add_string(columns['street_offsets'], columns['street_names'], street)
+            for row in rows:
+                for name, value in zip(['min', 'max', 'type', 'x', 'y'], row):
+                    columns[name].append(value)
+            columns['street_rows'].append(len(columns['min']))
+        columns['city_streets'].append(len(columns['street_rows']) - 1)
+    postal = {}
+    for postal_code, city, street in postal_codes:
+        packed = pack_postal_code(postal_code)
+        if packed is not None and (city, street) in street_ids:
+            postal[packed] = street_ids[(city, street)]
+    for packed in sorted(postal):
+        columns['postal_codes'].append(packed)
+        columns['postal_streets'].append(postal[packed])
+    for row in postal_ranges:
+        for name, value in zip(['postal_index', 'postal_min', 'postal_max', 'postal_type', 'postal_x', 'postal_y'], row):
+            columns[name].append(value)
+    return columns
+
+
+def layout(columns):
+    'returns the (offset, length) of every section of columns and the size of the store'
+    offset = HEADER.size + SECTION.size * len(SECTIONS)
+    sections = []
+    for name, _ in SECTIONS:
+        offset += -offset % 8  # keep every section 8-byte aligned
+        sections.append((offset, len(columns[name])))
+        offset += columns[name].itemsize * len(columns[name])
+    return sections, offset
+
+
+def header(sections):
+    return HEADER.pack(MAGIC, VERSION, BYTEORDER[sys.byteorder], len(SECTIONS)) + b''.join(SECTION.pack(*x) for x in sections)
+
+
+def write(filename, cities, postal_codes=(), postal_ranges=()):
+    'writes an address book to filename, see build_columns for the arguments'
+    columns = build_columns(cities, postal_codes, postal_ranges)
+    sections, _ = layout(columns)
+    with open(filename, 'wb') as f:
+        f.write(header(sections))
+        for (name, _), (offset, _) in zip(SECTIONS, sections):
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(columns[name])
+
+
+def pack_into(buffer, columns):
+    '''
+    Writes the store of columns (see build_columns) into a writable buffer of at
+    least layout(columns)[1] bytes, e.g. shared memory. Padding is not cleared.
+    '''
+    sections, size = layout(columns)
+    buffer = memoryview(buffer).cast('B')
+    data = header(sections)
+    buffer[:len(data)] = data
+    for (name, _), (offset, _) in zip(SECTIONS, sections):
+        data = memoryview(columns[name]).cast('B')
+        buffer[offset:offset + len(data)] = data
+    buffer.release()
+    return size
+
+
+class StringTable(object):
+    'read-only sequence of the strings in a names section'
+
+    def __init__(self, offsets, names):
+        self.offsets = offsets
+        self.names = names
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.names[self.offsets[i]:self.offsets[i + 1]]).decode('utf8')
+
+    def find(self, name, lo=0, hi=None):
+        'returns the index of name between lo and hi, raises KeyError when it is missing'
+        if hi is None:
+            hi = len(self)
+        i = bisect_left(self, name, lo, hi)
+        if i == hi or self[i] != name:
+            raise KeyError(name)
+        return i
+
+
+class AddressStore(object):
+    '''
+    Read-only view on an address book written by write(). The sections are
+    available as attributes (memoryviews cast to their type), lookups only
+    decode the names they need.
+    '''
+
+    def __init__(self, buffer, filename=None):
+        self.filename = filename
+        self.source = buffer
+        self.buffer = memoryview(buffer)
+        if len(self.buffer) < HEADER.size:
+            raise StoreError('Not an address book store: %s' % filename)
+        magic, version, byteorder, count = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise StoreError('Not an address book store: %s' % filename)
+        if version != VERSION:
+            raise StoreError('Address book store version %d is not supported (expected %d)' % (version, VERSION))
+        if byteorder != BYTEORDER[sys.byteorder] or count != len(SECTIONS):
+            raise StoreError('Address book store was written on an incompatible platform')
+        for i, (name, typecode) in enumerate(SECTIONS):
+            offset, length = SECTION.unpack_from(self.buffer, HEADER.size + i * SECTION.size)
+            size = array(typecode).itemsize
+            if offset + length * size > len(self.buffer):
+                raise StoreError('Address book store is truncated: %s' % filename)
+            setattr(self, name, self.buffer[offset:offset + length * size].cast(typecode))
+        self.cities = StringTable(self.city_offsets, self.city_names)
+        self.streets = StringTable(self.street_offsets, self.street_names)
+
+    @classmethod
+    def open(cls, filename):
+        'maps filename read-only into memory'
+        with open(filename, 'rb') as f:
+            if not os.fstat(f.fileno()).st_size:
+                raise StoreError('Address book store is empty: %s' % filename)
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer, filename)
+
+    def close(self):
+        '''
+        Releases the sections and unmaps the file. When streets built from the
+        store are still in use, the file is unmapped once they are gone.
+        '''
+        for name, _ in SECTIONS:
+            getattr(self, name).release()
+        self.buffer.release()
+        if isinstance(self.source, mmap.mmap):
+            try:
+                self.source.close()
+            except BufferError:
+                pass
+
+    def __reduce__(self):
+        # processes that receive a store (e.g. spawned workers) map the file themselves
+        if self.filename is None:
+            raise StoreError('Only stores opened from a file can be pickled')
+        return (self.__class__.open, (self.filename,))
+
+    def city_id(self, city):
+        return self.cities.find(city)
+
+    def street_ids(self, city_id):
+        'returns the range of street indexes of a city'
+        return range(self.city_streets[city_id], self.city_streets[city_id + 1])
+
+    def street_id(self, city_id, street):
+        return self.streets.find(street, self.city_streets[city_id], self.city_streets[city_id + 1])
+
+    def street_city_id(self, street_id):
+        return bisect_right(self.city_streets, street_id) - 1
+
+    def rows(self, street_id):
+        'returns the range of housenumber range indexes of a street'
+        return range(self.street_rows[street_id], self.street_rows[street_id + 1])
+
+    def postal_street_id(self, postal_code):
+        'returns the street index of postal_code, raises KeyError when it is missing'
+        packed = pack_postal_code(postal_code)
+        if packed is not None:
+            i = bisect_left(self.postal_codes, packed)
+            if i < len(self.postal_codes) and self.postal_codes[i] == packed:
+                return self.postal_streets[i]
+        raise KeyError(postal_code)
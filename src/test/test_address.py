@@ -3,8 +3,33 @@ Created on Apr 19, 2015
 
 @author: roel
 '''
+import os
+import pickle
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from zipfile import ZipFile
 from ..FileHandler.test.test_filehandler import *
-from .. import address
+from .. import address, coordinates
+
+
+ROWS = [
+    # id, postcode, postcode_id, pnum, pchar, min, max, type, street, city, ..., rd_x, rd_y, ...
+    ['1', '3011AB', '30110001', '3011', 'AB', '2', '24', 'even', 'Kruisplein', 'Rotterdam', '', '', '', '', 'ZH', '51.92', '4.47', '92000.0', '437000.0', 'postcode', '2014-04-10 13:20:28'],
+    ['2', '3011AC', '30110002', '3011', 'AC', '26', '40', 'even', 'Kruisplein', 'Rotterdam', '', '', '', '', 'ZH', '51.92', '4.47', '92010.0', '437010.0', 'postcode', '2014-04-10 13:20:28'],
+    ['3', '3011AD', '30110003', '3011', 'AD', '1', '39', 'odd', 'Kruisplein', 'Rotterdam', '', '', '', '', 'ZH', '51.92', '4.47', '92020.0', '437020.0', 'postcode', '2014-04-10 13:20:28'],
+    ['4', '3012AA', '30120001', '3012', 'AA', '1', '10', 'mixed', 'Coolsingel', 'Rotterdam', '', '', '', '', 'ZH', '51.92', '4.47', '92100.0', '437100.0', 'postcode', '2014-04-10 13:20:28'],
+    ['5', '7551AA', '75510001', '7551', 'AA', '2', '60', 'even', 'Leliestraat', 'Hengelo', '', '', '', '', 'OV', '52.26', '6.79', '250000.0', '475000.0', 'postcode', '2014-04-10 13:20:28'],
+    ['7', '3311AA', '33110001', '3311', 'AA', '1', '21', 'odd', 'Burgemeester de Raadtsingel', 'Dordrecht', '', '', '', '', 'ZH', '51.81', '4.67', '105000.0', '425000.0', 'postcode', '2014-04-10 13:20:28'],
+    ['6', '1011AA', '10110001', '1011', 'AA', '1', '99', 'mixed', 'Dam', 'Amsterdam', '', '', '', '', 'NH', '52.37', '4.89', '121000.0', '487000.0', 'postcode', '2014-04-10 13:20:28'],
+]
+
+
+def address_book():
+    'returns a small address book filled with ROWS'
+    book = address.AddressBook(load_postal_code=False)
+    book.load(ROWS)
+    return book
 
 
 class TestAddress(unittest.TestCase):
@@ -25,7 +50,17 @@ class TestAddressAddress(unittest.TestCase):
 class TestAddressPostalCode(unittest.TestCase):
 
     def testinit(self):
-        pass
+        postal_code = address.PostalCode(ROWS)
+        self.assertEqual(postal_code.codes['3011AB'], ('Rotterdam', 'Kruisplein'))
+        self.assertEqual(len(postal_code.codes), len(ROWS))
+
+    def testFind(self):
+        postal_code = address.PostalCode(ROWS + [['8', '3011AB', '', '3011', 'AB', '1', '23', 'odd', 'Kruisplein', 'Rotterdam'] + [''] * 7 + ['91000.0', '436000.0', '', '']])
+        self.assertEqual(postal_code.find('3011AB', 8), (92000.0, 437000.0))
+        self.assertEqual(postal_code.find('3011 ab', 9), (91000.0, 436000.0))
+        self.assertEqual(postal_code.find('3011AB', 30), (92000.0, 437000.0)) # closest even range
+        self.assertEqual(postal_code.find('3011AB'), (92000.0, 437000.0))
+        self.assertRaises(KeyError, postal_code.find, '3011ZZ')
 
 
 class TestAddressHousenumber(unittest.TestCase):
@@ -39,17 +74,63 @@ class TestAddressHousenumber(unittest.TestCase):
     def testMatchEvenType(self):
         pass
 
+    def testType(self):
+        housenumber = address.HouseNumber(1, 9, 'ODD', 1.0, 2.0)
+        self.assertEqual((housenumber.code, housenumber.type), (2, 'ODD'))
+        self.assertEqual(address.HouseNumber(1, 9, 2, 1.0, 2.0).type, 'ODD')
+        self.assertFalse(hasattr(housenumber, '__dict__'))
+
+    def testSetState(self):
+        housenumber = address.HouseNumber.__new__(address.HouseNumber)
+        housenumber.__setstate__({'min': 1, 'max': 9, 'type': 'EVEN', 'x': 1.0, 'y': 2.0}) # pickled as a dict
+        self.assertEqual((housenumber.type, housenumber.lat), ('EVEN', None))
+
 
 class TestAddressStreet(unittest.TestCase):
 
+    def setUp(self):
+        self.street = address.Street('KRUISPLEIN')
+        for housenumber in [(26, 40, 'EVEN', 3, 3), (1, 39, 'ODD', 5, 5), (2, 24, 'EVEN', 1, 1), (50, 60, 'MIXED', 7, 7)]:
+            self.street.add(address.HouseNumber(*housenumber))
+
     def testAdd(self):
-        pass
+        self.assertEqual((self.street.min, self.street.max, self.street.len, self.street.type), (1, 60, 4, 'multi'))
+        self.assertEqual(list(self.street.mins), [26, 1, 2, 50])
+        self.street.sort()
+        self.assertEqual(list(self.street.mins), [1, 2, 26, 50])
+        self.assertEqual({side: list(positions) for side, positions in self.street.sides.items()}, {'EVEN': [1, 2, 3], 'ODD': [0, 3]})
+        self.assertEqual([x.min for x in self.street.housenumbers], [1, 2, 26, 50])
 
     def testFind(self):
-        pass
+        self.assertEqual(self.street.find(), (3, 3))
+        self.assertEqual(self.street.find(4), (1, 1))
+        self.assertEqual(self.street.find(27), (5, 5))
+        self.assertEqual(self.street.find(55), (7, 7))
 
     def testFindRDcoord(self):
-        pass
+        self.assertEqual(self.street.find(44), (3, 3)) # closest range on the even side
+        self.assertEqual(self.street.find(45), (7, 7))
+
+    def testFindTypeMismatch(self):
+        street = address.Street('LELIESTRAAT')
+        for housenumber in [(2, 10, 'EVEN', 0, 0), (12, 20, 'EVEN', 10, 0), (22, 30, 'EVEN', 20, 0)]:
+            street.add(address.HouseNumber(*housenumber))
+        self.assertEqual(street.find(3), (10, 0)) # odd number on an even street: halfway
+
+    def testFindInterpolated(self):
+        self.assertEqual(self.street.find_interpolated(55), (7, 7, 0.0))
+        x, y, radius = self.street.find_interpolated(33) # between ODD 1-39 (5, 5) and MIXED 50-60 (7, 7)
+        self.assertAlmostEqual(x, 5 + 2 * 13 / 35)
+        self.assertAlmostEqual(radius, 13 / 35 * 8 ** 0.5)
+        self.assertEqual(self.street.find_interpolated(0)[:2], (4, 4))
+        street = address.Street('LELIESTRAAT')
+        street.add(address.HouseNumber(2, 10, 'EVEN', 0, 0))
+        self.assertEqual(street.find_interpolated(3), (0, 0, 0.0)) # no odd side: halfway
+
+    def testSetState(self):
+        street = address.Street.__new__(address.Street)
+        street.__setstate__({'name': 'DAM', 'housenumbers': [address.HouseNumber(1, 9, 'MIXED', 1, 2)], 'min': 1, 'max': 9, 'len': 1, 'type': 'MIXED'})
+        self.assertEqual(street.find(3), (1, 2))
 
 
 class TestAddressCity(unittest.TestCase):
@@ -57,37 +138,346 @@ class TestAddressCity(unittest.TestCase):
     def testAdd(self):
         pass
 
+    def testChops(self):
+        city = address.City('ROTTERDAM')
+        for street in ['BURGEMEESTER DE RAADTSINGEL', 'BURGEMEESTER HOFFMANPLEIN', 'NIEUWE BINNENWEG', 'HOF']:
+            city.add(street, address.HouseNumber(1, 1, 'ODD', 0, 0))
+        self.assertEqual(sorted(city.chops()), [('BURGEMEESTER DE RAADTSINGEL', 'BURGEMEESTER DE RAADTSINGEL'), ('BURGEMEESTER DE RAADTSINGEL', 'RAADTSINGEL'),
+                                                ('BURGEMEESTER HOFFMANPLEIN', 'BURGEMEESTER HOFFMANPLEIN'), ('BURGEMEESTER HOFFMANPLEIN', 'HOFFMANPLEIN'),
+                                                ('HOF', 'HOF'), ('NIEUWE BINNENWEG', 'BINNENWEG'), ('NIEUWE BINNENWEG', 'NIEUWE')])
+        self.assertEqual(city.chop_index.search('PRIO 1 HOFFMANPLEIN 3'), ['BURGEMEESTER HOFFMANPLEIN'])
+
     def testFind(self):
         pass
 
 
 class TestAddressBook(unittest.TestCase):
 
+    def testLoad(self):
+        book = address.AddressBook(load_postal_code=False)
+        book.load(iter(ROWS))
+        self.assertEqual(sorted(book.cities), ['AMSTERDAM', 'DORDRECHT', 'HENGELO', 'ROTTERDAM'])
+        self.assertEqual(book.postal_code.codes, address.PostalCode(ROWS).codes)
+
+    def testLoadZip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            zipfile = os.path.join(tmp, address.ZIP_NAME)
+            with ZipFile(zipfile, 'w') as f:
+                f.writestr(address.FILE_NAME, '\n'.join(';'.join('"%s"' % x for x in row) for row in [['id'] + ROWS[0][1:]] + ROWS))
+            self.assertEqual(list(address.iter_address_file(zipfile)), ROWS)
+            book = address.AddressBook(load_postal_code=False)
+            book.load(address.iter_address_file(zipfile))
+            self.assertEqual(sorted(book.cities), ['AMSTERDAM', 'DORDRECHT', 'HENGELO', 'ROTTERDAM'])
+
     def testAdd(self):
         pass
 
+    def testLoadParallel(self):
+        rows = ROWS + [[str(100 + i), '1012A%s' % chr(65 + i), '', '1012', 'A' + chr(65 + i), str(i), str(i + 10), 'mixed', 'Straat %d' % (i % 5), 'Stad %d' % (i % 7),
+                        '', '', '', '', 'UT', '52.0', '5.0', str(130000.0 + i), str(450000.0 + i), 'postcode', '2015-01-01 00:00:00'] for i in range(60)]
+        serial, parallel = address.AddressBook(load_postal_code=False), address.AddressBook(load_postal_code=False)
+        serial.load(rows)
+        parallel.load(rows, workers=2)
+        self.assertGreater(len(set(address.partition_of(city, 2 * address.PARTITIONS_PER_WORKER) for city in serial.cities)), 1)
+        self.assertEqual(list(parallel.cities), list(serial.cities))
+        for name, city in serial.cities.items():
+            self.assertEqual(list(parallel.cities[name].streets), list(city.streets))
+            for street in city.streets.values():
+                self.assertEqual(parallel.cities[name].streets[street.name].__getstate__(), street.__getstate__())
+        for column in ['codes', 'packed', 'mins', 'maxs', 'types', 'xs', 'ys']:
+            self.assertEqual(getattr(parallel.postal_code, column), getattr(serial.postal_code, column))
+        self.assertEqual((parallel.records, parallel.provinces), (serial.records, serial.provinces))
+        self.assertEqual(parallel.find('STAD 3', 'STRAAT 0', 12), serial.find('STAD 3', 'STRAAT 0', 12))
+        parallel = address.AddressBook(load_postal_code=False)
+        parallel.load(iter(ROWS), wgs84=True, workers=2)
+        self.assertAlmostEqual(parallel.find_wgs84('Amsterdam', 'Dam', 3)[0], 52.37, places=5)
+
+    def testCompact(self):
+        book = address_book()
+        city = book.cities['ROTTERDAM']
+        self.assertFalse(any(hasattr(x, '__dict__') for x in [city, city.streets['KRUISPLEIN']]))
+        records = [x for _, x in book.records.items() if x[3] == 'KRUISPLEIN']
+        self.assertTrue(all(x[2] is records[0][2] and x[3] is records[0][3] for x in records)) # interned names
+        self.assertTrue(all(x[0] is records[0][0] for x in records))
+        self.assertEqual([x[6] for x in records], [1, 1, 2])
+        self.assertEqual(len(book.records.keys), len(set(book.records.keys)))
+        unpickled = pickle.loads(pickle.dumps(book))
+        self.assertEqual(unpickled.find('ROTTERDAM', 'KRUISPLEIN', 27), book.find('ROTTERDAM', 'KRUISPLEIN', 27))
+        self.assertEqual(unpickled.records, book.records)
+        state = dict(book.__dict__, records=dict(book.records.items())) # pickled when the records were tuples
+        unpickled = address.AddressBook.__new__(address.AddressBook)
+        unpickled.__setstate__(state)
+        self.assertEqual(unpickled.records, book.records)
+        book.remove_rows(['1', '6'])
+        self.assertEqual(len(book.records.dates), len(ROWS))
+        records = dict(book.records.items())
+        book.records.compact()
+        self.assertEqual(dict(book.records.items()), records)
+        self.assertEqual((len(book.records.dates), len(book.records.mins)), (len(ROWS) - 2, len(ROWS) - 2))
+        self.assertNotIn(('AMSTERDAM', 'DAM'), book.records.keys)
+        self.assertEqual(list(unpickled.cities['ROTTERDAM'].street_index.search('KRUISPLEIN 26')), ['KRUISPLEIN'])
+
     def testFind(self):
         pass
 
+    def testCache(self):
+        book = address_book()
+        book.set_cache(10)
+        self.assertEqual(book.find('Rotterdam', 'Kruisplein', 26), (92010.0, 437010.0))
+        self.assertEqual(book.find('ROTTERDAM', 'KRUISPLEIN', '26'), (92010.0, 437010.0))
+        self.assertEqual((book.cache.hits, book.cache.misses), (1, 1))
+        book.add('ROTTERDAM', 'KRUISPLEIN', address.HouseNumber(26, 26, 'EVEN', 1.0, 2.0))
+        self.assertEqual(len(book.cache), 0)
+
+    def testNearest(self):
+        book = address_book()
+        nearest = book.nearest(92012.0, 437011.0, k=2)
+        self.assertEqual([(x.city, x.street, x.min, x.max) for x in nearest], [('ROTTERDAM', 'KRUISPLEIN', 26, 40), ('ROTTERDAM', 'KRUISPLEIN', 1, 39)])
+        self.assertAlmostEqual(nearest[0].distance, 5 ** 0.5)
+        self.assertEqual(book.nearest(92012.0, 437011.0, k=5, max_dist=20)[-1].min, 2)
+        self.assertEqual(book.nearest(0, 0, max_dist=1000), [])
+        self.assertEqual([x[0].street for x in book.nearest_many([121000.0, 250001.0], [487000.0, 475000.0])], ['DAM', 'LELIESTRAAT'])
+
+    def testFindWGS84(self):
+        book = address.AddressBook(load_postal_code=False)
+        book.load(ROWS, wgs84=True)
+        lat, lon = book.find_wgs84('Amsterdam', 'Dam', 3)
+        self.assertAlmostEqual(lat, 52.37, places=5)
+        self.assertAlmostEqual(lon, 4.89, places=5)
+        self.assertEqual(address_book().find_wgs84('Amsterdam', 'Dam', 3), coordinates.rd_to_wgs84(121000.0, 487000.0))
+        self.assertRaises(KeyError, book.find_wgs84, 'Amsterdam', 'Rokin')
+
+    def testUpdate(self):
+        rows = [list(x) for x in ROWS if x[0] != '6'] # Dam is deleted
+        rows[0][17:19], rows[0][20] = ['92001.0', '437001.0'], '2015-01-01 00:00:00'
+        rows.append(['8', '3011AE', '30110004', '3011', 'AE', '42', '50', 'even', 'Kruisplein', 'Rotterdam', '', '', '', '', 'ZH', '51.92', '4.47', '92030.0', '437030.0', 'postcode', '2015-01-01 00:00:00'])
+        book = address_book()
+        with tempfile.TemporaryDirectory() as tmp:
+            delta = book.update(rows, os.path.join(tmp, 'delta'))
+            self.assertEqual((len(delta.inserts), len(delta.updates), delta.deletes), (1, 1, ['6']))
+            replayed = address_book()
+            for x in address.iter_deltas(os.path.join(tmp, 'delta')):
+                replayed.apply(x)
+        rebuilt = address_book()
+        rebuilt.load(rows)
+        for updated in [book, replayed]:
+            self.assertEqual(sorted(updated.cities), ['DORDRECHT', 'HENGELO', 'ROTTERDAM'])
+            self.assertEqual([(name, x.housenumbers[0].__getstate__()) for name, x in updated.cities['ROTTERDAM'].streets.items()],
+                             [(name, x.housenumbers[0].__getstate__()) for name, x in rebuilt.cities['ROTTERDAM'].streets.items()])
+            self.assertEqual(list(updated.cities['ROTTERDAM'].streets['KRUISPLEIN'].maxs), [39, 24, 40, 50])
+            self.assertEqual(updated.records, rebuilt.records)
+            self.assertEqual(updated.postal_code.codes, rebuilt.postal_code.codes)
+            self.assertEqual(list(updated.postal_code.packed), list(rebuilt.postal_code.packed))
+            self.assertEqual(updated.find('Rotterdam', 'Kruisplein', 44), (92030.0, 437030.0))
+        self.assertEqual(book.update(rows), address.Delta([], [], []))
+        self.assertRaises(address.UpdateError, address.AddressBook(load_postal_code=False).update, rows)
+
+    def testFoldDeltas(self):
+        rows = [list(x) for x in ROWS if x[0] != '6']
+        dirlist = address.dirlist
+        with tempfile.TemporaryDirectory() as tmp:
+            shutil.copy(os.path.join(dirlist['data'], 'plaatsnamen_schrijfwijze.csv'), tmp)
+            address.dirlist = {'data': tmp}
+            try:
+                dandp = address.DownloadAndPickle()
+                dandp.csv = iter(ROWS)
+                dandp.pickle()
+                dandp.save_store()
+                address_book().update(rows, os.path.join(tmp, address.DELTA_NAME))
+                book = address.DownloadAndPickle().unpickle()
+                self.assertNotIn('AMSTERDAM', book.cities)
+                self.assertIn(address.DELTA_NAME, os.listdir(tmp)) # only folded by compact
+                self.assertNotIn('AMSTERDAM', address.load_address_book().cities)
+                address.DownloadAndPickle('compact')
+                self.assertEqual(sorted(os.listdir(tmp)), ['adressenbestand.bin', 'adressenbestand.p', 'plaatsnamen_schrijfwijze.csv'])
+                book = address.DownloadAndPickle().unpickle()
+                self.assertNotIn('AMSTERDAM', book.cities)
+                self.assertEqual(len(book.records.dates), len(rows))
+                self.assertNotIn('AMSTERDAM', address.load_address_book().cities) # the store was rewritten as well
+            finally:
+                address.dirlist = dirlist
+        street = address_book().cities['ROTTERDAM'].streets['KRUISPLEIN']
+        self.assertRaises(KeyError, street.remove, *street.housenumbers[:2], address.HouseNumber(3, 5, 'ODD', 0.0, 0.0))
+        self.assertEqual(street.len, 3)
+        street.remove(*street.housenumbers[:2])
+        self.assertEqual(list(street.maxs), [40])
+
+    def testCorruptStore(self):
+        dirlist = address.dirlist
+        with tempfile.TemporaryDirectory() as tmp:
+            shutil.copy(os.path.join(dirlist['data'], 'plaatsnamen_schrijfwijze.csv'), tmp)
+            address.dirlist = {'data': tmp}
+            try:
+                dandp = address.DownloadAndPickle()
+                dandp.csv = iter(ROWS)
+                dandp.pickle()
+                with open(os.path.join(tmp, address.STORE_NAME), 'wb') as f:
+                    f.write(b'not a store')
+                with self.assertLogs('address', 'WARNING'):
+                    book = address.load_address_book()
+                self.assertEqual(book.find('ROTTERDAM', 'KRUISPLEIN', 26), address_book().find('ROTTERDAM', 'KRUISPLEIN', 26))
+                book = address.load_address_book() # the store was rebuilt
+                self.assertIsNone(book.records)
+                self.assertEqual(book.find('ROTTERDAM', 'KRUISPLEIN', 26), address_book().find('ROTTERDAM', 'KRUISPLEIN', 26))
+                book.store.close()
+            finally:
+                address.dirlist = dirlist
+
+    def testPartitions(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            address_book().save_partitions(tmp)
+            self.assertEqual(sorted(os.listdir(tmp)), ['NH.bin', 'OV.bin', 'ZH.bin', 'partitions.json'])
+            book = address.AddressBook.open_partitions(tmp, provinces=['ZH'], max_cities=1)
+            self.assertEqual(sorted(book.cities), ['DORDRECHT', 'ROTTERDAM'])
+            self.assertEqual(len(book.cities.cache), 0) # no city is loaded before its first lookup
+            self.assertEqual(book.find('Rotterdam', 'Kruisplein', 26), (92010.0, 437010.0))
+            self.assertEqual(book.find('Dordrecht', 'Burgemeester de Raadtsingel', 3), (105000.0, 425000.0))
+            self.assertEqual((len(book.cities.cache), book.cities.cache.evictions), (1, 1))
+            self.assertEqual(book.find_PC('3011AC', 28), (92010.0, 437010.0))
+            self.assertRaises(KeyError, book.find_PC, '1011AA')
+            search = address.AddressSearch(address_book=book)
+            self.assertEqual(search.find('KRUISPLEIN 26 ROTTERDAM'), (['ROTTERDAM'], ['KRUISPLEIN'], [26]))
+            self.assertEqual(search.find('DAM 1 AMSTERDAM'), None)
+            book.cities.close()
+            book = address.AddressBook.open_partitions(tmp, cities=['Hengelo'], provinces=['NH'])
+            self.assertEqual(sorted(book.cities), ['AMSTERDAM', 'HENGELO'])
+            self.assertEqual(sorted(book.postal_code.codes), ['1011AA', '7551AA'])
+            book.cities.close()
+
+    def testPartitionsWithoutProvinces(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            address_book().save_store(os.path.join(tmp, address.STORE_NAME))
+            book = address.AddressBook.open(os.path.join(tmp, address.STORE_NAME))
+            self.assertRaises(address.PartitionError, book.save_partitions, os.path.join(tmp, 'partitions'))
+            self.assertFalse(os.path.exists(os.path.join(tmp, 'partitions')))
+            book.save_partitions(os.path.join(tmp, 'partitions'), address.read_provinces(ROWS))
+            self.assertEqual(sorted(address.partitions_index(os.path.join(tmp, 'partitions'))), ['NH', 'OV', 'ZH'])
+            book.store.close()
+
     def testFindPC(self):
-        pass
+        book = address_book()
+        self.assertEqual(book.find_PC('3011AC', 28), (92010.0, 437010.0))
+        book.postal_code.codes['3011XX'] = ('Rotterdam', 'Coolsingel')
+        self.assertEqual(book.find_PC('3011XX'), (92100.0, 437100.0))
 
 
 class TestAddressSearch(unittest.TestCase):
 
+    def setUp(self):
+        self.search = address.AddressSearch(address_book=address_book())
+
     def testFindRDcoord(self):
         pass
 
     def testFind(self):
-        pass
+        self.assertEqual(self.search.find('PRIO 2 TS223 KRUISPLEIN 26 ROTTERDAM WATEROVERLAST VAK: 5991200'),
+                         (['ROTTERDAM'], ['KRUISPLEIN'], [26]))
+        self.assertEqual((self.search.x, self.search.y), ([92010.0], [437010.0]))
+        self.search.find('PRIO 2 WATEROVERLAST : : LELIESTRAAT : 44 HENGELO (GLD) 068541')
+        self.assertEqual((self.search.city, self.search.street, self.search.housenumber), (['HENGELO'], ['LELIESTRAAT'], [0]))
+        self.search.find('PRIO 1 BRAND ROTTERDAMSEWEG')
+        self.assertEqual(self.search.city, [])
+        self.assertEqual(self.search.find('PRIO 1 BRAND 3011 AC 28 VAK: 5991200'), (['ROTTERDAM'], ['KRUISPLEIN'], [28]))
+        self.assertEqual((self.search.x, self.search.y), ([92010.0], [437010.0]))
+        self.assertEqual(self.search.find('PRIO 1 KRUISPLEIN 26 3011AB ROTTERDAM'), (['ROTTERDAM'], ['KRUISPLEIN'], [26]))
+        self.assertEqual((self.search.x, self.search.y), ([92010.0], [437010.0])) # the housenumber came before the postal code
+        self.assertEqual(self.search.find('PRIO 1 3011AB ROTTERDAM'), (['ROTTERDAM'], ['KRUISPLEIN'], [0]))
+        self.search.address_book.postal_code.codes['3011XX'] = ('Rotjeknor', 'Kruisplein')
+        self.search.address_book.alternate_cities['ROTJEKNOR'] = ['DORDRECHT'] # without a KRUISPLEIN
+        self.assertEqual(self.search.find('PRIO 1 KRUISPLEIN 26 3011XX'), None)
+        self.search.find('PRIO 1 RAADTSINGEL 12 DORDRECHT')
+        self.assertEqual((self.search.city, self.search.street), (['DORDRECHT'], ['BURGEMEESTER DE RAADTSINGEL']))
+
+    def testFindHouseno(self):
+        self.assertEqual(self.search.find('PRIO 1 KRUISPLEIN 26A ROTTERDAM')[2], [26])
+        self.assertEqual(self.search.spans['KRUISPLEIN'], [(7, 17, '26', 'A')])
+        self.search.find('KRUISPLEIN 26 ROTTERDAM KRUISPLEIN 30B')
+        self.assertEqual(self.search.housenumber, [26])
+        self.assertEqual(self.search.errors[0].values, ('ROTTERDAM', 'KRUISPLEIN', ('26', '30B')))
+
+    def testMultipleHits(self):
+        self.assertEqual(self.search.find('KRUISPLEIN 26 / COOLSINGEL 3 ROTTERDAM'), (['ROTTERDAM'] * 2, ['KRUISPLEIN', 'COOLSINGEL'], [26, 3]))
+        self.search.address_book.add('ROTTERDAM', 'NIEUWE KRUISPLEIN', address.HouseNumber(1, 9, 'ODD', 1.0, 2.0))
+        self.assertEqual(self.search.find('NIEUWE KRUISPLEIN 5 ROTTERDAM'), (['ROTTERDAM'], ['NIEUWE KRUISPLEIN'], [5]))
+
+    def testFindFuzzy(self):
+        self.assertEqual(self.search.find('PRIO 1 KRUISPEIN 26 ROTERDAM'), None)
+        self.search.address_book.set_fuzzy(2)
+        self.assertEqual(self.search.find('PRIO 1 KRUISPEIN 26 ROTERDAM'), (['ROTTERDAM'], ['KRUISPLEIN'], [26]))
+        self.assertEqual((self.search.x, self.search.y), ([92010.0], [437010.0]))
+        self.assertEqual([x.kind for x in self.search.errors], ['fuzzy city', 'fuzzy street'])
+        self.assertTrue(str(self.search.errors[0]).startswith('Stad "ROTERDAM" niet gevonden, wel "ROTTERDAM"'))
+        self.assertEqual(self.search.find('PRIO 1 BURGEMEESTER DE RAADSINGEL 3 DORDRECHT')[1], ['BURGEMEESTER DE RAADTSINGEL'])
+        self.assertEqual(self.search.find('PRIO 1 KRUISPLEIN 26 ROTTERDAM')[2], [26])
 
     def testReset(self):
         pass
 
+    def testCache(self):
+        self.search.set_cache(10)
+        first = self.search.find('KRUISPLEIN 26 ROTTERDAM')
+        self.assertEqual(self.search.find('Kruisplein 26 Rotterdam'), first)
+        self.assertEqual((self.search.x, self.search.y), ([92010.0], [437010.0]))
+        self.assertEqual((self.search.cache.hits, self.search.cache.misses), (1, 1))
+        self.search.address_book.add('ROTTERDAM', 'KRUISPLEIN', address.HouseNumber(26, 26, 'EVEN', 1.0, 2.0))
+        self.search.find('KRUISPLEIN 26 ROTTERDAM')
+        self.assertEqual(self.search.cache.misses, 2)
+        self.assertIsNone(self.search.find('KRUISPEIN 26 ROTERDAM'))
+        self.search.address_book.set_fuzzy(2)
+        self.assertEqual(self.search.find('KRUISPEIN 26 ROTERDAM'), (['ROTTERDAM'], ['KRUISPLEIN'], [26]))
+        self.search.address_book.set_fuzzy(None)
+        self.assertIsNone(self.search.find('KRUISPEIN 26 ROTERDAM'))
+
+    def testResult(self):
+        result = self.search.result('Kruisplein 26 Rotterdam')
+        self.assertEqual(result, address.SearchResult('KRUISPLEIN 26 ROTTERDAM', ('ROTTERDAM',), ('KRUISPLEIN',), (26,), (92010.0,), (437010.0,), ()))
+        self.assertEqual(self.search.result('').city, ())
+        self.assertEqual(self.search.result('Krúisplein\u00a026 Rötterdam')[:4], ('KRUISPLEIN 26 ROTTERDAM', ('ROTTERDAM',), ('KRUISPLEIN',), (26,)))
+
+    def testFindMany(self):
+        messages = ['KRUISPLEIN 26 ROTTERDAM', 'DAM 1 AMSTERDAM', 'NIETS', 'COOLSINGEL ROTTERDAM'] * 5
+        serial = list(self.search.find_many(messages, workers=1))
+        self.assertEqual([x.address_string for x in serial], messages)
+        self.assertEqual(list(self.search.find_many(messages, workers=2, chunksize=3)), serial)
+        consumed = []
+        def stream():
+            for i in range(10 ** 6):
+                consumed.append(i)
+                yield 'DAM 1 AMSTERDAM'
+        results = self.search.find_many(stream(), workers=2, chunksize=10)
+        next(results)
+        self.assertLessEqual(len(consumed), 2 * 2 * 10 + 10) # a window of two chunks per worker, not the whole stream
+        results.close()
+
+    def testFindManyWGS84(self):
+        messages = ['KRUISPLEIN 26 ROTTERDAM', 'NIETS', 'DAM 1 AMSTERDAM']
+        results = list(self.search.find_many(messages, workers=1, chunksize=2, wgs84=True))
+        self.assertEqual([(x.x, x.y) for x in results], [(x.x, x.y) for x in self.search.find_many(messages, workers=1)])
+        self.assertEqual([len(x.lat) for x in results], [1, 0, 1])
+        self.assertEqual((results[2].lat[0], results[2].lon[0]), coordinates.rd_to_wgs84(121000.0, 487000.0))
+
     def testFindCityStreet(self):
         pass
 
 
+
+class TestSearchEngine(unittest.TestCase):
+
+    def testSearch(self):
+        book = address_book()
+        engine = address.SearchEngine(book)
+        messages = ['KRUISPLEIN 26 ROTTERDAM', 'DAM 1 AMSTERDAM', 'NIETS', 'COOLSINGEL ROTTERDAM', 'PRIO 1 3011 AC 28',
+                    'PRIO 1 RAADTSINGEL 12 DORDRECHT', 'LELIESTRAAT 4 HENGELO'] * 30
+        search = address.AddressSearch(address_book=book)
+        expected = [search.result(x) for x in messages]
+        with ThreadPoolExecutor(8) as pool:
+            self.assertEqual(list(pool.map(engine.search, messages)), expected)
+        result = engine.search('KRUISPLEIN 26 ROTTERDAM')
+        self.assertRaises(AttributeError, setattr, result, 'x', (0.0,))
+        self.assertFalse(hasattr(result, '__dict__'))
+        self.assertEqual(engine.find('Rotterdam', 'Kruisplein', 26), (92010.0, 437010.0))
+        self.assertEqual(engine.find_PC('3011AC', 28), (92010.0, 437010.0))
+
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,33 @@
+'''
+Smoke test for the benchmark on a tiny synthetic address file.
+'''
+import unittest
+from .. import benchmark
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def testSyntheticRows(self):
+        rows = list(benchmark.synthetic_rows(500, seed=1))
+        self.assertEqual(len(rows), 500)
+        self.assertTrue(all(len(x) == len(benchmark.HEADER) for x in rows))
+        self.assertEqual(rows, list(benchmark.synthetic_rows(500, seed=1)))
+
+    def testRun(self):
+        bench = benchmark.run(rows=400, messages=20)
+        self.assertIn('AddressSearch.find chop', bench.results)
+        self.assertEqual(bench.results['AddressSearch.find hit']['calls'], 5)
+        lines, regressions = benchmark.compare(bench.results, bench.results)
+        self.assertEqual(regressions, [])
+        self.assertGreater(bench.memory['address_book_kb'], 0)
+        self.assertEqual(len(benchmark.compare_memory(bench.memory, bench.memory)), 2)
+
+    def testDeepSize(self):
+        shared = 'x' * 1000
+        total, sizes = benchmark.deep_size([shared, shared, (shared,)])
+        self.assertLess(total, 2000) # the string is counted once
+        self.assertEqual(set(sizes), {'list', 'str', 'tuple'})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+'''
+Tests for the bulk lookup of (city, street, housenumber) columns.
+'''
+import os
+import tempfile
+import unittest
+from .. import address, bulk
+from .test_address import address_book
+
+
+@unittest.skipIf(bulk.numpy is None, 'NumPy is not installed')
+class TestBulkIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.book = address_book()
+        self.addresses = [('ROTTERDAM', 'KRUISPLEIN', 26), ('Rotterdam', 'Kruisplein', 27), ('ROTTERDAM', 'KRUISPLEIN', 44),
+                          ('ROTTERDAM', 'COOLSINGEL', 0), ('HENGELO', 'LELIESTRAAT', 3), ('AMSTERDAM', 'DAM', 120),
+                          ('ROTTERDAM', 'DAM', 1), ('UTRECHT', 'DAM', 1), ('ROTTERDAM', 'KRUISPLEIN', 26)]
+
+    def testLookup(self):
+        xs, ys, status = self.book.find_bulk(*zip(*self.addresses))
+        self.assertEqual([bulk.STATUS[x] for x in status],
+                         ['found', 'found', 'closest', 'halfway', 'halfway', 'closest', 'no street', 'no city', 'found'])
+        for (city, street, housen), x, y, code in zip(self.addresses, xs, ys, status):
+            if code in (bulk.FOUND, bulk.CLOSEST):
+                self.assertEqual((x, y), self.book.find(city, street, housen))
+        self.assertEqual((xs[3], ys[3]), self.book.find('ROTTERDAM', 'COOLSINGEL'))
+        self.assertTrue(all(x != x for x in xs[6:8])) # NaN
+
+    def testStore(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, address.STORE_NAME)
+            self.book.save_store(filename)
+            mapped = address.AddressBook.open(filename)
+            expected = self.book.find_bulk(*zip(*self.addresses))
+            found = mapped.find_bulk(*zip(*self.addresses))
+            for x, y in zip(expected, found):
+                self.assertEqual([str(v) for v in x], [str(v) for v in y])
+            mapped._bulk_index = None
+            mapped.store.close()
+
+    def testExport(self):
+        columns = self.book.bulk_index.export()
+        self.assertEqual(len(columns['x']), 7)
+        self.assertEqual(sorted(set(zip(columns['city'], columns['street'])))[0], ('AMSTERDAM', 'DAM'))
+        self.assertEqual(list(columns['min'][columns['street'] == 'KRUISPLEIN']), [1, 2, 26])
+
+    def testEmpty(self):
+        xs, ys, status = self.book.find_bulk([], [], [])
+        self.assertEqual((len(xs), len(status)), (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
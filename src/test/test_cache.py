@@ -0,0 +1,39 @@
+'''
+Tests for the LRU result cache.
+'''
+import pickle
+import unittest
+from .. import cache
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def testEviction(self):
+        lru = cache.LRUCache(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        self.assertEqual(lru.get('a'), 1)
+        lru.set('c', 3)
+        self.assertEqual(lru.get('b'), None)
+        self.assertEqual((lru.get('a'), lru.get('c')), (1, 3))
+        self.assertEqual(lru.stats(), {'hits': 3, 'misses': 1, 'evictions': 1, 'size': 2, 'maxsize': 2})
+
+    def testTTL(self):
+        now = [0]
+        lru = cache.LRUCache(2, ttl=10, timer=lambda: now[0])
+        lru.set('a', 1)
+        now[0] = 9
+        self.assertEqual(lru.get('a'), 1)
+        now[0] = 10
+        self.assertEqual(lru.get('a', 'expired'), 'expired')
+        self.assertEqual((lru.evictions, len(lru)), (1, 0))
+
+    def testPickle(self):
+        lru = cache.LRUCache(5, ttl=1)
+        lru.set('a', 1)
+        other = pickle.loads(pickle.dumps(lru))
+        self.assertEqual((len(other), other.maxsize, other.ttl), (0, 5, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+'''
+Tests for the RD New <-> WGS84 conversion.
+'''
+import unittest
+from .. import coordinates
+
+
+class TestCoordinates(unittest.TestCase):
+
+    def testOrigin(self):
+        self.assertEqual(coordinates.rd_to_wgs84(155000, 463000), (coordinates.PHI0, coordinates.LAM0))
+        self.assertEqual(coordinates.wgs84_to_rd(coordinates.PHI0, coordinates.LAM0), (155000.0, 463000.0))
+
+    def testKnownPoint(self):
+        lat, lon = coordinates.rd_to_wgs84(120700.723, 487525.501) # Westertoren, Amsterdam
+        self.assertAlmostEqual(lat, 52.37453253, places=6)
+        self.assertAlmostEqual(lon, 4.88352559, places=6)
+        x, y = coordinates.wgs84_to_rd(52.37453253, 4.88352559)
+        self.assertAlmostEqual(x, 120700.723, places=0)
+        self.assertAlmostEqual(y, 487525.501, places=0)
+
+    def testRoundTrip(self):
+        xs, ys = [13000.0, 92010.0, 250000.0, 278000.0], [306000.0, 437010.0, 475000.0, 619000.0]
+        lats, lons = coordinates.rd_to_wgs84(xs, ys)
+        self.assertEqual(len(lats), 4)
+        for x, y, x2, y2 in zip(xs, ys, *coordinates.wgs84_to_rd(lats, lons)):
+            self.assertLess(abs(x - x2), 1.0)
+            self.assertLess(abs(y - y2), 1.0)
+        self.assertEqual([float(x) for x in lats], [coordinates.rd_to_wgs84(x, y)[0] for x, y in zip(xs, ys)])
+
+
+if __name__ == "__main__":
+    unittest.main()
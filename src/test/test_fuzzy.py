@@ -0,0 +1,47 @@
+'''
+Tests for the fuzzy (misspelled) name matcher.
+'''
+import random
+import unittest
+from .. import fuzzy
+
+
+class TestFuzzy(unittest.TestCase):
+
+    def testEditDistance(self):
+        self.assertEqual(fuzzy.edit_distance('KRUISPLEIN', 'KRUISPLEIN'), 0)
+        self.assertEqual(fuzzy.edit_distance('KRUISPEIN', 'KRUISPLEIN'), 1)
+        self.assertEqual(fuzzy.edit_distance('ROTTEDRAM', 'ROTTERDAM'), 1) # transposition
+        self.assertEqual(fuzzy.edit_distance('DAM', 'AMSTERDAM'), 6)
+        self.assertEqual(fuzzy.edit_distance('DAM', 'AMSTERDAM', 2), 3)
+
+    def testDeletions(self):
+        self.assertEqual(fuzzy.deletions('DAM', 1), {'DAM', 'AM', 'DM', 'DA'})
+        self.assertEqual(len(fuzzy.deletions('ABCD', 2)), 1 + 4 + 6)
+
+    def testLookup(self):
+        rand = random.Random(0)
+        letters = 'ABDEGIKLMNORST'
+        names = sorted(set(''.join(rand.choice(letters) for _ in range(rand.randint(3, 12))) for _ in range(300)))
+        index = fuzzy.FuzzyMatcher(names, max_distance=2, prefix_length=5)
+        for _ in range(100):
+            term = list(rand.choice(names))
+            for _ in range(rand.randint(0, 2)):
+                term.insert(rand.randrange(len(term)), rand.choice(letters))
+                del term[rand.randrange(len(term))]
+            term = ''.join(term)
+            distance = index.allowed_distance(term)
+            expected = sorted((d, name, name) for name in names for d in [fuzzy.edit_distance(term, name)] if d <= distance)
+            self.assertEqual(index.lookup(term), expected, term)
+
+    def testSearch(self):
+        index = fuzzy.FuzzyMatcher(['ROTTERDAM', 'DEN HAAG', ('S-GRAVENHAGE', 'DEN HAAG')])
+        self.assertEqual(index.search('PRIO 1 KRUISPLEIN 26 ROTERDAM'), [('ROTTERDAM', 'ROTERDAM', 1)])
+        self.assertEqual(index.search('BRAND S-GRAVENHAAG / DEN HAAG'), [('DEN HAAG', 'DEN HAAG', 0)])
+        self.assertEqual(index.search('BRAND S-GRAVENHAAG'), [('DEN HAAG', 'S-GRAVENHAAG', 2)])
+        self.assertEqual(index.search('BRAND S-GRAVENHAAG', accept=lambda x: x != 'DEN HAAG'), [])
+        self.assertEqual(index.search('PRIO 1 RTDM'), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+'''
+Tests for the instrumentation of the search stages.
+'''
+import unittest
+from .test_address import address, address_book
+
+instrument = address.instrument # the module address registered its stages with
+
+
+class TestInstrument(unittest.TestCase):
+
+    def tearDown(self):
+        instrument.disable()
+        instrument.reset()
+
+    def testEnable(self):
+        scan = address.AddressSearch.__dict__['scan_cities']
+        instrument.enable()
+        self.assertIsNot(address.AddressSearch.__dict__['scan_cities'], scan)
+        instrument.disable()
+        self.assertIs(address.AddressSearch.__dict__['scan_cities'], scan) # no wrappers left while disabled
+
+    def testReport(self):
+        search = address.AddressSearch(address_book=address_book(), error_log_size=2)
+        search.find('KRUISPLEIN 26 ROTTERDAM')
+        self.assertEqual(instrument.report(), {'counters': {}, 'timings': {}})
+        instrument.enable()
+        search.find('KRUISPLEIN 26 ROTTERDAM')
+        search.find('DAM 1 AMSTERDAM / KRUISPLEIN 26 ROTTERDAM')
+        search.find('NIETS')
+        report = instrument.report()
+        self.assertEqual(report['timings']['search']['calls'], 3)
+        self.assertEqual(report['timings']['city scan']['calls'], 3)
+        self.assertEqual(report['timings']['multiple hits']['calls'], 1)
+        self.assertEqual(sum(report['timings']['house number']['histogram'].values()), report['timings']['house number']['calls'])
+        self.assertEqual(report['counters']['error: cities'], 1)
+        self.assertEqual(search.errors[0].kind, 'combinations') # of 'NIETS'
+        self.assertEqual(len(search.error_log), 2)
+
+    def testTiming(self):
+        timing = instrument.Timing()
+        for seconds in [0.000001, 0.002, 5]:
+            timing.add(seconds)
+        self.assertEqual((timing.calls, timing.histogram[0], timing.histogram[5], timing.histogram[-1]), (3, 1, 1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+'''
+Tests for the interpolation of housenumbers along a street.
+'''
+import unittest
+from .. import interpolation
+
+
+class TestLine(unittest.TestCase):
+
+    def setUp(self):
+        self.line = interpolation.Line([10, 20, 40], [0, 100, 100], [0, 0, 200])
+
+    def testDistances(self):
+        self.assertEqual(list(self.line.distances), [0, 100, 300])
+        self.assertEqual(self.line.spacing(), 10.0)
+
+    def testPoint(self):
+        self.assertEqual(self.line.point(20), (100, 0, 0.0))
+        self.assertEqual(self.line.point(14), (40, 0, 40))
+        self.assertEqual(self.line.point(35), (100, 150, 50))
+        self.assertEqual(self.line.point(6), (-40, 0, 40)) # extrapolated before the first anchor
+        self.assertEqual(self.line.point(50), (100, 300, 100))
+
+    def testSingleAnchor(self):
+        line = interpolation.Line([10], [5], [5])
+        self.assertEqual(line.point(14), (5, 5, 4 * interpolation.SPACING))
+        self.assertEqual(line.point(14, 2.0), (5, 5, 8.0))
+        self.assertEqual(line.halfway(), (5, 5, 0.0))
+
+    def testHalfway(self):
+        self.assertEqual(self.line.halfway(), (100, 50, 150))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+'''
+Tests for the single pass name matcher.
+'''
+import re
+import unittest
+from .. import matcher
+
+
+def re_test(item, string):
+    'reference implementation: the regular expression AddressSearch used'
+    return re.compile(r"(?<=[\s/,;\(\)])" + re.escape(item) + r"(?=[\s/,;\(\)])").search('\n' + string + '\n')
+
+
+class TestMatcher(unittest.TestCase):
+
+    names = ['ROTTERDAM', 'KRUISPLEIN', 'KRUIS', 'PLEIN', 'HENGELO (GLD)', 'HENGELO', 'DEN HAAG', 'HAAG']
+    messages = ['PRIO 2 TS223 KRUISPLEIN 26 ROTTERDAM WATEROVERLAST VAK: 5991200',
+                'PRIO 2 WATEROVERLAST : : LELIESTRAAT : 44 HENGELO (GLD) 068541',
+                'KRUIS,PLEIN;DEN HAAG/ROTTERDAMSEWEG',
+                'DEN  HAAG (HAAG)',
+                '']
+
+    def testSearch(self):
+        m = matcher.Matcher(self.names)
+        for message in self.messages:
+            expected = set(name for name in self.names if re_test(name, message))
+            self.assertEqual(set(m.search(message)), expected, message)
+
+    def testFinditer(self):
+        m = matcher.Matcher(self.names)
+        spans = [(start, end) for start, end, _ in m.finditer('KRUISPLEIN 26 ROTTERDAM')]
+        self.assertEqual(spans, [(0, 10), (14, 23)])
+
+    def testValue(self):
+        m = matcher.Matcher([('AKKOOI', 'ACQUOY'), 'ACQUOY'])
+        self.assertEqual(m.search('ACQUOY AKKOOI'), ['ACQUOY'])
+        self.assertEqual(len(m), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+'''
+Tests for the normalization of the address file and search strings.
+'''
+import unicodedata
+import unittest
+from .. import normalize
+
+
+class TestNormalize(unittest.TestCase):
+
+    def testStripAccents(self):
+        self.assertEqual(normalize.strip_accents('Fryslân Sûdwest-Fryslân'), 'Fryslan Sudwest-Fryslan')
+        self.assertEqual(normalize.strip_accents('Kruisplein'), 'Kruisplein')
+        self.assertEqual(normalize.strip_accents('Ĳsselstein ’s'), 'Ĳsselstein ’s') # only accents
+        for i in list(range(0x80, 0x3000)) + [0x1E9E, 0xFB01, 0x1D400]: # the same as decomposing (outside the table too)
+            c = chr(i)
+            self.assertEqual(normalize.strip_accents(c), normalize.strip_marks(c))
+        self.assertEqual(normalize.strip_marks('é'), unicodedata.normalize('NFD', 'e'))
+
+    def testNormalize(self):
+        self.assertEqual(normalize.normalize('Kruisplein 26 Rotterdam'), 'KRUISPLEIN 26 ROTTERDAM')
+        self.assertEqual(normalize.normalize('’s-Hertogenbosch Ĳsselstein – Léon'), "'S-HERTOGENBOSCH IJSSELSTEIN - LEON")
+        self.assertEqual(normalize.normalize('Straße'), 'STRASSE')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+'''
+Tests for the geocoding server.
+'''
+import asyncio
+import json
+import unittest
+from .. import server
+from .test_address import address_book
+
+
+class TestServer(unittest.TestCase):
+
+    def request(self, *requests, **settings):
+        'sends requests to a server with a small address book and returns the responses by id'
+        async def run():
+            settings.setdefault('executor', 'thread')
+            geocoder = server.GeocodingServer(address_book(), workers=2, **settings)
+            tcp = await geocoder.start('127.0.0.1', 0)
+            reader, writer = await asyncio.open_connection(*tcp.sockets[0].getsockname()[:2], limit=2 ** 24)
+            for request in requests:
+                writer.write(json.dumps(request).encode('utf8') + b'\n')
+            await writer.drain()
+            responses = [json.loads(await reader.readline()) for _ in requests]
+            writer.close()
+            geocoder.close()
+            return {x['id']: x for x in responses}
+        return asyncio.run(run())
+
+    def testFind(self):
+        responses = self.request({'id': 1, 'method': 'find', 'address_string': 'KRUISPLEIN 26 ROTTERDAM'},
+                                 {'id': 2, 'method': 'find_many', 'address_strings': ['DAM 1 AMSTERDAM', 'NIETS']},
+                                 {'id': 3, 'method': 'unknown'}, max_pending=1)
+        self.assertEqual((responses[1]['result']['street'], responses[1]['result']['x']), (['KRUISPLEIN'], [92010.0]))
+        self.assertEqual([x['city'] for x in responses[2]['result']], [['AMSTERDAM'], []])
+        self.assertIn('error', responses[3])
+
+    def testTimeout(self):
+        responses = self.request({'id': 1, 'method': 'find', 'address_string': 'DAM 1 AMSTERDAM'}, timeout=0)
+        self.assertTrue(responses[1]['error'].startswith('timeout'))
+
+    def testFindManyChunks(self):
+        outstanding, peak = [0], [0]
+        run = server.GeocodingServer.run
+        async def counted(geocoder, function, *args):
+            outstanding[0] += 1
+            peak[0] = max(peak[0], outstanding[0])
+            try:
+                return await run(geocoder, function, *args)
+            finally:
+                outstanding[0] -= 1
+        server.GeocodingServer.run = counted
+        try:
+            responses = self.request({'id': 1, 'method': 'find_many', 'address_strings': ['DAM 1 AMSTERDAM'] * 2000}, max_pending=1)
+        finally:
+            server.GeocodingServer.run = run
+        self.assertEqual(len(responses[1]['result']), 2000)
+        self.assertEqual(peak[0], 2) # one chunk per worker
+
+    def testLongLine(self):
+        responses = self.request({'id': 1, 'method': 'find_many', 'address_strings': ['DAM 1 AMSTERDAM'] * 5000},
+                                 {'id': 2, 'method': 'find', 'address_string': 'DAM 1 AMSTERDAM'}, limit=2 ** 16)
+        self.assertIn('longer than', responses[None]['error'])
+        self.assertEqual(responses[2]['result']['street'], ['DAM'])
+
+    def testShared(self):
+        responses = self.request({'id': 1, 'method': 'find', 'address_string': 'KRUISPLEIN 26 ROTTERDAM'},
+                                 executor='process', shared=True, timeout=60)
+        self.assertEqual((responses[1]['result']['street'], responses[1]['result']['x']), (['KRUISPLEIN'], [92010.0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+'''
+Tests for the address book in shared memory.
+'''
+import multiprocessing
+import os
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from .. import shared
+from .test_address import address, address_book, ROWS
+
+handle = None
+
+
+def init_worker(shared_book):
+    global handle
+    handle = shared_book
+    handle.attach()
+
+
+def find(*args):
+    return handle.attach().find(*args), handle.counts()
+
+
+def exists(handle):
+    return os.path.exists(os.path.join('/dev/shm', handle.name.lstrip('/')))
+
+
+class TestSharedAddressBook(unittest.TestCase):
+
+    def setUp(self):
+        self.book = address_book()
+        self.book.postal_code = address.PostalCode(ROWS[:1])
+        self.handle = shared.SharedAddressBook.publish(self.book)
+
+    def tearDown(self):
+        self.handle.detach()
+        self.handle.close()
+
+    def testAttach(self):
+        book = self.handle.attach()
+        self.assertIs(self.handle.attach(), book)
+        self.assertEqual(self.handle.counts(), (1, False))
+        self.assertEqual(sorted(book.cities), sorted(self.book.cities))
+        self.assertEqual(book.find('ROTTERDAM', 'KRUISPLEIN', 26), self.book.find('ROTTERDAM', 'KRUISPLEIN', 26))
+        self.assertEqual(book.find_PC(ROWS[0][1], 26), self.book.find_PC(ROWS[0][1], 26))
+        self.assertIsNone(book.records)
+
+    def testTeardown(self):
+        self.handle.attach()
+        self.handle.close()
+        self.assertEqual(self.handle.counts(), (1, True))
+        self.assertTrue(exists(self.handle))
+        self.handle.detach()
+        self.assertFalse(exists(self.handle))
+
+    def testClosed(self):
+        self.handle.close()
+        self.assertFalse(exists(self.handle))
+        other = shared.SharedAddressBook(self.handle.name, self.handle.counts_name, self.handle.lock)
+        self.assertRaises(FileNotFoundError, other.attach)
+
+    def testClosedWhileAttached(self):
+        with self.handle:
+            self.handle.attach()
+            other = shared.SharedAddressBook(self.handle.name, self.handle.counts_name, self.handle.lock)
+            self.handle.close()
+            self.assertRaises(shared.store.StoreError, other.attach)
+            other.release(False)
+        self.assertFalse(exists(self.handle))
+
+    def testWorkers(self):
+        expected = self.book.find('ROTTERDAM', 'KRUISPLEIN', 26)
+        for method in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context(method)
+            handle = shared.SharedAddressBook.publish(self.book, context)
+            pool = ProcessPoolExecutor(2, mp_context=context, initializer=init_worker, initargs=(handle,))
+            results = list(pool.map(find, *zip(*[('ROTTERDAM', 'KRUISPLEIN', 26)] * 4)))
+            self.assertEqual(set(x for x, _ in results), {expected})
+            self.assertTrue(all(0 < count <= 2 for _, (count, _) in results))
+            handle.close()
+            self.assertTrue(exists(handle))
+            pool.shutdown(wait=True)
+            self.assertFalse(exists(handle), method)
+
+
+if __name__ == "__main__":
+    unittest.main()
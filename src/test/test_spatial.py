@@ -0,0 +1,52 @@
+'''
+Tests for the spatial grid index.
+'''
+import math
+import random
+import unittest
+from .. import spatial
+
+
+class TestGridIndex(unittest.TestCase):
+
+    def setUp(self):
+        rand = random.Random(0)
+        self.xs = [rand.uniform(0, 10000) for _ in range(1000)]
+        self.ys = [rand.uniform(0, 5000) for _ in range(1000)]
+        self.grid = spatial.GridIndex(self.xs, self.ys, cell_size=300)
+
+    def brute_force(self, x, y, k, max_dist=None):
+        found = sorted((math.hypot(self.xs[i] - x, self.ys[i] - y), i) for i in range(len(self.xs)))
+        return [i for d, i in found if max_dist is None or d <= max_dist][:k]
+
+    def testNearest(self):
+        rand = random.Random(1)
+        for _ in range(200):
+            x, y, k = rand.uniform(-3000, 13000), rand.uniform(-3000, 8000), rand.randint(1, 4)
+            self.assertEqual([i for _, i in self.grid.nearest(x, y, k)], self.brute_force(x, y, k))
+            self.assertEqual([i for _, i in self.grid.nearest(x, y, k, 200)], self.brute_force(x, y, k, 200))
+
+    def testNearestMany(self):
+        found = self.grid.nearest_many([self.xs[3], self.xs[7]], [self.ys[3], self.ys[7]])
+        self.assertEqual([x[0] for x in found], [(0.0, 3), (0.0, 7)])
+
+    def testNearestManyBatch(self):
+        rand = random.Random(2)
+        xs, ys = [rand.uniform(-3000, 13000) for _ in range(300)], [rand.uniform(-3000, 8000) for _ in range(300)]
+        for k, max_dist in [(1, None), (3, None), (2, 200), (5, 1000)]:
+            self.assertEqual(self.grid.nearest_many(xs, ys, k, max_dist), [self.grid.nearest(x, y, k, max_dist) for x, y in zip(xs, ys)])
+        self.assertEqual(self.grid.nearest_many([], []), [])
+        budget = spatial.PAIR_BUDGET
+        spatial.PAIR_BUDGET = 50 # groups of a few queries, and queries that exceed it by themselves
+        try:
+            for k, max_dist in [(1, None), (5, 1000)]:
+                self.assertEqual(self.grid.nearest_many(xs, ys, k, max_dist), [self.grid.nearest(x, y, k, max_dist) for x, y in zip(xs, ys)])
+        finally:
+            spatial.PAIR_BUDGET = budget
+
+    def testEmpty(self):
+        self.assertEqual(spatial.GridIndex([], []).nearest(0, 0), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+'''
+Tests for the memory-mapped address book store.
+'''
+import os
+import pickle
+import tempfile
+import unittest
+from .. import store
+from .test_address import address, address_book, ROWS
+
+
+def find(book, *args):
+    'returns the result of book.find or the type of the exception it raises'
+    try:
+        return book.find(*args)
+    except Exception as e:
+        return type(e)
+
+
+class TestStore(unittest.TestCase):
+
+    def setUp(self):
+        self.book = address_book()
+        self.book.postal_code = address.PostalCode(ROWS[:1])
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, address.STORE_NAME)
+        self.book.save_store(self.filename)
+        self.mapped = address.AddressBook.open(self.filename)
+
+    def tearDown(self):
+        self.mapped.store.close()
+        self.directory.cleanup()
+
+    def testPackPostalCode(self):
+        self.assertEqual(store.pack_postal_code('3011 ab'), 3011 * 676 + 1)
+        self.assertEqual(store.unpack_postal_code(store.pack_postal_code('9999ZZ')), '9999ZZ')
+        self.assertIsNone(store.pack_postal_code('30111AB'))
+
+    def testCities(self):
+        self.assertEqual(sorted(self.mapped.cities), sorted(self.book.cities))
+        for name, city in self.book.cities.items():
+            self.assertEqual(sorted(self.mapped.cities[name].streets), sorted(city.streets))
+        self.assertRaises(KeyError, self.mapped.cities.__getitem__, 'UTRECHT')
+        self.assertRaises(KeyError, self.mapped.cities['ROTTERDAM'].streets.__getitem__, 'DAM')
+
+    def testFind(self):
+        for name, city in self.book.cities.items():
+            for street in city.streets:
+                for housen in [0, 2, 26, 40, 98]:
+                    self.assertEqual(find(self.mapped, name, street, housen), find(self.book, name, street, housen))
+
+    def testPostalCode(self):
+        self.assertEqual(self.mapped.postal_code.codes['3011AB'], ('ROTTERDAM', 'KRUISPLEIN'))
+        self.assertEqual(list(self.mapped.postal_code.codes), ['3011AB'])
+        self.assertRaises(KeyError, self.mapped.postal_code.codes.__getitem__, '3011AC')
+        self.assertEqual(self.mapped.find_PC('3011AB', 4), (92000.0, 437000.0))
+
+    def testPickle(self):
+        other = pickle.loads(pickle.dumps(self.mapped.store))
+        self.assertEqual(list(other.cities), list(self.mapped.store.cities))
+        other.close()
+
+    def testVersion(self):
+        with open(self.filename, 'r+b') as f:
+            f.seek(8)
+            f.write(b'\xff')
+        self.assertRaises(store.StoreError, store.AddressStore.open, self.filename)
+
+    def testTruncated(self):
+        with open(self.filename, 'r+b') as f:
+            f.truncate(os.path.getsize(self.filename) // 2)
+        self.assertRaises(store.StoreError, store.AddressStore.open, self.filename)
+        open(self.filename, 'wb').close()
+        self.assertRaises(store.StoreError, store.AddressStore.open, self.filename)
+
+
+if __name__ == "__main__":
+    unittest.main()